@@ -81,6 +81,14 @@ resource "aws_ecs_task_definition" "c14-fahad_task_definition-2" {
         {
           name  = "BUCKET_NAME"
           value = var.BUCKET_NAME
+        },
+        {
+          name  = "MANIFEST_S3_BUCKET"
+          value = var.MANIFEST_S3_BUCKET
+        },
+        {
+          name  = "REPORT_SNAPSHOT_BUCKET"
+          value = var.REPORT_SNAPSHOT_BUCKET
         }
           
       ]
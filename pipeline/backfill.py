@@ -0,0 +1,122 @@
+"""Backfills historical truck data over a date range, running the pipeline for
+    each upload folder on a process pool and checkpointing completed folders."""
+import os
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+from extract import configure_logger, construct_folder_path
+from pipeline import PipelineRunner
+import global_variables as gv
+import manifest
+
+
+def parse_date(value: str) -> date:
+    """Parses a YYYY-MM-DD command line date."""
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def get_partition_prefixes(start_date: date, end_date: date) -> list:
+    """Returns every upload folder from start_date to end_date inclusive, in time order."""
+    prefixes = []
+    day = start_date
+    while day <= end_date:
+        prefixes.extend(construct_folder_path(day, hour)
+                        for hour in sorted(gv.VALID_TIMES))
+        day += timedelta(days=1)
+    return prefixes
+
+
+def get_backfill_workers() -> int:
+    """Returns the number of folders backfilled concurrently."""
+    return int(os.getenv("BACKFILL_WORKERS", str(gv.DEFAULT_BACKFILL_WORKERS)))
+
+
+def get_processed_path(prefix: str) -> str:
+    """Returns a processed artifact name unique to the folder, so concurrent
+    workers do not overwrite each other's output."""
+    return f"{prefix.replace('/', '_')}_{gv.PROCESSED_DATA_NAME}"
+
+
+def backfill_partition(prefix: str) -> int:
+    """Runs extract, transform and load for a single folder in a worker process.
+    Returns the number of rows loaded."""
+    load_dotenv()
+    logger = configure_logger()
+    runner = PipelineRunner(logger, [prefix], in_memory=True,
+                            processed_path=get_processed_path(prefix))
+    return runner.run()['load']['rows']
+
+
+def get_pending_prefixes(manifest_conn, prefixes: list) -> list:
+    """Returns the folders not yet checkpointed by an earlier backfill."""
+    completed = manifest.get_completed_partitions(manifest_conn)
+    return [prefix for prefix in prefixes if prefix not in completed]
+
+
+def run_backfill(prefixes: list, logger: logging.Logger, max_workers: int,
+                 worker=backfill_partition) -> dict:
+    """Backfills the folders not already completed on a process pool, checkpointing
+    each folder as soon as it loads. Returns the rows loaded per completed folder
+    and the folders that failed."""
+    manifest_conn = manifest.get_manifest_connection()
+    loaded = {}
+    failed = []
+    try:
+        pending = get_pending_prefixes(manifest_conn, prefixes)
+        logger.info(
+            f"Backfilling {len(pending)} of {len(prefixes)} folders "
+            f"with {max_workers} workers.")
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(worker, prefix): prefix for prefix in pending}
+            for future in as_completed(futures):
+                prefix = futures[future]
+                try:
+                    rows = future.result()
+                except Exception as backfill_error:  # pylint: disable=broad-except
+                    logger.error(f"Failed to backfill {prefix}: {backfill_error}")
+                    failed.append(prefix)
+                    continue
+                manifest.mark_partition_completed(manifest_conn, prefix, rows)
+                loaded[prefix] = rows
+                logger.info(f"Backfilled {prefix}: {rows} rows.")
+    finally:
+        manifest_conn.close()
+
+    logger.info(
+        f"Backfill finished: {len(loaded)} folders, {sum(loaded.values())} rows, "
+        f"{len(failed)} failed.")
+    return {"loaded": loaded, "failed": sorted(failed)}
+
+
+def parse_arguments(args: list = None) -> argparse.Namespace:
+    """Parses the command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("start_date", type=parse_date,
+                        help="First day to backfill, as YYYY-MM-DD.")
+    parser.add_argument("end_date", type=parse_date,
+                        help="Last day to backfill, as YYYY-MM-DD.")
+    parser.add_argument("--workers", type=int,
+                        help="Folders to backfill concurrently.")
+    return parser.parse_args(args)
+
+
+def main(args: list = None) -> dict:
+    """Main function calling other functions."""
+    arguments = parse_arguments(args)
+    load_dotenv()
+    logger = configure_logger()
+
+    prefixes = get_partition_prefixes(arguments.start_date, arguments.end_date)
+    manifest.restore_manifest(logger)
+    try:
+        return run_backfill(prefixes, logger,
+                            arguments.workers or get_backfill_workers())
+    finally:
+        manifest.save_manifest(logger)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Benchmarks row-by-row against batched inserts into fact_transaction, and
+    compares each load mode, rollup included, on a first load and a repeated load.
+    Redshift does not enforce the fingerprint's UNIQUE constraint, so a repeated
+    append there counts every row twice; PostgreSQL rejects it instead.
+    Point the DB_* variables at a local PostgreSQL database with schema.sql applied;
+    every run is rolled back, so the database is left unchanged."""
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import redshift_connector
+from dotenv import load_dotenv
+import global_variables as gv
+import load
+
+
+def make_fact_transactions(rows: int) -> pd.DataFrame:
+    """Builds synthetic fact rows that reference the seeded dimension tables."""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'at': pd.date_range('2024-10-01 12:00:00', periods=rows, freq='s'),
+        'payment_method_id': rng.integers(1, 3, rows),
+        'total': rng.integers(100, 2000, rows) / 100,
+        'truck_id': rng.integers(1, 7, rows),
+        'transaction_fingerprint': np.arange(rows, dtype='int64')
+    })
+
+
+def time_batch_size(conn, fact_transactions: pd.DataFrame, batch_size: int) -> float:
+    """Returns the seconds taken to insert the rows in batches of the given size."""
+    cursor = load.get_cursor(conn)
+    load.set_schema(cursor, os.getenv("DB_SCHEMA"))
+    start = time.perf_counter()
+    load.insert_transaction_batches(cursor, fact_transactions, batch_size)
+    elapsed = time.perf_counter() - start
+    conn.rollback()
+    return elapsed
+
+
+def time_load_mode(conn, fact_transactions: pd.DataFrame, load_mode: str) -> tuple:
+    """Returns the seconds taken to load the rows with the load mode, and to load
+    the same rows again, or None when the database rejected the repeated rows."""
+    cursor = load.get_cursor(conn)
+    load.set_schema(cursor, os.getenv("DB_SCHEMA"))
+    timings = []
+    try:
+        for _ in range(2):
+            start = time.perf_counter()
+            load.load_fact_transactions(cursor, fact_transactions, load_mode)
+            timings.append(time.perf_counter() - start)
+    except redshift_connector.Error:
+        timings.append(None)
+    conn.rollback()
+    return tuple(timings)
+
+
+def main() -> None:
+    """Prints rows/sec for each batch size; a batch size of 1 is the row-by-row baseline."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+",
+                        default=[1, 100, 1000, 5000])
+    args = parser.parse_args()
+
+    load_dotenv()
+    conn = load.get_connection()
+    fact_transactions = make_fact_transactions(args.rows)
+
+    print(f"{'batch_size':>10} {'rows':>8} {'seconds':>9} {'rows/s':>10}")
+    for batch_size in args.batch_sizes:
+        elapsed = time_batch_size(conn, fact_transactions, batch_size)
+        print(f"{batch_size:>10} {args.rows:>8} {elapsed:>9.3f} "
+              f"{args.rows / elapsed:>10.0f}")
+
+    load_modes = [gv.BATCH_LOAD_MODE, gv.MERGE_LOAD_MODE]
+    if load.is_copy_configured():
+        load_modes.insert(1, gv.COPY_LOAD_MODE)
+    print(f"\n{'load_mode':>10} {'rows':>8} {'first s':>9} {'repeat s':>9}")
+    for load_mode in load_modes:
+        first, repeat = time_load_mode(conn, fact_transactions, load_mode)
+        repeat = 'rejected' if repeat is None else f"{repeat:.3f}"
+        print(f"{load_mode:>10} {args.rows:>8} {first:>9.3f} {repeat:>9}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
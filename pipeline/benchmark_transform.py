@@ -0,0 +1,88 @@
+"""Benchmarks combining and cleaning truck CSV files: the previous concat-per-file
+    loop, the single concat over a thread pool, clean_data over everything at once,
+    and the chunked clean_data_in_chunks. Each case runs in a fresh process
+    so its peak RSS is measured on its own."""
+import os
+import time
+import logging
+import argparse
+import resource
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+import pandas as pd
+import transform
+
+
+def write_truck_files(directory: str, files: int, rows: int) -> list:
+    """Writes synthetic T3_T<n>.csv files and returns their paths."""
+    rng = np.random.default_rng(0)
+    paths = []
+    for truck in range(1, files + 1):
+        path = os.path.join(directory, f"T3_T{truck}.csv")
+        pd.DataFrame({
+            'timestamp': pd.date_range('2024-10-01 12:00:00', periods=rows, freq='s'),
+            'type': rng.choice(['card', 'cash'], rows),
+            'total': rng.integers(100, 2000, rows) / 100
+        }).to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def combine_with_repeated_concat(paths: list, db_logger: logging.Logger) -> pd.DataFrame:
+    """The previous approach, copying the accumulated frame for every file."""
+    combined_trucks = pd.DataFrame()
+    for path in paths:
+        truck = pd.read_csv(path)
+        truck['truck_id'] = transform.get_truck_id(path)
+        combined_trucks = pd.concat([combined_trucks, truck], ignore_index=True)
+    return combined_trucks
+
+
+def run_case(approach: str, files: int, rows: int) -> tuple:
+    """Combines the files with one approach. Returns seconds, rows and peak RSS in MB."""
+    db_logger = logging.getLogger("benchmark")
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_truck_files(directory, files, rows)
+        start = time.perf_counter()
+        if approach == "repeated_concat":
+            total_rows = len(combine_with_repeated_concat(paths, db_logger))
+        elif approach == "thread_pool":
+            total_rows = len(transform.read_truck_frames(
+                [(path, None) for path in paths], db_logger))
+        elif approach == "clean_data":
+            total_rows = len(transform.clean_data(
+                db_logger, {path: open(path, "rb") for path in paths}))
+        else:
+            total_rows = sum(len(batch) for batch in transform.clean_data_in_chunks(
+                db_logger, {path: open(path, "rb") for path in paths}))
+        elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return elapsed, total_rows, peak_rss
+
+
+def main() -> None:
+    """Prints time and peak RSS for each file count and approach."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--rows", type=int, default=500,
+                        help="Rows per truck file.")
+    parser.add_argument("--approaches", nargs="+",
+                        default=["repeated_concat", "thread_pool"],
+                        choices=["repeated_concat", "thread_pool",
+                                 "clean_data", "chunked_clean"])
+    args = parser.parse_args()
+
+    print(f"{'approach':>16} {'files':>6} {'rows':>9} {'seconds':>9} {'peak_rss_mb':>12}")
+    for files in args.files:
+        for approach in args.approaches:
+            with ProcessPoolExecutor(max_workers=1,
+                                     mp_context=get_context("spawn")) as executor:
+                elapsed, rows, peak_rss = executor.submit(
+                    run_case, approach, files, args.rows).result()
+            print(f"{approach:>16} {files:>6} {rows:>9} {elapsed:>9.3f} {peak_rss:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
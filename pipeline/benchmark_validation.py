@@ -0,0 +1,69 @@
+"""Benchmarks the schema-driven validate_transactions against the previous
+    convert/filter/convert chain on synthetic raw transactions."""
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from validation import validate_transactions
+
+
+def make_raw_transactions(rows: int) -> pd.DataFrame:
+    """Builds raw string transactions with a sprinkling of invalid totals."""
+    rng = np.random.default_rng(0)
+    totals = (rng.integers(1, 6000, rows) / 100).astype(str).astype(object)
+    totals[rng.random(rows) < 0.02] = 'VOID'
+    totals[rng.random(rows) < 0.02] = 'blank'
+    totals[rng.random(rows) < 0.02] = 'ERR'
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2024-10-01 12:00:00', periods=rows, freq='s')
+        .strftime('%Y-%m-%d %H:%M:%S'),
+        'type': rng.choice(['card', 'cash'], rows),
+        'total': totals.astype(str),
+        'truck_id': rng.integers(1, 7, rows)
+    })
+
+
+def previous_chain(transactions: pd.DataFrame) -> pd.DataFrame:
+    """The previous convert_total_to_numeric, filter_valid_totals, convert_columns chain."""
+    transactions = transactions.copy()
+    transactions['total'] = pd.to_numeric(transactions['total'], errors='coerce')
+    valid_totals = (
+        transactions['total'].notna() &
+        ~transactions['total'].isin(['blank', 'ERR', 'VOID', 0.00]) &
+        (transactions['total'] > 0) &
+        (transactions['total'] <= 50)
+    )
+    transactions = transactions[valid_totals].copy()
+    transactions['type'] = transactions['type'].astype(str)
+    transactions['timestamp'] = pd.to_datetime(transactions['timestamp'])
+    return transactions
+
+
+def time_call(function, transactions: pd.DataFrame, repeats: int) -> tuple:
+    """Returns the best time over the repeats and the number of valid rows."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(transactions)
+        best = min(best, time.perf_counter() - start)
+    valid = result[0] if isinstance(result, tuple) else result
+    return best, len(valid)
+
+
+def main() -> None:
+    """Prints the best time for each approach."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    transactions = make_raw_transactions(args.rows)
+    print(f"{'approach':>16} {'rows':>9} {'valid':>9} {'seconds':>9}")
+    for name, function in (("previous_chain", previous_chain),
+                           ("schema", validate_transactions)):
+        elapsed, valid = time_call(function, transactions, args.repeats)
+        print(f"{name:>16} {args.rows:>9} {valid:>9} {elapsed:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmarks the load path and the dashboard/report queries against the local
+    SQLite warehouse. Each run builds a fresh database from schema.sql and loads
+    the same seeded transactions, so results are reproducible without Redshift."""
+import os
+import time
+import logging
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+import load
+import shared_path  # pylint: disable=unused-import
+from warehouse import get_warehouse
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'schema.sql')
+
+QUERIES = {
+    'all_transactions': "SELECT * FROM fact_transaction",
+    'revenue_per_truck': """
+        SELECT dt.truck_name, SUM(ft.total), COUNT(*), AVG(ft.total)
+        FROM fact_transaction AS ft
+        JOIN dim_truck AS dt ON ft.truck_id = dt.truck_id
+        GROUP BY dt.truck_name""",
+    'revenue_per_truck_rollup': """
+        SELECT dt.truck_name, SUM(rt.total_sum), SUM(rt.transaction_count),
+               SUM(rt.total_sum) / SUM(rt.transaction_count)
+        FROM rollup_transaction_hourly AS rt
+        JOIN dim_truck AS dt ON rt.truck_id = dt.truck_id
+        GROUP BY dt.truck_name""",
+    'payment_method_split': """
+        SELECT dpm.payment_method_type, COUNT(*), SUM(ft.total)
+        FROM fact_transaction AS ft
+        JOIN dim_payment_method AS dpm ON ft.payment_method_id = dpm.payment_method_id
+        GROUP BY dpm.payment_method_type"""
+}
+
+
+def make_transactions(rows: int) -> pd.DataFrame:
+    """Builds cleaned transactions for the six seeded trucks."""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2024-10-01 12:00:00', periods=rows, freq='s'),
+        'type': rng.choice(['card', 'cash'], rows),
+        'total': rng.integers(100, 5000, rows) / 100,
+        'truck_id': rng.integers(1, 7, rows)
+    })
+
+
+def create_warehouse(directory: str, name: str):
+    """Points the local backend at a new database with schema.sql applied."""
+    os.environ['WAREHOUSE_PATH'] = os.path.join(directory, f"{name}.db")
+    os.environ['MANIFEST_PATH'] = os.path.join(directory, f"{name}_manifest.db")
+    warehouse = get_warehouse()
+    conn = warehouse.connect()
+    warehouse.apply_schema(conn, SCHEMA_PATH)
+    return warehouse, conn
+
+
+def time_load(transactions: pd.DataFrame, batch_size: int) -> float:
+    """Returns the seconds load_transactions takes at the given INSERT batch size."""
+    os.environ['LOAD_BATCH_SIZE'] = str(batch_size)
+    start = time.perf_counter()
+    load.load_transactions([transactions], logging.getLogger('benchmark_warehouse'))
+    return time.perf_counter() - start
+
+
+def time_query(warehouse, conn, query: str) -> tuple:
+    """Returns the seconds taken to fetch a query into a DataFrame, and its row count."""
+    start = time.perf_counter()
+    columns, rows = warehouse.query(conn.cursor(), query)
+    frame = pd.DataFrame(rows, columns=columns)
+    return time.perf_counter() - start, len(frame)
+
+
+def main() -> None:
+    """Prints load throughput per batch size, then query times on the loaded data."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    os.environ['WAREHOUSE_BACKEND'] = 'sqlite'
+    os.environ.pop('LOAD_MODE', None)
+    os.environ.pop('COPY_S3_BUCKET', None)
+    transactions = make_transactions(args.rows)
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'batch_size':>10} {'rows':>8} {'seconds':>9} {'rows/s':>10}")
+        for batch_size in args.batch_sizes:
+            _, conn = create_warehouse(directory, f"load_{batch_size}")
+            conn.close()
+            elapsed = time_load(transactions, batch_size)
+            print(f"{batch_size:>10} {args.rows:>8} {elapsed:>9.3f} "
+                  f"{args.rows / elapsed:>10.0f}")
+
+        warehouse, conn = create_warehouse(directory, "query")
+        conn.close()
+        time_load(transactions, max(args.batch_sizes))
+        conn = warehouse.connect()
+        print(f"\n{'query':>24} {'rows':>8} {'seconds':>9}")
+        for name, query in QUERIES.items():
+            elapsed, rows = time_query(warehouse, conn, query)
+            print(f"{name:>24} {rows:>8} {elapsed:>9.3f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+# pylint: skip-file
+import os
+import pytest
+from warehouse import get_warehouse
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'schema.sql')
+
+
+@pytest.fixture
+def local_warehouse(tmp_path, monkeypatch):
+    monkeypatch.setenv('WAREHOUSE_BACKEND', 'sqlite')
+    monkeypatch.setenv('WAREHOUSE_PATH', str(tmp_path / 'warehouse.db'))
+    monkeypatch.setenv('MANIFEST_PATH', str(tmp_path / 'manifest.db'))
+    monkeypatch.setenv('REPORT_SNAPSHOT_PATH', str(tmp_path / 'snapshots'))
+    monkeypatch.delenv('REPORT_SNAPSHOT_BUCKET', raising=False)
+    monkeypatch.delenv('LOAD_MODE', raising=False)
+    monkeypatch.delenv('COPY_S3_BUCKET', raising=False)
+    warehouse = get_warehouse()
+    conn = warehouse.connect()
+    warehouse.apply_schema(conn, SCHEMA_PATH)
+    yield warehouse, conn
+    conn.close()
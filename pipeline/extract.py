@@ -1,20 +1,35 @@
 """Script that downloads relevant information from an AWS S3 bucket at regular intevals,
     And formats the data accordingly."""
 import os
+import time
 import logging
+import argparse
+import sqlite3
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
+from tempfile import SpooledTemporaryFile, TemporaryFile
 import pytz
 import botocore
 from botocore.client import BaseClient
+from botocore.config import Config
 from boto3 import client
 from dotenv import load_dotenv
 import global_variables as gv
+import manifest
+
+S_THREE_STATS = {"client_creation_seconds": None, "requests": Counter()}
+S_THREE_STATS_LOCK = threading.Lock()
 
 
 def configure_logger() -> logging.Logger:
     """Sets up and returns a logger instance."""
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
+    if logger.handlers:
+        return logger
     handler = logging.StreamHandler()
     formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -23,13 +38,66 @@ def configure_logger() -> logging.Logger:
     return logger
 
 
+def count_s_three_request(event_name: str, **_) -> None:
+    """Records an S3 API call made through the shared client."""
+    with S_THREE_STATS_LOCK:
+        S_THREE_STATS["requests"][event_name.split('.')[-1]] += 1
+
+
+def get_s_three_config() -> Config:
+    """Returns the client config, with a pool large enough for every download worker."""
+    return Config(
+        max_pool_connections=max(gv.S_THREE_MAX_POOL_CONNECTIONS,
+                                 get_max_workers()),
+        retries={"max_attempts": gv.S_THREE_MAX_ATTEMPTS, "mode": "standard"},
+        tcp_keepalive=True
+    )
+
+
+@lru_cache(maxsize=None)
 def get_s_three_client() -> client:
-    """Returns an S3 client instance using credentials from env_config."""
-    return client(
+    """Returns the shared S3 client instance using credentials from env_config.
+    The client is built once per process and reused by every extract phase."""
+    start = time.perf_counter()
+    s_three = client(
         "s3",
         aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        config=get_s_three_config()
     )
+    s_three.meta.events.register('before-call.s3', count_s_three_request)
+    S_THREE_STATS["client_creation_seconds"] = time.perf_counter() - start
+    return s_three
+
+
+def reset_s_three_client() -> None:
+    """Discards the shared S3 client and its statistics."""
+    get_s_three_client.cache_clear()
+    with S_THREE_STATS_LOCK:
+        S_THREE_STATS["client_creation_seconds"] = None
+        S_THREE_STATS["requests"].clear()
+
+
+def get_s_three_stats() -> dict:
+    """Returns client cold-start time and S3 request counts for this run."""
+    with S_THREE_STATS_LOCK:
+        requests = dict(S_THREE_STATS["requests"])
+    return {
+        "client_creation_seconds": S_THREE_STATS["client_creation_seconds"],
+        "requests": requests,
+        "total_requests": sum(requests.values())
+    }
+
+
+def log_s_three_stats(app_logger: logging.Logger) -> dict:
+    """Logs the shared S3 client statistics."""
+    stats = get_s_three_stats()
+    creation = stats["client_creation_seconds"]
+    if creation is not None:
+        app_logger.info(f"S3 client created in {creation:.3f}s.")
+    app_logger.info(
+        f"S3 requests this run: {stats['total_requests']} {stats['requests']}")
+    return stats
 
 
 def is_valid_hour(hour: int) -> bool:
@@ -53,17 +121,33 @@ def construct_folder_path(current_time: datetime, hour: int) -> str:
     return f"trucks/{current_time:%Y-%m}/{current_time.day}/{hour}"
 
 
-def get_recent_files(bucket_name: str, folder_path: str, current_time: datetime) -> list:
-    """Get a list of files uploaded in the last three hours."""
-    s_three = get_s_three_client()
-    response = s_three.list_objects_v2(Bucket=bucket_name, Prefix=folder_path)
+def get_max_workers() -> int:
+    """Returns the number of concurrent downloads to run."""
+    return int(os.getenv("DOWNLOAD_WORKERS", str(gv.DEFAULT_DOWNLOAD_WORKERS)))
+
+
+def get_memory_budget() -> int:
+    """Returns the total bytes of streamed objects held in memory at once."""
+    return int(os.getenv("EXTRACT_MEMORY_BYTES", str(gv.IN_MEMORY_TOTAL_MAX_BYTES)))
 
-    three_hours_ago = current_time.astimezone(pytz.utc) - timedelta(hours=3)
 
-    return [
-        obj for obj in response.get('Contents', [])
-        if obj['LastModified'] >= three_hours_ago
-    ]
+def get_previous_slot(slot_time: datetime) -> datetime:
+    """Returns the time of the upload slot before the given one."""
+    previous = slot_time - timedelta(hours=1)
+    while not is_valid_hour(previous.hour):
+        previous -= timedelta(hours=1)
+    return previous
+
+
+def get_folder_paths(current_time: datetime, hour: int) -> list:
+    """Returns the current slot's folder followed by the earlier folders
+    still checked for late-arriving files."""
+    slot_time = current_time.replace(hour=hour)
+    folder_paths = [construct_folder_path(slot_time, hour)]
+    for _ in range(gv.LATE_FILE_LOOKBACK_SLOTS):
+        slot_time = get_previous_slot(slot_time)
+        folder_paths.append(construct_folder_path(slot_time, slot_time.hour))
+    return folder_paths
 
 
 def log_invalid_hour(app_logger: logging.Logger, current_hour: int) -> None:
@@ -74,8 +158,9 @@ def log_invalid_hour(app_logger: logging.Logger, current_hour: int) -> None:
         "Current hour is not valid. It must be 12, 15, 18, or 21.")
 
 
-def access_correct_folder(app_logger: logging.Logger):
-    """Access the correct S3 bucket and folder."""
+def access_correct_folder(app_logger: logging.Logger, s_three: BaseClient):
+    """Access the correct S3 bucket and folders.
+    Returns the bucket, folders and their listing so it is only fetched once."""
     bucket_name = os.getenv("BUCKET_NAME")
     current_time = datetime.now(pytz.utc)
     current_hour = current_time.hour
@@ -86,74 +171,311 @@ def access_correct_folder(app_logger: logging.Logger):
         log_invalid_hour(app_logger, current_hour)
         return None
 
-    folder_path = construct_folder_path(current_time, nearest_hour)
-    app_logger.info(f"Accessing folder: {folder_path}")
+    folder_paths = get_folder_paths(current_time, nearest_hour)
+    app_logger.info(f"Accessing folders: {folder_paths}")
 
-    recent_files = get_recent_files(bucket_name, folder_path, current_time)
+    contents = list_folders(s_three, bucket_name, folder_paths)
+    app_logger.info(f"Found {len(contents)} files in {folder_paths}.")
+    return bucket_name, folder_paths, contents
 
-    if recent_files:
-        app_logger.info(
-            f"Found {len(recent_files)} recent files in {folder_path}.")
-        return bucket_name, folder_path
 
-    app_logger.warning("No recent files found in the last three hours.")
-    raise ValueError("No recent data uploaded in the last three hours.")
+def list_s_three_objects(s_three, bucket_name: str, folder_path: str) -> list:
+    """Lists every object under the folder, following continuation tokens."""
+    paginator = s_three.get_paginator('list_objects_v2')
+    contents = []
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=folder_path):
+        contents.extend(page.get('Contents', []))
+    return contents
+
 
+def list_folders(s_three: BaseClient, bucket_name: str, folder_paths: list) -> list:
+    """Lists every object under each of the folders."""
+    contents = []
+    for folder_path in folder_paths:
+        contents.extend(list_s_three_objects(s_three, bucket_name, folder_path))
+    return contents
+
+
+def get_objects_to_fetch(app_logger: logging.Logger, s_three: BaseClient,
+                         manifest_conn: sqlite3.Connection,
+                         prefixes: list = None) -> tuple:
+    """Lists the current slot's folders, or the given backfill prefixes,
+    and returns the bucket and the objects not loaded yet."""
+    if prefixes:
+        bucket_name = os.getenv("BUCKET_NAME")
+        app_logger.info(f"Backfilling folders: {prefixes}")
+        contents = list_folders(s_three, bucket_name, prefixes)
+    else:
+        bucket_name, _, contents = access_correct_folder(app_logger, s_three)
 
-def list_s_three_objects(s_three, bucket_name: str, folder_path: str):
-    """Lists objects in the specified S3 bucket."""
-    response = s_three.list_objects_v2(
-        Bucket=(bucket_name), Prefix=folder_path)
-    return response.get('Contents', [])
+    new_contents = manifest.filter_unloaded_objects(manifest_conn, contents)
+    app_logger.info(
+        f"{len(new_contents)} of {len(contents)} objects are new or changed.")
+    return bucket_name, new_contents
+
+
+def is_matching_file(key: str) -> bool:
+    """Checks if the key matches the truck data prefix and suffix."""
+    return gv.PREFIX in key and key.endswith(gv.SUFFIX)
+
+
+def get_local_name(key: str) -> str:
+    """Returns the name an object is fetched under: its whole key, so files with the
+    same name in different folders, such as a slot and its lookback, stay apart."""
+    return key.replace('/', '_')
 
 
 def download_file_if_matching(key: str,
                               s_three: BaseClient,
-                              app_logger: logging.Logger) -> None:
-    """Downloads the file if it matches the specified prefix and suffix."""
+                              app_logger: logging.Logger,
+                              bucket_name: str) -> float:
+    """Downloads the file if it matches the specified prefix and suffix.
+    Returns the seconds taken, or None if nothing was downloaded."""
     app_logger.info(f"Checking file: {key}")
-    if gv.PREFIX in key and key.endswith(gv.SUFFIX):
-        local_path = key.split('/')[-1]
-        bucket_name = os.getenv("BUCKET_NAME")
-        try:
-            app_logger.info(f"Downloading {key} to {local_path}")
-            s_three.download_file(bucket_name, key, local_path)
-            app_logger.info(f"Successfully downloaded {key} to {local_path}")
-        except botocore.exceptions.ClientError as download_error:
-            app_logger.error(f"Failed to download {key}: {download_error}")
-    else:
+    if not is_matching_file(key):
         app_logger.info(f"File {key} does not match criteria.")
+        return None
+
+    local_path = get_local_name(key)
+    try:
+        app_logger.info(f"Downloading {key} to {local_path}")
+        start = time.perf_counter()
+        s_three.download_file(bucket_name, key, local_path)
+        elapsed = time.perf_counter() - start
+        app_logger.info(
+            f"Successfully downloaded {key} to {local_path} in {elapsed:.3f}s")
+        return elapsed
+    except botocore.exceptions.ClientError as download_error:
+        app_logger.error(f"Failed to download {key}: {download_error}")
+        return None
 
 
-def download_truck_data_files(app_logger: logging.Logger) -> None:
-    """Downloads relevant files from S3 to the current working directory."""
+def log_download_stats(app_logger: logging.Logger, object_sizes: list,
+                       object_times: list, elapsed: float) -> dict:
+    """Logs and returns throughput figures for a completed download run."""
+    total_bytes = sum(object_sizes)
+    stats = {
+        "objects": len(object_times),
+        "bytes": total_bytes,
+        "seconds": elapsed,
+        "objects_per_second": len(object_times) / elapsed if elapsed else 0.0,
+        "megabytes_per_second": total_bytes / gv.BYTES_PER_MEGABYTE / elapsed
+        if elapsed else 0.0,
+        "mean_seconds_per_object": sum(object_times) / len(object_times)
+        if object_times else 0.0
+    }
+    app_logger.info(
+        f"Downloaded {stats['objects']} objects ({stats['bytes']} bytes) "
+        f"in {elapsed:.3f}s: {stats['objects_per_second']:.1f} objects/s, "
+        f"{stats['megabytes_per_second']:.2f} MB/s, "
+        f"{stats['mean_seconds_per_object']:.3f}s per object.")
+    return stats
+
+
+def fetch_matching_objects(contents: list, app_logger: logging.Logger,
+                           max_workers: int, fetch, require_all: bool = False) -> tuple:
+    """Runs fetch over the matching objects on a bounded thread pool.
+    Returns the (object, result) pairs that succeeded and the seconds taken.
+    Raises RuntimeError when require_all is set and any object failed to fetch."""
+    matching = [obj for obj in contents if is_matching_file(obj['Key'])]
+    app_logger.info(
+        f"Fetching {len(matching)} of {len(contents)} objects "
+        f"with {max_workers} workers.")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(fetch, matching))
+    elapsed = time.perf_counter() - start
+
+    completed = [(obj, result)
+                 for obj, result in zip(matching, results) if result is not None]
+    if require_all and len(completed) < len(matching):
+        raise RuntimeError(
+            f"Fetched only {len(completed)} of {len(matching)} matching objects.")
+    return completed, elapsed
+
+
+def download_objects(s_three: BaseClient, bucket_name: str, contents: list,
+                     app_logger: logging.Logger, max_workers: int,
+                     manifest_conn: sqlite3.Connection = None,
+                     require_all: bool = False) -> dict:
+    """Downloads the matching objects on a bounded thread pool."""
+    downloaded, elapsed = fetch_matching_objects(
+        contents, app_logger, max_workers,
+        lambda obj: download_file_if_matching(
+            obj['Key'], s_three, app_logger, bucket_name), require_all)
+    if manifest_conn is not None:
+        manifest.mark_objects_fetched(
+            manifest_conn, [obj for obj, _ in downloaded])
+
+    return log_download_stats(app_logger,
+                              [obj['Size'] for obj, _ in downloaded],
+                              [seconds for _, seconds in downloaded],
+                              elapsed)
+
+
+def stream_file_if_matching(key: str,
+                            s_three: BaseClient,
+                            app_logger: logging.Logger,
+                            bucket_name: str,
+                            memory_bytes: int = gv.IN_MEMORY_MAX_BYTES) -> tuple:
+    """Streams the object body into a buffer if it matches the prefix and suffix.
+    The buffer stays in memory up to memory_bytes and is spooled to a temporary
+    file beyond that, or from the start when memory_bytes is 0.
+    Returns the buffer and the seconds taken, or None if nothing was fetched."""
+    if not is_matching_file(key):
+        app_logger.info(f"File {key} does not match criteria.")
+        return None
+
+    try:
+        start = time.perf_counter()
+        buffer = (SpooledTemporaryFile(max_size=memory_bytes) if memory_bytes
+                  else TemporaryFile())
+        body = s_three.get_object(Bucket=bucket_name, Key=key)['Body']
+        for chunk in body.iter_chunks(gv.STREAM_CHUNK_BYTES):
+            buffer.write(chunk)
+        buffer.seek(0)
+        elapsed = time.perf_counter() - start
+        app_logger.info(f"Successfully streamed {key} in {elapsed:.3f}s")
+        return buffer, elapsed
+    except botocore.exceptions.ClientError as stream_error:
+        app_logger.error(f"Failed to stream {key}: {stream_error}")
+        return None
+
+
+def get_memory_limits(contents: list, budget: int) -> dict:
+    """Shares the memory budget between the objects in listing order, giving each
+    object that fits its whole size and IN_MEMORY_MAX_BYTES at most.
+    Returns the bytes each key may hold in memory; 0 means spool it to disk."""
+    limits = {}
+    for obj in contents:
+        size = obj['Size']
+        in_memory = 0 < size <= min(budget, gv.IN_MEMORY_MAX_BYTES)
+        limits[obj['Key']] = size if in_memory else 0
+        budget -= limits[obj['Key']]
+    return limits
+
+
+def stream_objects(s_three: BaseClient, bucket_name: str, contents: list,
+                   app_logger: logging.Logger, max_workers: int,
+                   manifest_conn: sqlite3.Connection = None,
+                   require_all: bool = False, memory_budget: int = None) -> dict:
+    """Streams the matching objects into buffers on a bounded thread pool.
+    The buffers together hold at most memory_budget bytes in memory; the objects
+    beyond it are spooled to temporary files, so every object can be fetched
+    before the first one is read without holding the whole input in memory.
+    Returns the buffers keyed by their local name."""
+    limits = get_memory_limits(
+        [obj for obj in contents if is_matching_file(obj['Key'])],
+        get_memory_budget() if memory_budget is None else memory_budget)
+    app_logger.info(
+        f"Holding {sum(1 for limit in limits.values() if limit)} of {len(limits)} "
+        f"objects ({sum(limits.values())} bytes) in memory.")
+    streamed, elapsed = fetch_matching_objects(
+        contents, app_logger, max_workers,
+        lambda obj: stream_file_if_matching(
+            obj['Key'], s_three, app_logger, bucket_name, limits[obj['Key']]),
+        require_all)
+    if manifest_conn is not None:
+        manifest.mark_objects_fetched(
+            manifest_conn, [obj for obj, _ in streamed])
+
+    log_download_stats(app_logger,
+                       [obj['Size'] for obj, _ in streamed],
+                       [seconds for _, (_, seconds) in streamed],
+                       elapsed)
+    return {get_local_name(obj['Key']): buffer for obj, (buffer, _) in streamed}
+
+
+def download_truck_data_files(app_logger: logging.Logger,
+                              max_workers: int = None,
+                              prefixes: list = None) -> dict:
+    """Downloads new or changed files from S3 to the current working directory.
+    When backfilling prefixes, a failed listing or object raises instead, so the
+    folder is not checkpointed as complete with files missing."""
     s_three = get_s_three_client()
+    manifest_conn = manifest.get_manifest_connection()
     app_logger.info("Starting download process...")
-    bucket_name, folder_path = access_correct_folder(app_logger)
 
     try:
-        contents = list_s_three_objects(s_three, bucket_name, folder_path)
+        bucket_name, contents = get_objects_to_fetch(
+            app_logger, s_three, manifest_conn, prefixes)
         if not contents:
-            app_logger.warning("No files found in the bucket.")
-            return
-
-        for obj in contents:
-            app_logger.info(f"Found object: {obj['Key']}")
-            download_file_if_matching(
-                obj['Key'], s_three, app_logger)
+            app_logger.warning("No new files found in the bucket.")
+            return None
 
+        stats = download_objects(s_three, bucket_name, contents, app_logger,
+                                 max_workers or get_max_workers(),
+                                 manifest_conn, require_all=bool(prefixes))
         app_logger.info("Download Complete!")
+        return stats
 
     except botocore.exceptions.ClientError as e:
         app_logger.error("Error accessing bucket or listing objects: %s", e)
+        if prefixes:
+            raise
+        return None
+
+    finally:
+        manifest_conn.close()
+
+
+def stream_truck_data_files(app_logger: logging.Logger,
+                            max_workers: int = None,
+                            prefixes: list = None) -> dict:
+    """Streams new or changed files from S3 into buffers without writing to the
+    working directory. Returns the buffers keyed by their local name.
+    When backfilling prefixes, a failed listing or object raises instead, so the
+    folder is not checkpointed as complete with files missing."""
+    s_three = get_s_three_client()
+    manifest_conn = manifest.get_manifest_connection()
+    app_logger.info("Starting streaming process...")
+
+    try:
+        bucket_name, contents = get_objects_to_fetch(
+            app_logger, s_three, manifest_conn, prefixes)
+        if not contents:
+            app_logger.warning("No new files found in the bucket.")
+            return {}
+
+        buffers = stream_objects(s_three, bucket_name, contents, app_logger,
+                                 max_workers or get_max_workers(),
+                                 manifest_conn, require_all=bool(prefixes))
+        app_logger.info("Streaming Complete!")
+        return buffers
+
+    except botocore.exceptions.ClientError as e:
+        app_logger.error("Error accessing bucket or listing objects: %s", e)
+        if prefixes:
+            raise
+        return {}
+
+    finally:
+        manifest_conn.close()
+
+
+def add_backfill_argument(parser: argparse.ArgumentParser) -> None:
+    """Adds the --backfill option shared by the extract and pipeline scripts."""
+    parser.add_argument(
+        "--backfill", nargs="+", metavar="PREFIX",
+        help="Fetch unloaded files under these trucks/YYYY-MM/D/H prefixes "
+             "instead of the current slot.")
+
+
+def parse_arguments(args: list = None) -> argparse.Namespace:
+    """Parses the command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_backfill_argument(parser)
+    return parser.parse_args(args)
 
 
-def main() -> None:
+def main(prefixes: list = None) -> None:
     """Main function calling other functions."""
     load_dotenv()
     logger = configure_logger()
-    download_truck_data_files(logger)
+    download_truck_data_files(logger, prefixes=prefixes)
+    log_s_three_stats(logger)
 
 
 if __name__ == "__main__":
-    main()
+    main(prefixes=parse_arguments().backfill)
@@ -1,18 +1,77 @@
 PREFIX = 'T3_T'
 SUFFIX = '.csv'
 
-LOCAL_PATH = -1
 VALID_TIMES = {12, 15, 18, 21}
 
+DEFAULT_DOWNLOAD_WORKERS = 8
+DEFAULT_BACKFILL_WORKERS = 4
+BYTES_PER_MEGABYTE = 1024 * 1024
+S_THREE_MAX_POOL_CONNECTIONS = 10
+S_THREE_MAX_ATTEMPTS = 5
+
+IN_MEMORY_MAX_BYTES = 64 * 1024 * 1024
+IN_MEMORY_TOTAL_MAX_BYTES = 256 * 1024 * 1024
+STREAM_CHUNK_BYTES = 1024 * 1024
+IN_MEMORY_EXTRACT_MODE = 'memory'
+DISK_EXTRACT_MODE = 'disk'
+
+MANIFEST_PATH = 'ingested_manifest.db'
+MANIFEST_S3_KEY = 'manifest/ingested_manifest.db'
+MANIFEST_TIMEOUT_SECONDS = 60
+MANIFEST_FETCHED = 'fetched'
+MANIFEST_LOADED = 'loaded'
+LATE_FILE_LOOKBACK_SLOTS = 1
+
 TRUCK_ID_POSITION = -1
 TRUCK_ID_EXTENSION_POSITION = 0
 DATA = 1
 
 
-TOTAL_INVALID_BLANK = 'blank'
-TOTAL_INVALID_VOID = 'VOID'
-TOTAL_INVALID_ERR = 'ERR'
-TOTAL_INVALID_ZERO = 0.00
-TOTAL_MAXIMUM_VALUE = 20
+TRANSACTION_COLUMNS = ['timestamp', 'type', 'total']
+TRANSACTION_DTYPES = {'timestamp': str, 'type': str, 'total': str}
+DEFAULT_TRANSFORM_WORKERS = 4
+DEFAULT_TRANSFORM_CHUNK_ROWS = 50000
+
+TOTAL_MINIMUM_VALUE = 0.00
+TOTAL_MAXIMUM_VALUE = 50
+PAYMENT_METHOD_TYPES = ['card', 'cash']
+TIMESTAMP_FORMAT = 'ISO8601'
+
+TRANSACTION_SCHEMA = {
+    'timestamp': {'dtype': 'datetime', 'format': TIMESTAMP_FORMAT},
+    'type': {'dtype': 'category', 'categories': PAYMENT_METHOD_TYPES},
+    'total': {'dtype': 'float64',
+              'greater_than': {'bound': TOTAL_MINIMUM_VALUE, 'rule': 'total_not_positive'},
+              'at_most': {'bound': TOTAL_MAXIMUM_VALUE, 'rule': 'total_above_maximum'}}
+}
+REJECT_DUPLICATE = 'duplicate'
+
+QUARANTINE_PATH = 'quarantine'
+QUARANTINE_FLUSH_ROWS = 100000
+QUARANTINE_UNKNOWN_DATE = 'unknown'
+
+PROCESSED_DATA_NAME = "PROCESSED_TRUCK_DATA.parquet"
+PARQUET_COMPRESSION = 'zstd'
+
+FACT_TRANSACTION_COLUMNS = ['at', 'payment_method_id', 'total', 'truck_id',
+                            'transaction_fingerprint']
+DEFAULT_LOAD_BATCH_SIZE = 5000
+DEFAULT_LOAD_COMMIT_ROWS = 50000
+LOAD_MAX_ATTEMPTS = 5
+LOAD_RETRY_BASE_SECONDS = 1.0
+BATCH_LOAD_MODE = 'batch'
+COPY_LOAD_MODE = 'copy'
+MERGE_LOAD_MODE = 'merge'
+LOAD_MODES = (MERGE_LOAD_MODE, BATCH_LOAD_MODE, COPY_LOAD_MODE)
+MERGE_STAGING_TABLE = 'stage_fact_transaction'
+FINGERPRINT_STAGING_TABLE = 'stage_transaction_fingerprint'
+
+ROLLUP_TABLE = 'rollup_transaction_hourly'
+ROLLUP_DELTA_TABLE = 'stage_rollup_transaction_hourly'
+ROLLUP_KEY_COLUMNS = ['hour_start', 'truck_id', 'payment_method_id']
+ROLLUP_MEASURE_COLUMNS = ['transaction_count', 'total_sum', 'total_sum_of_squares']
+COPY_STAGING_PREFIX = 'staging'
+COPY_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
 
-CSV_NAME = "PROCESSED_TRUCK_DATA.csv"
+REJECT_UNKNOWN_TRUCK = 'unknown_truck'
+REJECT_UNKNOWN_PAYMENT_METHOD = 'unknown_payment_method'
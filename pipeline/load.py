@@ -1,25 +1,37 @@
-"""Script that will load cleaned data to a live redshift database."""
+"""Script that will load cleaned data to the data warehouse."""
 
+import io
+import time
+import hashlib
 import logging
 import os
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from itertools import chain
+from datetime import datetime
 import redshift_connector
+import numpy as np
 import pandas as pd
 from redshift_connector import Connection, Cursor
 from dotenv import load_dotenv
-from transform import clean_data, delete_csv_files
-from extract import configure_logger
+from transform import clean_data_in_chunks, read_processed_data, delete_csv_files
+from extract import configure_logger, get_s_three_client
 import global_variables as gv
+import manifest
+from quarantine import QuarantineSink
+import shared_path  # pylint: disable=unused-import
+from warehouse import get_warehouse
+from snapshot_store import get_snapshot_store, invalidate_snapshots
+from rollup import update_rollup, update_rollup_from_table
+
+TRANSIENT_ERRORS = (redshift_connector.InterfaceError,
+                    redshift_connector.OperationalError)
 
 
 def get_connection() -> Connection:
-    """Establish a connection to a redshift database."""
-    return redshift_connector.connect(
-        host=os.getenv('DB_HOST'),
-        database=os.getenv('DB_NAME'),
-        user=os.getenv('DB_USERNAME'),
-        password=os.getenv('DB_PASSWORD'),
-        port=os.getenv('DB_PORT')
-    )
+    """Establish a connection to the configured warehouse."""
+    return get_warehouse().connect()
 
 
 def get_cursor(conn: Connection) -> Cursor:
@@ -27,62 +39,335 @@ def get_cursor(conn: Connection) -> Cursor:
     return conn.cursor()
 
 
-def get_foreign_key(db_cursor: Cursor, table_name: str,
-                    column_name: str, value: str) -> int:
-    """Gets foreign keys."""
-    db_cursor.execute(
-        f"SELECT * FROM {table_name} WHERE {column_name} = %s", (value,))
-    result = db_cursor.fetchone()
-    if result:
-        return result[0]
-    raise ValueError('Invalid Data!')
+def load_dimension(db_cursor: Cursor, table_name: str,
+                   key_column: str, value_column: str) -> dict:
+    """Loads a whole dimension table into a map from value to surrogate key."""
+    db_cursor.execute(f"SELECT {key_column}, {value_column} FROM {table_name}")
+    return {value: key for key, value in db_cursor.fetchall()}
+
+
+def load_dimension_maps(db_cursor: Cursor) -> dict:
+    """Loads every dimension used by fact_transaction once per run."""
+    return {
+        'truck_id': load_dimension(
+            db_cursor, 'dim_truck', 'truck_id', 'truck_id'),
+        'payment_method_id': load_dimension(
+            db_cursor, 'dim_payment_method', 'payment_method_id', 'payment_method_type')
+    }
 
 
 def set_schema(db_cursor: Cursor, db_schema: str) -> None:
     """Sets the search path for the database schema."""
-    db_cursor.execute(f"SET search_path TO {db_schema}")
+    get_warehouse().set_schema(db_cursor, db_schema)
+
+
+def insert_query(db_cursor: Cursor, table: str, columns: list, rows: list) -> None:
+    """Inserts many rows into a table with the warehouse's bulk INSERT."""
+    get_warehouse().bulk_load(db_cursor, table, columns, rows)
+
+
+def mix_fingerprint(values: np.ndarray) -> np.ndarray:
+    """Applies the splitmix64 finaliser so every input bit affects every output bit."""
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return values ^ (values >> np.uint64(31))
+
+
+def get_transaction_fingerprints(transactions: pd.DataFrame) -> np.ndarray:
+    """Returns a signed 64-bit fingerprint of each transaction's truck, timestamp,
+    type and total. It is computed from the values alone, so the same transaction
+    has the same fingerprint in every run."""
+    codes, types = pd.factorize(transactions['type'].astype('string'))
+    type_hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(payment_type.encode(), digest_size=8).digest(),
+                        'big') for payment_type in types] + [0],
+        dtype=np.uint64)
+
+    fields = [
+        transactions['truck_id'].to_numpy(dtype='int64'),
+        transactions['timestamp'].to_numpy(dtype='datetime64[us]').view('int64'),
+        type_hashes[codes],
+        np.rint(transactions['total'].to_numpy(dtype='float64') * 100).astype('int64')
+    ]
+    fingerprints = np.zeros(len(transactions), dtype=np.uint64)
+    for field in fields:
+        fingerprints = mix_fingerprint(fingerprints ^ field.view('uint64'))
+    return fingerprints.view('int64')
+
+
+def build_fact_transactions(transactions: pd.DataFrame, dimension_maps: dict) -> tuple:
+    """Resolves foreign keys for the whole frame from the cached dimension maps.
+    Returns the rows to insert into fact_transaction and the rejected rows,
+    tagged with the reason they could not be resolved."""
+    fact_transactions = pd.DataFrame({
+        'at': transactions['timestamp'],
+        'payment_method_id': transactions['type'].map(
+            dimension_maps['payment_method_id']),
+        'total': transactions['total'],
+        'truck_id': transactions['truck_id'].map(dimension_maps['truck_id']),
+        'transaction_fingerprint': get_transaction_fingerprints(transactions)
+    }, columns=gv.FACT_TRANSACTION_COLUMNS)
+
+    unknown_payment_method = fact_transactions['payment_method_id'].isna()
+    unknown_truck = fact_transactions['truck_id'].isna()
+    rejected = transactions[unknown_payment_method | unknown_truck].copy()
+    rejected['reason'] = unknown_truck.loc[rejected.index].map(
+        {True: gv.REJECT_UNKNOWN_TRUCK, False: gv.REJECT_UNKNOWN_PAYMENT_METHOD})
+
+    fact_transactions = fact_transactions[~(unknown_payment_method | unknown_truck)]
+    return fact_transactions.astype({'payment_method_id': 'int64',
+                                     'truck_id': 'int64'}), rejected
+
+
+def get_row_values(fact_transactions: pd.DataFrame) -> list:
+    """Converts fact rows to tuples of native Python values for the connector."""
+    return list(zip(fact_transactions['at'].dt.to_pydatetime().tolist(),
+                    fact_transactions['payment_method_id'].tolist(),
+                    fact_transactions['total'].tolist(),
+                    fact_transactions['truck_id'].tolist(),
+                    fact_transactions['transaction_fingerprint'].tolist()))
+
+
+def get_batch_size() -> int:
+    """Returns the number of rows sent in each INSERT statement."""
+    return int(os.getenv("LOAD_BATCH_SIZE", str(gv.DEFAULT_LOAD_BATCH_SIZE)))
+
+
+def is_copy_configured() -> bool:
+    """Checks if a staging bucket and IAM role are configured for COPY."""
+    return bool(os.getenv("COPY_S3_BUCKET") and os.getenv("COPY_IAM_ROLE"))
+
+
+def get_load_mode() -> str:
+    """Returns the LOAD_MODE, defaulting to merge. The warehouse does not enforce the
+    fingerprint's UNIQUE constraint, so only merge keeps a rerun from counting the same
+    transactions twice; batch and copy append blindly and must be asked for."""
+    load_mode = os.getenv("LOAD_MODE", gv.MERGE_LOAD_MODE)
+    if load_mode not in gv.LOAD_MODES:
+        raise ValueError(f"Unknown LOAD_MODE '{load_mode}', "
+                         f"expected one of {', '.join(gv.LOAD_MODES)}.")
+    return load_mode
+
+
+def insert_transaction_batches(db_cursor: Cursor, fact_transactions: pd.DataFrame,
+                               batch_size: int, table: str = 'fact_transaction') -> None:
+    """Inserts fact rows with one multi-row INSERT per batch."""
+    rows = get_row_values(fact_transactions)
+    for start in range(0, len(rows), batch_size):
+        insert_query(db_cursor, table,
+                     gv.FACT_TRANSACTION_COLUMNS, rows[start:start + batch_size])
+
+
+def stage_fact_transactions(fact_transactions: pd.DataFrame,
+                            bucket_name: str, key: str) -> None:
+    """Writes fact rows to S3 as a gzipped CSV ready for COPY."""
+    buffer = io.BytesIO()
+    fact_transactions.to_csv(buffer, index=False, header=False,
+                             compression='gzip', date_format=gv.COPY_TIMESTAMP_FORMAT)
+    get_s_three_client().put_object(
+        Bucket=bucket_name, Key=key, Body=buffer.getvalue())
+
 
+def copy_fact_transactions(db_cursor: Cursor, fact_transactions: pd.DataFrame,
+                           table: str = 'fact_transaction') -> None:
+    """Stages fact rows in S3 and loads them with a single COPY statement."""
+    bucket_name = os.getenv("COPY_S3_BUCKET")
+    key = (f"{gv.COPY_STAGING_PREFIX}/fact_transaction_"
+           f"{datetime.now():%Y%m%dT%H%M%S%f}.csv.gz")
 
-def insert_query(db_cursor: Cursor, table: str, columns: list, values: tuple) -> None:
-    """Query for inserting data into a database."""
-    query = f"INSERT INTO {
-        table} ({', '.join(columns)}) VALUES (%s, %s, %s, %s)"
+    stage_fact_transactions(fact_transactions, bucket_name, key)
+    try:
+        db_cursor.execute(
+            f"COPY {table} ({', '.join(gv.FACT_TRANSACTION_COLUMNS)}) "
+            f"FROM 's3://{bucket_name}/{key}' "
+            f"IAM_ROLE '{os.getenv('COPY_IAM_ROLE')}' "
+            f"FORMAT AS CSV GZIP TIMEFORMAT 'auto'")
+    finally:
+        get_s_three_client().delete_object(Bucket=bucket_name, Key=key)
 
-    db_cursor.execute(query, values)
 
+def merge_fact_transactions(db_cursor: Cursor, fact_transactions: pd.DataFrame) -> None:
+    """Loads fact rows into a temporary staging table, drops the staged rows whose
+    fingerprint is already in fact_transaction, and inserts the rest with one
+    INSERT ... SELECT, adding the same rows to the rollup. Loading the same
+    transactions again adds nothing, and a failed batch leaves nothing behind
+    once the transaction is rolled back."""
+    columns = ', '.join(gv.FACT_TRANSACTION_COLUMNS)
+    db_cursor.execute(f"""
+        CREATE TEMP TABLE {gv.MERGE_STAGING_TABLE} (
+            at TIMESTAMP NOT NULL,
+            payment_method_id SMALLINT,
+            total DECIMAL(10, 2) NOT NULL,
+            truck_id BIGINT,
+            transaction_fingerprint BIGINT NOT NULL
+        )""")
+    if is_copy_configured():
+        copy_fact_transactions(db_cursor, fact_transactions, gv.MERGE_STAGING_TABLE)
+    else:
+        insert_transaction_batches(db_cursor, fact_transactions, get_batch_size(),
+                                   gv.MERGE_STAGING_TABLE)
+    db_cursor.execute(
+        f"DELETE FROM {gv.MERGE_STAGING_TABLE} WHERE transaction_fingerprint IN "
+        f"(SELECT transaction_fingerprint FROM fact_transaction)")
+    db_cursor.execute(
+        f"INSERT INTO fact_transaction ({columns}) "
+        f"SELECT {columns} FROM {gv.MERGE_STAGING_TABLE}")
+    update_rollup_from_table(db_cursor, gv.MERGE_STAGING_TABLE)
+    db_cursor.execute(f"DROP TABLE {gv.MERGE_STAGING_TABLE}")
+
+
+def load_fact_transactions(db_cursor: Cursor, fact_transactions: pd.DataFrame,
+                           load_mode: str) -> None:
+    """Loads one batch of fact rows with the given load mode, keeping the hourly
+    rollup in step within the same transaction."""
+    if load_mode == gv.MERGE_LOAD_MODE:
+        merge_fact_transactions(db_cursor, fact_transactions)
+        return
+    if load_mode == gv.COPY_LOAD_MODE:
+        copy_fact_transactions(db_cursor, fact_transactions)
+    else:
+        insert_transaction_batches(db_cursor, fact_transactions, get_batch_size())
+    update_rollup(db_cursor, fact_transactions)
+
+
+def get_transaction_batches(db_logger: logging.Logger,
+                            quarantine: QuarantineSink = None):
+    """Returns the cleaned batches to load: read from the processed Parquet artifact,
+    or cleaned from the downloaded files when it is missing."""
+    if os.path.isfile(gv.PROCESSED_DATA_NAME):
+        db_logger.info(f"Loading processed data from {gv.PROCESSED_DATA_NAME}.")
+        return read_processed_data(gv.PROCESSED_DATA_NAME)
+    db_logger.warning(
+        f"{gv.PROCESSED_DATA_NAME} not found. Cleaning the downloaded files instead.")
+    return clean_data_in_chunks(db_logger, quarantine=quarantine)
+
+
+def get_commit_rows() -> int:
+    """Returns the number of input rows committed in each transaction."""
+    return int(os.getenv("LOAD_COMMIT_ROWS", str(gv.DEFAULT_LOAD_COMMIT_ROWS)))
+
+
+def iter_commit_batches(batches, commit_rows: int, committed_rows: int = 0):
+    """Splits the cleaned batches into slices of at most commit_rows rows, yielding
+    each slice with the input offset it ends at. Rows before committed_rows were
+    committed by an earlier attempt and are skipped."""
+    offset = 0
+    for transactions in batches:
+        for start in range(0, len(transactions), commit_rows):
+            chunk = transactions.iloc[start:start + commit_rows]
+            end = offset + len(chunk)
+            if end > committed_rows:
+                yield end, chunk.iloc[max(committed_rows - offset, 0):]
+            offset = end
+
+
+class LoadProgress:
+    """Tracks what a load has committed, persisting the committed input offset to
+    the manifest so a retry, or a later run on the same artifact, resumes after it."""
 
-def get_foreign_keys(db_cursor: Cursor, row: pd.Series) -> tuple:
-    """Retrieves foreign keys for the truck and payment method based on the row data."""
-    truck_id = get_foreign_key(
-        db_cursor, 'dim_truck', 'truck_id', row['truck_id'])
-    payment_method_id = get_foreign_key(
-        db_cursor, 'dim_payment_method', 'payment_method_type', row['type'])
-    return truck_id, payment_method_id
+    def __init__(self, manifest_conn: sqlite3.Connection, load_key: str = None):
+        self.manifest_conn = manifest_conn
+        self.load_key = load_key
+        self.committed_rows = (manifest.get_load_checkpoint(manifest_conn, load_key)
+                               if load_key else 0)
+        self.loaded = 0
+        self.rejected_reasons = Counter()
+        self.pending = None
 
+    def mark_committed(self, offset: int, loaded: int, reasons: pd.Series) -> None:
+        """Records a committed slice and checkpoints its offset."""
+        self.committed_rows = offset
+        self.loaded += loaded
+        self.rejected_reasons.update(reasons.tolist())
+        self.pending = None
+        if self.load_key:
+            manifest.save_load_checkpoint(self.manifest_conn, self.load_key, offset)
 
-def upload_row_to_database(db_cursor: Cursor, row: pd.Series) -> None:
-    """Uploads a single row of transaction data to the database."""
-    truck_id, payment_method_id = get_foreign_keys(db_cursor, row)
+    def complete(self) -> None:
+        """Removes the checkpoint once every slice has been committed."""
+        if self.load_key:
+            manifest.clear_load_checkpoint(self.manifest_conn, self.load_key)
 
-    values = (row['timestamp'], payment_method_id, row['total'], truck_id)
-    insert_query(db_cursor, 'fact_transaction',
-                 ['at', 'payment_method_id', 'total', 'truck_id'],
-                 values)
 
+@contextmanager
+def open_connection():
+    """Opens a connection and cursor on DB_SCHEMA, closing the connection on exit."""
+    conn = get_connection()
+    try:
+        db_cursor = get_cursor(conn)
+        set_schema(db_cursor, os.getenv("DB_SCHEMA"))
+        yield conn, db_cursor
+    finally:
+        conn.close()
 
-def upload_transaction_data(conn: Connection, db_cursor: Cursor, db_logger: logging.Logger) -> None:
-    """Uploads transaction data to the database."""
-    transactions = clean_data(db_logger)
-    set_schema(db_cursor, os.getenv("DB_SCHEMA"))
 
-    for row in transactions.iterrows():
-        upload_row_to_database(db_cursor, row[gv.DATA])
+def get_loaded_days(fact_transactions: pd.DataFrame) -> list:
+    """Returns the distinct days the fact rows fall on."""
+    return list(pd.DatetimeIndex(fact_transactions['at'].dt.floor('D').unique()).date)
 
-    conn.commit()
+
+def upload_transaction_data(conn: Connection, db_cursor: Cursor, commit_batches,
+                            progress: LoadProgress,
+                            quarantine: QuarantineSink = None) -> None:
+    """Uploads transaction data to the database, committing one slice at a time.
+    Once a slice is committed, the stored report snapshots of its days are deleted,
+    so a late file or a backfill is never hidden behind a stale report.
+    Rows with unknown dimension values go to the quarantine sink when one is given."""
+    dimension_maps = load_dimension_maps(db_cursor)
+    load_mode = get_load_mode()
+    snapshot_store = get_snapshot_store()
+
+    for offset, transactions in commit_batches:
+        progress.pending = (offset, transactions)
+        fact_transactions, rejected = build_fact_transactions(
+            transactions, dimension_maps)
+        if not fact_transactions.empty:
+            load_fact_transactions(db_cursor, fact_transactions, load_mode)
+        conn.commit()
+        if not fact_transactions.empty:
+            invalidate_snapshots(get_loaded_days(fact_transactions), snapshot_store)
+
+        progress.mark_committed(offset, len(fact_transactions), rejected['reason'])
+        if quarantine is not None:
+            quarantine.add(rejected)
+
+
+def get_retry_delay(attempt: int) -> float:
+    """Returns the seconds to wait before retrying, doubling with each attempt."""
+    return gv.LOAD_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+
+
+def upload_with_retry(batches, db_logger: logging.Logger, progress: LoadProgress,
+                      quarantine: QuarantineSink = None) -> None:
+    """Uploads the batches, reconnecting with exponential backoff after a transient
+    error and resuming from the slice that was not committed."""
+    commit_batches = iter_commit_batches(batches, get_commit_rows(),
+                                         progress.committed_rows)
+    if progress.committed_rows:
+        db_logger.info(f"Resuming load after {progress.committed_rows} committed rows.")
+
+    for attempt in range(1, gv.LOAD_MAX_ATTEMPTS + 1):
+        remaining = (commit_batches if progress.pending is None
+                     else chain([progress.pending], commit_batches))
+        try:
+            with open_connection() as (conn, db_cursor):
+                upload_transaction_data(conn, db_cursor, remaining, progress, quarantine)
+            return
+        except TRANSIENT_ERRORS as load_error:
+            if attempt == gv.LOAD_MAX_ATTEMPTS:
+                db_logger.error(
+                    f"Load failed after {attempt} attempts with "
+                    f"{progress.committed_rows} rows committed: {load_error}")
+                raise
+            delay = get_retry_delay(attempt)
+            db_logger.warning(
+                f"Load attempt {attempt} failed with {progress.committed_rows} rows "
+                f"committed: {load_error}. Retrying in {delay:.1f}s.")
+            time.sleep(delay)
 
 
 def delete_all_csv_files(filename: str, logger: logging.Logger) -> None:
-    """Deletes all CSV files."""
+    """Deletes the downloaded CSV files and the processed data file."""
     delete_csv_files(logger)
     if os.path.isfile(filename):
         os.remove(filename)
@@ -91,16 +376,58 @@ def delete_all_csv_files(filename: str, logger: logging.Logger) -> None:
         logger.warning(f"File not found: {filename}. No action taken.")
 
 
+def get_load_key(path: str) -> str:
+    """Identifies a processed artifact by its path, size and modification time,
+    so a rewritten artifact does not resume from a stale checkpoint."""
+    if not path or not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_transactions(batches, db_logger: logging.Logger,
+                      quarantine: QuarantineSink = None, prefixes: list = None,
+                      load_key: str = None) -> int:
+    """Loads the cleaned batches and marks their source objects as loaded in the manifest,
+    limited to the given folder prefixes when there are any. Progress is checkpointed
+    under load_key when one is given. Returns the number of rows loaded."""
+    manifest_conn = manifest.get_manifest_connection()
+    try:
+        progress = LoadProgress(manifest_conn, load_key)
+        start = time.perf_counter()
+        upload_with_retry(batches, db_logger, progress, quarantine)
+        elapsed = time.perf_counter() - start
+        progress.complete()
+
+        if progress.rejected_reasons:
+            db_logger.warning(
+                f"Rejected {sum(progress.rejected_reasons.values())} rows with unknown "
+                f"dimension values: {dict(progress.rejected_reasons)}")
+        if progress.loaded:
+            db_logger.info(
+                f"Loaded {progress.loaded} rows with {get_load_mode()} in {elapsed:.3f}s "
+                f"({progress.loaded / elapsed if elapsed else 0:.0f} rows/s).")
+        else:
+            db_logger.info("No new transactions to upload.")
+
+        marked = manifest.mark_fetched_objects_loaded(manifest_conn, prefixes)
+        db_logger.info(f"Marked {marked} objects as loaded in the manifest.")
+        return progress.loaded
+    finally:
+        manifest_conn.close()
+
+
 def main() -> None:
     """Main function calling other functions."""
     load_dotenv()
 
     logger = configure_logger()
 
-    db_conn = get_connection()
-    cursor = get_cursor(db_conn)
-    upload_transaction_data(db_conn, cursor, logger)
-    delete_all_csv_files(gv.CSV_NAME, logger)
+    with QuarantineSink(logger) as quarantine:
+        load_transactions(get_transaction_batches(logger, quarantine),
+                          logger, quarantine,
+                          load_key=get_load_key(gv.PROCESSED_DATA_NAME))
+    delete_all_csv_files(gv.PROCESSED_DATA_NAME, logger)
 
 
 if __name__ == "__main__":
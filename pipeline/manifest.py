@@ -0,0 +1,189 @@
+"""Keeps a persisted record of which S3 objects have already been loaded,
+    so reruns only fetch new or changed files. The SQLite file lives on the task's
+    local disk during a run and is restored from and saved to S3 around it."""
+import os
+import logging
+import sqlite3
+from datetime import datetime
+import pytz
+from botocore.exceptions import ClientError
+import global_variables as gv
+import extract
+
+
+def get_manifest_path() -> str:
+    """Returns the local path of the manifest database."""
+    return os.getenv("MANIFEST_PATH", gv.MANIFEST_PATH)
+
+
+def get_manifest_location() -> tuple:
+    """Returns the bucket and key the manifest is persisted under, or None when
+    MANIFEST_S3_BUCKET is not set."""
+    bucket = os.getenv("MANIFEST_S3_BUCKET")
+    if not bucket:
+        return None
+    return bucket, os.getenv("MANIFEST_S3_KEY", gv.MANIFEST_S3_KEY)
+
+
+def restore_manifest(logger: logging.Logger) -> None:
+    """Downloads the persisted manifest before a run. When neither MANIFEST_S3_BUCKET
+    nor MANIFEST_PATH is set, the local file is used with a warning: on the task's
+    ephemeral disk every run starts from an empty manifest."""
+    location = get_manifest_location()
+    if location is None:
+        if not os.getenv("MANIFEST_PATH"):
+            logger.warning(
+                f"The manifest is not persisted; using {get_manifest_path()} on local "
+                f"disk. Set MANIFEST_S3_BUCKET, or set MANIFEST_PATH to a file on "
+                f"durable storage.")
+        return
+
+    bucket, key = location
+    try:
+        extract.get_s_three_client().download_file(bucket, key, get_manifest_path())
+        logger.info(f"Restored the manifest from s3://{bucket}/{key}.")
+    except ClientError as error:
+        if error.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            raise
+        logger.warning(f"No manifest at s3://{bucket}/{key}; starting a new one.")
+
+
+def save_manifest(logger: logging.Logger) -> None:
+    """Uploads the manifest after a run, when MANIFEST_S3_BUCKET is set. The
+    write-ahead log is checkpointed first, so the file holds every commit."""
+    location = get_manifest_location()
+    if location is None:
+        return
+
+    conn = get_manifest_connection()
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    bucket, key = location
+    extract.get_s_three_client().upload_file(get_manifest_path(), bucket, key)
+    logger.info(f"Saved the manifest to s3://{bucket}/{key}.")
+
+
+def get_manifest_connection(path: str = None) -> sqlite3.Connection:
+    """Opens the manifest database, creating the table if it does not exist.
+    Backfill workers share the file, so it uses write-ahead logging, letting reads
+    run alongside a write, and writers wait for the lock instead of failing."""
+    conn = sqlite3.connect(path or get_manifest_path(),
+                           timeout=gv.MANIFEST_TIMEOUT_SECONDS)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingested_object (
+            key TEXT NOT NULL,
+            etag TEXT NOT NULL,
+            size INTEGER,
+            last_modified TEXT,
+            status TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (key, etag)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS backfilled_partition (
+            prefix TEXT PRIMARY KEY,
+            rows_loaded INTEGER NOT NULL,
+            completed_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS load_checkpoint (
+            load_key TEXT PRIMARY KEY,
+            committed_rows INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+    return conn
+
+
+def get_object_etag(obj: dict) -> str:
+    """Returns the ETag of a listed S3 object without its surrounding quotes."""
+    return obj['ETag'].strip('"')
+
+
+def filter_unloaded_objects(conn: sqlite3.Connection, contents: list) -> list:
+    """Returns the listed objects whose key and ETag have not been loaded yet."""
+    loaded = set(conn.execute(
+        "SELECT key, etag FROM ingested_object WHERE status = ?",
+        (gv.MANIFEST_LOADED,)).fetchall())
+    return [obj for obj in contents
+            if (obj['Key'], get_object_etag(obj)) not in loaded]
+
+
+def mark_objects_fetched(conn: sqlite3.Connection, objects: list) -> None:
+    """Records objects that have been fetched but not loaded yet."""
+    now = datetime.now(pytz.utc).isoformat()
+    conn.executemany("""
+        INSERT INTO ingested_object (key, etag, size, last_modified, status, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (key, etag) DO UPDATE
+        SET status = excluded.status, updated_at = excluded.updated_at
+        WHERE ingested_object.status != ?
+    """, [(obj['Key'], get_object_etag(obj), obj.get('Size'),
+           str(obj.get('LastModified')), gv.MANIFEST_FETCHED, now,
+           gv.MANIFEST_LOADED)
+          for obj in objects])
+    conn.commit()
+
+
+def mark_fetched_objects_loaded(conn: sqlite3.Connection, prefixes: list = None) -> int:
+    """Marks every fetched object, or only those under the given folder prefixes,
+    as loaded. Returns the number of objects marked."""
+    query = "UPDATE ingested_object SET status = ?, updated_at = ? WHERE status = ?"
+    params = [gv.MANIFEST_LOADED, datetime.now(pytz.utc).isoformat(),
+              gv.MANIFEST_FETCHED]
+    if prefixes:
+        query += " AND (" + " OR ".join(["key LIKE ?"] * len(prefixes)) + ")"
+        params.extend(f"{prefix.rstrip('/')}/%" for prefix in prefixes)
+
+    cursor = conn.execute(query, params)
+    conn.commit()
+    return cursor.rowcount
+
+
+def get_completed_partitions(conn: sqlite3.Connection) -> set:
+    """Returns the folder prefixes a backfill has already loaded."""
+    return {prefix for (prefix,) in conn.execute(
+        "SELECT prefix FROM backfilled_partition").fetchall()}
+
+
+def mark_partition_completed(conn: sqlite3.Connection, prefix: str,
+                             rows_loaded: int) -> None:
+    """Records that a backfill has loaded every file under the folder prefix."""
+    conn.execute("""
+        INSERT INTO backfilled_partition (prefix, rows_loaded, completed_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT (prefix) DO UPDATE
+        SET rows_loaded = excluded.rows_loaded, completed_at = excluded.completed_at
+    """, (prefix, rows_loaded, datetime.now(pytz.utc).isoformat()))
+    conn.commit()
+
+
+def get_load_checkpoint(conn: sqlite3.Connection, load_key: str) -> int:
+    """Returns the input rows an interrupted load of the artifact already committed."""
+    row = conn.execute("SELECT committed_rows FROM load_checkpoint WHERE load_key = ?",
+                       (load_key,)).fetchone()
+    return row[0] if row else 0
+
+
+def save_load_checkpoint(conn: sqlite3.Connection, load_key: str,
+                         committed_rows: int) -> None:
+    """Records the input rows committed so far by a load of the artifact."""
+    conn.execute("""
+        INSERT INTO load_checkpoint (load_key, committed_rows, updated_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT (load_key) DO UPDATE
+        SET committed_rows = excluded.committed_rows, updated_at = excluded.updated_at
+    """, (load_key, committed_rows, datetime.now(pytz.utc).isoformat()))
+    conn.commit()
+
+
+def clear_load_checkpoint(conn: sqlite3.Connection, load_key: str) -> None:
+    """Removes the checkpoint once the artifact has been loaded in full."""
+    conn.execute("DELETE FROM load_checkpoint WHERE load_key = ?", (load_key,))
+    conn.commit()
@@ -0,0 +1,135 @@
+"""Migrates an existing fact_transaction to fingerprinted loads: adds the
+    transaction_fingerprint column, fingerprints the rows already loaded with the
+    same function the load uses, and removes the duplicates earlier reruns left,
+    so the merge load recognises reruns of data loaded before the migration."""
+import os
+import logging
+import pandas as pd
+from redshift_connector import Cursor
+from dotenv import load_dotenv
+import global_variables as gv
+from extract import configure_logger
+from load import get_transaction_fingerprints
+from rollup import rebuild_rollup
+import shared_path  # pylint: disable=unused-import
+from warehouse import get_warehouse
+
+
+def has_fingerprint_column(db_cursor: Cursor) -> bool:
+    """Checks if fact_transaction already has the transaction_fingerprint column."""
+    db_cursor.execute("SELECT * FROM fact_transaction LIMIT 0")
+    return 'transaction_fingerprint' in [desc[0] for desc in db_cursor.description]
+
+
+def add_fingerprint_column(db_cursor: Cursor) -> bool:
+    """Adds the fingerprint column when it is missing. Returns True if it was added.
+    The column stays nullable, as Redshift cannot add a NOT NULL column to a table
+    with rows; every row has a fingerprint once the migration finishes."""
+    if has_fingerprint_column(db_cursor):
+        return False
+    db_cursor.execute("ALTER TABLE fact_transaction ADD COLUMN transaction_fingerprint BIGINT")
+    return True
+
+
+def fetch_unfingerprinted(db_cursor: Cursor, batch_rows: int) -> pd.DataFrame:
+    """Returns up to batch_rows loaded transactions without a fingerprint, with the
+    values the fingerprint is computed from."""
+    placeholder = get_warehouse().placeholder
+    columns, rows = get_warehouse().query(db_cursor, f"""
+        SELECT ft.transaction_id, ft.at AS timestamp, dpm.payment_method_type AS type,
+               ft.total, ft.truck_id
+        FROM fact_transaction AS ft
+        LEFT JOIN dim_payment_method AS dpm ON ft.payment_method_id = dpm.payment_method_id
+        WHERE ft.transaction_fingerprint IS NULL
+        ORDER BY ft.transaction_id
+        LIMIT {placeholder}""", [batch_rows])
+    transactions = pd.DataFrame(rows, columns=columns)
+    return transactions.assign(timestamp=pd.to_datetime(transactions['timestamp']),
+                               total=transactions['total'].astype('float64'))
+
+
+def save_fingerprints(db_cursor: Cursor, transactions: pd.DataFrame) -> None:
+    """Writes the fingerprints of a batch through a temporary staging table."""
+    db_cursor.execute(f"""
+        CREATE TEMP TABLE {gv.FINGERPRINT_STAGING_TABLE} (
+            transaction_id BIGINT NOT NULL,
+            transaction_fingerprint BIGINT NOT NULL
+        )""")
+    get_warehouse().bulk_load(
+        db_cursor, gv.FINGERPRINT_STAGING_TABLE,
+        ['transaction_id', 'transaction_fingerprint'],
+        list(zip(transactions['transaction_id'].tolist(),
+                 get_transaction_fingerprints(transactions).tolist())))
+    db_cursor.execute(f"""
+        UPDATE fact_transaction
+        SET transaction_fingerprint = staged.transaction_fingerprint
+        FROM {gv.FINGERPRINT_STAGING_TABLE} AS staged
+        WHERE fact_transaction.transaction_id = staged.transaction_id""")
+    db_cursor.execute(f"DROP TABLE {gv.FINGERPRINT_STAGING_TABLE}")
+
+
+def fingerprint_loaded_rows(conn, db_cursor: Cursor, logger: logging.Logger,
+                            batch_rows: int = gv.DEFAULT_LOAD_COMMIT_ROWS) -> int:
+    """Fingerprints every row without one, committing one batch at a time so an
+    interrupted migration resumes where it stopped. Returns the rows fingerprinted."""
+    fingerprinted = 0
+    while True:
+        transactions = fetch_unfingerprinted(db_cursor, batch_rows)
+        if transactions.empty:
+            return fingerprinted
+        save_fingerprints(db_cursor, transactions)
+        conn.commit()
+        fingerprinted += len(transactions)
+        logger.info(f"Fingerprinted {fingerprinted} loaded transactions.")
+
+
+def delete_duplicate_transactions(db_cursor: Cursor) -> int:
+    """Deletes every transaction sharing its fingerprint with an earlier one, which
+    a rerun of the appending loads inserted. Returns the rows deleted."""
+    db_cursor.execute("SELECT COUNT(*) FROM fact_transaction")
+    before = db_cursor.fetchone()[0]
+    db_cursor.execute("""
+        DELETE FROM fact_transaction
+        WHERE transaction_fingerprint IS NOT NULL
+          AND transaction_id NOT IN (
+              SELECT MIN(transaction_id) FROM fact_transaction
+              WHERE transaction_fingerprint IS NOT NULL
+              GROUP BY transaction_fingerprint)""")
+    db_cursor.execute("SELECT COUNT(*) FROM fact_transaction")
+    return before - db_cursor.fetchone()[0]
+
+
+def migrate(conn, logger: logging.Logger) -> dict:
+    """Runs the migration. The rollup is rebuilt when duplicates were removed,
+    as it counted them too. Returns what each step changed."""
+    db_cursor = conn.cursor()
+    get_warehouse().set_schema(db_cursor, os.getenv("DB_SCHEMA"))
+    added = add_fingerprint_column(db_cursor)
+    conn.commit()
+
+    fingerprinted = fingerprint_loaded_rows(conn, db_cursor, logger)
+    duplicates = delete_duplicate_transactions(db_cursor)
+    if duplicates:
+        rebuild_rollup(db_cursor)
+    conn.commit()
+
+    logger.info(f"Fingerprint migration: column added {added}, {fingerprinted} rows "
+                f"fingerprinted, {duplicates} duplicate rows deleted.")
+    return {"column_added": added, "fingerprinted": fingerprinted,
+            "duplicates_deleted": duplicates}
+
+
+def main() -> None:
+    """Main function calling other functions."""
+    load_dotenv()
+    logger = configure_logger()
+
+    conn = get_warehouse().connect()
+    try:
+        migrate(conn, logger)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
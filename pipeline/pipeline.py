@@ -1,10 +1,195 @@
-"""Simple script to allow ETL pipeline to run in a single command."""
+"""Runs the ETL pipeline in a single process, passing data between stages in memory."""
+import os
+import time
+import logging
+import argparse
+from dotenv import load_dotenv
 import extract
 import transform
 import load
+import global_variables as gv
+import manifest
+from quarantine import QuarantineSink
+
+
+def get_buffer_size(buffer) -> int:
+    """Returns the size of a buffer in bytes, leaving it positioned at the start."""
+    size = buffer.seek(0, os.SEEK_END)
+    buffer.seek(0)
+    return size
+
+
+class BatchMeter:
+    """Counts the rows and in-memory bytes of batches as they stream through a
+    stage, so the metrics never need the batches held at once."""
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+
+    def meter(self, batches):
+        """Yields the batches unchanged, counting each one as it passes."""
+        for batch in batches:
+            self.rows += len(batch)
+            self.bytes += int(batch.memory_usage(deep=True).sum())
+            yield batch
+
+
+def open_downloaded_files(_runner=None) -> dict:
+    """Opens the CSV files left by a disk-mode extract as buffers keyed by file name."""
+    current_directory = transform.get_current_directory()
+    return {file: open(os.path.join(current_directory, file), 'rb')
+            for file in transform.get_csv_files(current_directory)}
+
+
+def read_processed_artifact(runner):
+    """Returns a generator reading the cleaned batches from the transform stage's
+    Parquet artifact one batch at a time."""
+    return transform.read_processed_data(runner.processed_path)
+
+
+def run_extract(runner, _inputs: dict) -> tuple:
+    """Fetches new truck files, in memory or onto disk. Returns the buffers, file count and bytes."""
+    if runner.in_memory:
+        buffers = extract.stream_truck_data_files(
+            runner.logger, prefixes=runner.prefixes)
+    else:
+        extract.download_truck_data_files(
+            runner.logger, prefixes=runner.prefixes)
+        buffers = open_downloaded_files()
+    extract.log_s_three_stats(runner.logger)
+    return buffers, len(buffers), sum(get_buffer_size(buffer)
+                                      for buffer in buffers.values())
+
+
+def run_transform(runner, inputs: dict) -> tuple:
+    """Cleans the extracted files chunk by chunk, writing each chunk to the Parquet
+    artifact as it is produced. Returns a lazy reader of the artifact, the row
+    count and bytes."""
+    meter = BatchMeter()
+    transform.write_processed_data(
+        meter.meter(transform.clean_data_in_chunks(
+            runner.logger, inputs['extract'], quarantine=runner.quarantine)),
+        runner.processed_path, runner.logger)
+    return read_processed_artifact(runner), meter.rows, meter.bytes
+
+
+def run_load(runner, inputs: dict) -> tuple:
+    """Loads the cleaned batches as they are read and removes the local artifacts.
+    Returns the rows loaded, row count and bytes."""
+    meter = BatchMeter()
+    loaded = load.load_transactions(meter.meter(inputs['transform']), runner.logger,
+                                    runner.quarantine, runner.prefixes,
+                                    load.get_load_key(runner.processed_path))
+    load.delete_all_csv_files(runner.processed_path, runner.logger)
+    return loaded, loaded, meter.bytes
+
+
+STAGES = {
+    'extract': {'depends_on': [], 'run': run_extract,
+                'cached': open_downloaded_files},
+    'transform': {'depends_on': ['extract'], 'run': run_transform,
+                  'cached': read_processed_artifact},
+    'load': {'depends_on': ['transform'], 'run': run_load,
+             'cached': None}
+}
+
+
+class PipelineRunner:
+    """Runs the stages in dependency order, handing each stage's output to the stages
+    that depend on it and recording timings, row counts and bytes per stage.
+    Rows rejected by any stage share one quarantine sink for the run."""
+
+    def __init__(self, logger: logging.Logger, prefixes: list = None,
+                 in_memory: bool = True, processed_path: str = None):
+        self.logger = logger
+        self.prefixes = prefixes
+        self.in_memory = in_memory
+        self.processed_path = processed_path or gv.PROCESSED_DATA_NAME
+        self.outputs = {}
+        self.metrics = {}
+        self.quarantine = QuarantineSink(logger)
+
+    def get_order(self) -> list:
+        """Returns every stage name ordered so dependencies come first."""
+        order = []
+
+        def visit(name: str) -> None:
+            if name in order:
+                return
+            for dependency in STAGES[name]['depends_on']:
+                visit(dependency)
+            order.append(name)
+
+        for name in STAGES:
+            visit(name)
+        return order
+
+    def get_input(self, name: str):
+        """Returns a stage's output, reading its cached artifact if it has not run."""
+        if name not in self.outputs:
+            self.logger.info(f"Resuming from the cached {name} artifact.")
+            self.outputs[name] = STAGES[name]['cached'](self)
+        return self.outputs[name]
+
+    def run_stage(self, name: str) -> None:
+        """Runs a single stage once and records its metrics."""
+        inputs = {dependency: self.get_input(dependency)
+                  for dependency in STAGES[name]['depends_on']}
+
+        self.logger.info(f"Starting {name} stage.")
+        start = time.perf_counter()
+        output, rows, size = STAGES[name]['run'](self, inputs)
+        elapsed = time.perf_counter() - start
+
+        self.outputs[name] = output
+        self.metrics[name] = {"seconds": elapsed, "rows": rows, "bytes": size}
+        self.logger.info(
+            f"Finished {name} stage in {elapsed:.3f}s: {rows} rows, {size} bytes.")
+
+    def close_buffers(self) -> None:
+        """Closes any extracted buffers a failed or partial run left open."""
+        for buffer in (self.outputs.get('extract') or {}).values():
+            buffer.close()
+
+    def run(self, stage: str = None) -> dict:
+        """Runs one stage, or the whole pipeline. Returns the metrics per stage."""
+        try:
+            for name in [stage] if stage else self.get_order():
+                self.run_stage(name)
+        finally:
+            self.close_buffers()
+            self.quarantine.close()
+        return self.metrics
+
+
+def parse_arguments(args: list = None) -> argparse.Namespace:
+    """Parses the command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--stage", choices=list(STAGES),
+        help="Run only this stage, reading its input from the previous stage's "
+             "cached artifact.")
+    extract.add_backfill_argument(parser)
+    return parser.parse_args(args)
+
+
+def main(args: list = None) -> dict:
+    """Main function calling other functions."""
+    arguments = parse_arguments(args)
+    load_dotenv()
+    logger = extract.configure_logger()
+
+    in_memory = (arguments.stage is None and
+                 os.getenv("EXTRACT_MODE", gv.IN_MEMORY_EXTRACT_MODE)
+                 == gv.IN_MEMORY_EXTRACT_MODE)
+    manifest.restore_manifest(logger)
+    runner = PipelineRunner(logger, arguments.backfill, in_memory)
+    try:
+        return runner.run(arguments.stage)
+    finally:
+        manifest.save_manifest(logger)
 
 
 if __name__ == "__main__":
-    extract.main()
-    transform.main()
-    load.main()
+    main()
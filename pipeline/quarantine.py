@@ -0,0 +1,120 @@
+"""Writes rejected rows, tagged with the reason they were rejected, to a Parquet
+    dataset partitioned by date and truck, so they can be reprocessed offline."""
+import os
+import uuid
+import logging
+from collections import Counter
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytz
+import global_variables as gv
+
+
+def get_quarantine_path() -> str:
+    """Returns the directory the quarantine dataset is written to."""
+    return os.getenv("QUARANTINE_PATH", gv.QUARANTINE_PATH)
+
+
+def get_quarantine_schema() -> pa.Schema:
+    """Returns the schema of the quarantined rows. Values are kept as text,
+    since a rejected value may not parse as its column's type."""
+    return pa.schema([
+        ('timestamp', pa.string()),
+        ('type', pa.string()),
+        ('total', pa.string()),
+        ('truck_id', pa.int64()),
+        ('reason', pa.string()),
+        ('date', pa.string())
+    ])
+
+
+def get_partition_dates(timestamps: pd.Series) -> pd.Series:
+    """Returns the date each rejected row belongs to, or a placeholder when
+    its timestamp is not a valid date."""
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps, format=gv.TIMESTAMP_FORMAT,
+                                    errors='coerce')
+    return timestamps.dt.strftime('%Y-%m-%d').fillna(gv.QUARANTINE_UNKNOWN_DATE)
+
+
+def to_quarantine_frame(rejected: pd.DataFrame) -> pd.DataFrame:
+    """Converts raw or typed rejected rows to the quarantine columns."""
+    return pd.DataFrame({
+        'timestamp': rejected['timestamp'].astype('string'),
+        'type': rejected['type'].astype('string'),
+        'total': rejected['total'].astype('string'),
+        'truck_id': rejected['truck_id'].astype('int64'),
+        'reason': rejected['reason'].astype('string'),
+        'date': get_partition_dates(rejected['timestamp'])
+    })
+
+
+class QuarantineSink:
+    """Collects rejected rows in memory and writes them in bulk, keeping a count
+    of rejected rows per reason for the run."""
+
+    def __init__(self, logger: logging.Logger, path: str = None,
+                 flush_rows: int = None):
+        self.logger = logger
+        self.path = path or get_quarantine_path()
+        self.flush_rows = flush_rows or gv.QUARANTINE_FLUSH_ROWS
+        self.run_id = (datetime.now(pytz.utc).strftime('%Y%m%dT%H%M%S')
+                       + '-' + uuid.uuid4().hex[:8])
+        self.pending = []
+        self.pending_rows = 0
+        self.flushes = 0
+        self.counts = Counter()
+
+    def add(self, rejected: pd.DataFrame, reason: str = None) -> None:
+        """Queues rejected rows, tagging them with reason when given."""
+        if rejected.empty:
+            return
+        if reason is not None:
+            rejected = rejected.assign(reason=reason)
+
+        self.counts.update(rejected['reason'].value_counts().to_dict())
+        self.pending.append(to_quarantine_frame(rejected))
+        self.pending_rows += len(rejected)
+        if self.pending_rows >= self.flush_rows:
+            self.flush()
+
+    def flush(self) -> int:
+        """Writes the queued rows to the dataset. Returns the rows written."""
+        if not self.pending:
+            return 0
+        table = pa.Table.from_pandas(pd.concat(self.pending, ignore_index=True),
+                                     schema=get_quarantine_schema(),
+                                     preserve_index=False)
+        pq.write_to_dataset(
+            table, self.path, partition_cols=['date', 'truck_id'],
+            basename_template=f"{self.run_id}-{self.flushes}-{{i}}.parquet",
+            compression=gv.PARQUET_COMPRESSION,
+            existing_data_behavior='overwrite_or_ignore')
+
+        written = self.pending_rows
+        self.pending = []
+        self.pending_rows = 0
+        self.flushes += 1
+        return written
+
+    def close(self) -> None:
+        """Writes any queued rows and logs the rejections per reason for the run."""
+        self.flush()
+        if self.counts:
+            self.logger.warning(
+                f"Quarantined {sum(self.counts.values())} rows to {self.path}: "
+                f"{dict(self.counts)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self.close()
+
+
+def read_quarantine(path: str = None) -> pd.DataFrame:
+    """Reads every quarantined row back, with its date and truck partitions as columns."""
+    return pq.read_table(path or get_quarantine_path(),
+                         partitioning='hive').to_pandas()
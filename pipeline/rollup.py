@@ -0,0 +1,136 @@
+"""Maintains the hourly rollup of transactions per truck and payment method,
+    so dashboards and reports read a few buckets instead of every transaction.
+    Run as a script to rebuild the rollup from the transaction history."""
+import os
+import pandas as pd
+from redshift_connector import Cursor
+from dotenv import load_dotenv
+import global_variables as gv
+from extract import configure_logger
+import shared_path  # pylint: disable=unused-import
+from warehouse import get_warehouse
+
+
+def build_rollup_delta(fact_transactions: pd.DataFrame) -> pd.DataFrame:
+    """Aggregates fact rows into hourly buckets with their count, sum and sum of squares."""
+    totals = fact_transactions['total'].astype('float64')
+    buckets = pd.DataFrame({
+        'hour_start': fact_transactions['at'].dt.floor('h'),
+        'truck_id': fact_transactions['truck_id'],
+        'payment_method_id': fact_transactions['payment_method_id'],
+        'total_sum': totals,
+        'total_sum_of_squares': totals ** 2
+    }).groupby(gv.ROLLUP_KEY_COLUMNS, sort=False)
+
+    delta = buckets.agg(transaction_count=('total_sum', 'size'),
+                        total_sum=('total_sum', 'sum'),
+                        total_sum_of_squares=('total_sum_of_squares', 'sum'))
+    return delta.round({'total_sum': 2, 'total_sum_of_squares': 4}).reset_index()
+
+
+def get_rollup_rows(delta: pd.DataFrame) -> list:
+    """Converts rollup buckets to tuples of native Python values for the connector."""
+    return list(zip(delta['hour_start'].dt.to_pydatetime().tolist(),
+                    delta['truck_id'].tolist(),
+                    delta['payment_method_id'].tolist(),
+                    delta['transaction_count'].tolist(),
+                    delta['total_sum'].tolist(),
+                    delta['total_sum_of_squares'].tolist()))
+
+
+def create_delta_table(db_cursor: Cursor) -> None:
+    """Creates the temporary table holding one batch's rollup buckets."""
+    db_cursor.execute(f"""
+        CREATE TEMP TABLE {gv.ROLLUP_DELTA_TABLE} (
+            hour_start TIMESTAMP NOT NULL,
+            truck_id BIGINT NOT NULL,
+            payment_method_id SMALLINT NOT NULL,
+            transaction_count BIGINT NOT NULL,
+            total_sum DECIMAL(18, 2) NOT NULL,
+            total_sum_of_squares DECIMAL(24, 4) NOT NULL
+        )""")
+
+
+def apply_delta(db_cursor: Cursor) -> None:
+    """Adds the staged buckets to the rollup: existing buckets are incremented
+    and new ones inserted. Then drops the staged buckets."""
+    keys = ' AND '.join(f"{gv.ROLLUP_TABLE}.{column} = delta.{column}"
+                        for column in gv.ROLLUP_KEY_COLUMNS)
+    increments = ', '.join(f"{column} = {gv.ROLLUP_TABLE}.{column} + delta.{column}"
+                           for column in gv.ROLLUP_MEASURE_COLUMNS)
+    columns = gv.ROLLUP_KEY_COLUMNS + gv.ROLLUP_MEASURE_COLUMNS
+
+    db_cursor.execute(
+        f"UPDATE {gv.ROLLUP_TABLE} SET {increments} "
+        f"FROM {gv.ROLLUP_DELTA_TABLE} AS delta WHERE {keys}")
+    db_cursor.execute(
+        f"INSERT INTO {gv.ROLLUP_TABLE} ({', '.join(columns)}) "
+        f"SELECT {', '.join(f'delta.{column}' for column in columns)} "
+        f"FROM {gv.ROLLUP_DELTA_TABLE} AS delta "
+        f"LEFT JOIN {gv.ROLLUP_TABLE} ON {keys} "
+        f"WHERE {gv.ROLLUP_TABLE}.hour_start IS NULL")
+    db_cursor.execute(f"DROP TABLE {gv.ROLLUP_DELTA_TABLE}")
+
+
+def update_rollup(db_cursor: Cursor, fact_transactions: pd.DataFrame) -> None:
+    """Adds fact rows that have just been inserted to the rollup."""
+    if fact_transactions.empty:
+        return
+    create_delta_table(db_cursor)
+    get_warehouse().bulk_load(db_cursor, gv.ROLLUP_DELTA_TABLE,
+                              gv.ROLLUP_KEY_COLUMNS + gv.ROLLUP_MEASURE_COLUMNS,
+                              get_rollup_rows(build_rollup_delta(fact_transactions)))
+    apply_delta(db_cursor)
+
+
+def update_rollup_from_table(db_cursor: Cursor, table: str) -> None:
+    """Adds the rows of a table about to be inserted, such as the merge staging
+    table once already loaded rows are removed, to the rollup."""
+    hour_start = get_warehouse().hour_start_of('at')
+    create_delta_table(db_cursor)
+    db_cursor.execute(f"""
+        INSERT INTO {gv.ROLLUP_DELTA_TABLE}
+            ({', '.join(gv.ROLLUP_KEY_COLUMNS + gv.ROLLUP_MEASURE_COLUMNS)})
+        SELECT {hour_start}, truck_id, payment_method_id,
+               COUNT(*), SUM(total), SUM(total * total)
+        FROM {table}
+        GROUP BY {hour_start}, truck_id, payment_method_id""")
+    apply_delta(db_cursor)
+
+
+def rebuild_rollup(db_cursor: Cursor) -> int:
+    """Replaces the rollup with buckets aggregated from every row in
+    fact_transaction. Returns the number of buckets."""
+    hour_start = get_warehouse().hour_start_of('at')
+    db_cursor.execute(f"DELETE FROM {gv.ROLLUP_TABLE}")
+    db_cursor.execute(f"""
+        INSERT INTO {gv.ROLLUP_TABLE}
+            ({', '.join(gv.ROLLUP_KEY_COLUMNS + gv.ROLLUP_MEASURE_COLUMNS)})
+        SELECT {hour_start}, truck_id, payment_method_id,
+               COUNT(*), SUM(total), SUM(total * total)
+        FROM fact_transaction
+        GROUP BY {hour_start}, truck_id, payment_method_id""")
+    db_cursor.execute(f"SELECT COUNT(*) FROM {gv.ROLLUP_TABLE}")
+    return db_cursor.fetchone()[0]
+
+
+def main() -> None:
+    """Rebuilds the rollup in a single transaction, so readers see either the old
+    buckets or the complete new ones."""
+    load_dotenv()
+    logger = configure_logger()
+
+    warehouse = get_warehouse()
+    conn = warehouse.connect()
+    try:
+        db_cursor = conn.cursor()
+        warehouse.set_schema(db_cursor, os.getenv("DB_SCHEMA"))
+        buckets = rebuild_rollup(db_cursor)
+        conn.commit()
+    finally:
+        conn.close()
+    logger.info(f"Rebuilt {gv.ROLLUP_TABLE} with {buckets} hourly buckets.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# pylint: skip-file
+import logging
+from datetime import date
+import pytest
+import manifest
+from backfill import get_partition_prefixes, get_processed_path, run_backfill
+
+
+@pytest.fixture
+def manifest_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'manifest.db')
+    monkeypatch.setenv('MANIFEST_PATH', path)
+    return path
+
+
+def fake_partition(prefix):
+    if prefix.endswith('/18'):
+        raise RuntimeError('load failed')
+    return int(prefix.split('/')[-1])
+
+
+def test_get_partition_prefixes_covers_every_slot_across_months():
+    assert get_partition_prefixes(date(2024, 9, 30), date(2024, 10, 1)) == [
+        'trucks/2024-09/30/12', 'trucks/2024-09/30/15',
+        'trucks/2024-09/30/18', 'trucks/2024-09/30/21',
+        'trucks/2024-10/1/12', 'trucks/2024-10/1/15',
+        'trucks/2024-10/1/18', 'trucks/2024-10/1/21']
+
+
+def test_get_processed_path_is_unique_per_folder():
+    assert (get_processed_path('trucks/2024-10/1/12')
+            != get_processed_path('trucks/2024-10/1/15'))
+
+
+def test_run_backfill_checkpoints_and_resumes(manifest_path):
+    logger = logging.getLogger('test_backfill')
+    prefixes = get_partition_prefixes(date(2024, 10, 1), date(2024, 10, 1))
+    conn = manifest.get_manifest_connection(manifest_path)
+    manifest.mark_partition_completed(conn, 'trucks/2024-10/1/12', 7)
+    conn.close()
+
+    result = run_backfill(prefixes, logger, 2, fake_partition)
+
+    assert result == {'loaded': {'trucks/2024-10/1/15': 15, 'trucks/2024-10/1/21': 21},
+                      'failed': ['trucks/2024-10/1/18']}
+    conn = manifest.get_manifest_connection(manifest_path)
+    assert manifest.get_completed_partitions(conn) == {
+        'trucks/2024-10/1/12', 'trucks/2024-10/1/15', 'trucks/2024-10/1/21'}
+    conn.close()
@@ -0,0 +1,189 @@
+# pylint: skip-file
+import logging
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+import boto3
+import botocore
+import pytest
+from moto import mock_aws
+import global_variables as gv
+from extract import (list_s_three_objects,
+                     list_folders,
+                     download_file_if_matching,
+                     download_objects,
+                     stream_objects,
+                     stream_truck_data_files,
+                     get_folder_paths,
+                     get_s_three_client,
+                     get_s_three_stats,
+                     reset_s_three_client)
+
+BUCKET_NAME = 'test-truck-bucket'
+FOLDER_PATH = 'trucks/2024-10/1/12'
+
+
+@pytest.fixture
+def s_three(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'eu-west-2')
+    with mock_aws():
+        s_three_client = boto3.client('s3', region_name='eu-west-2')
+        s_three_client.create_bucket(
+            Bucket=BUCKET_NAME,
+            CreateBucketConfiguration={'LocationConstraint': 'eu-west-2'})
+        yield s_three_client
+
+
+@pytest.fixture
+def logger():
+    return logging.getLogger('test_extract')
+
+
+def test_list_s_three_objects_follows_continuation_tokens(s_three):
+    for i in range(1005):
+        s_three.put_object(Bucket=BUCKET_NAME,
+                           Key=f'{FOLDER_PATH}/other_{i}.txt', Body=b'')
+
+    contents = list_s_three_objects(s_three, BUCKET_NAME, FOLDER_PATH)
+
+    assert len(contents) == 1005
+
+
+def test_download_file_if_matching_skips_other_files(s_three, logger, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    s_three.put_object(Bucket=BUCKET_NAME,
+                       Key=f'{FOLDER_PATH}/notes.txt', Body=b'text')
+
+    result = download_file_if_matching(
+        f'{FOLDER_PATH}/notes.txt', s_three, logger, BUCKET_NAME)
+
+    assert result is None
+    assert not (tmp_path / 'notes.txt').exists()
+
+
+def test_download_objects_fetches_matching_files(s_three, logger, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    body = b'timestamp,type,total\n2024-10-01 12:00:00,card,5.00\n'
+    for truck in range(1, 7):
+        s_three.put_object(Bucket=BUCKET_NAME,
+                           Key=f'{FOLDER_PATH}/T3_T{truck}.csv', Body=body)
+    s_three.put_object(Bucket=BUCKET_NAME,
+                       Key=f'{FOLDER_PATH}/notes.txt', Body=b'text')
+    contents = list_s_three_objects(s_three, BUCKET_NAME, FOLDER_PATH)
+
+    stats = download_objects(s_three, BUCKET_NAME, contents, logger, 3)
+
+    assert stats['objects'] == 6
+    assert stats['bytes'] == 6 * len(body)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        f'trucks_2024-10_1_12_T3_T{truck}.csv' for truck in range(1, 7)]
+
+
+def test_get_s_three_client_is_shared_and_counts_requests(s_three):
+    reset_s_three_client()
+    shared = get_s_three_client()
+
+    assert get_s_three_client() is shared
+    assert get_s_three_stats()['client_creation_seconds'] is not None
+
+    list_s_three_objects(shared, BUCKET_NAME, FOLDER_PATH)
+    list_s_three_objects(shared, BUCKET_NAME, FOLDER_PATH)
+
+    assert get_s_three_stats()['requests'] == {'ListObjectsV2': 2}
+    reset_s_three_client()
+
+
+def test_stream_objects_reads_bodies_without_writing_files(s_three, logger, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    body = b'timestamp,type,total\n2024-10-01 12:00:00,card,5.00\n'
+    for truck in range(1, 4):
+        s_three.put_object(Bucket=BUCKET_NAME,
+                           Key=f'{FOLDER_PATH}/T3_T{truck}.csv', Body=body)
+    contents = list_s_three_objects(s_three, BUCKET_NAME, FOLDER_PATH)
+
+    buffers = stream_objects(s_three, BUCKET_NAME, contents, logger, 2)
+
+    assert sorted(buffers) == [f'trucks_2024-10_1_12_T3_T{truck}.csv' for truck in range(1, 4)]
+    assert all(buffer.read() == body for buffer in buffers.values())
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stream_objects_spools_objects_beyond_the_memory_budget(s_three, logger):
+    body = b'timestamp,type,total\n2024-10-01 12:00:00,card,5.00\n'
+    for truck in range(1, 4):
+        s_three.put_object(Bucket=BUCKET_NAME,
+                           Key=f'{FOLDER_PATH}/T3_T{truck}.csv', Body=body)
+    contents = list_s_three_objects(s_three, BUCKET_NAME, FOLDER_PATH)
+
+    buffers = stream_objects(s_three, BUCKET_NAME, contents, logger, 2,
+                             memory_budget=2 * len(body))
+
+    in_memory = [name for name, buffer in buffers.items()
+                 if isinstance(buffer, SpooledTemporaryFile) and not buffer._rolled]
+    assert sorted(in_memory) == [f'trucks_2024-10_1_12_T3_T{truck}.csv' for truck in (1, 2)]
+    assert all(buffer.read() == body for buffer in buffers.values())
+
+
+def test_stream_objects_spools_large_objects_to_disk(s_three, logger, monkeypatch):
+    monkeypatch.setattr(gv, 'IN_MEMORY_MAX_BYTES', 16)
+    body = b'timestamp,type,total\n2024-10-01 12:00:00,card,5.00\n'
+    s_three.put_object(Bucket=BUCKET_NAME,
+                       Key=f'{FOLDER_PATH}/T3_T1.csv', Body=body)
+    contents = list_s_three_objects(s_three, BUCKET_NAME, FOLDER_PATH)
+
+    buffer = stream_objects(s_three, BUCKET_NAME, contents, logger, 1)[
+        'trucks_2024-10_1_12_T3_T1.csv']
+
+    assert not isinstance(buffer, SpooledTemporaryFile)
+    assert buffer.read() == body
+
+
+def test_get_folder_paths_includes_previous_slot():
+    assert get_folder_paths(datetime(2024, 10, 2, 15, 30), 15) == [
+        'trucks/2024-10/2/15', 'trucks/2024-10/2/12']
+
+
+def test_get_folder_paths_wraps_to_previous_day():
+    assert get_folder_paths(datetime(2024, 10, 2, 13, 0), 12) == [
+        'trucks/2024-10/2/12', 'trucks/2024-10/1/21']
+
+
+def test_same_file_name_in_two_folders_keeps_both(s_three, logger, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    folders = ['trucks/2024-10/1/15', 'trucks/2024-10/1/12']
+    for folder in folders:
+        s_three.put_object(Bucket=BUCKET_NAME, Key=f'{folder}/T3_T1.csv',
+                           Body=f'timestamp,type,total\n{folder},card,5.00\n'.encode())
+    contents = list_folders(s_three, BUCKET_NAME, folders)
+
+    buffers = stream_objects(s_three, BUCKET_NAME, contents, logger, 2)
+    download_objects(s_three, BUCKET_NAME, contents, logger, 2)
+
+    assert sorted(buffers) == ['trucks_2024-10_1_12_T3_T1.csv', 'trucks_2024-10_1_15_T3_T1.csv']
+    assert all(folder.encode() in buffers[f"{folder.replace('/', '_')}_T3_T1.csv"].read()
+               for folder in folders)
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(buffers)
+
+
+def test_backfill_listing_failure_raises(s_three, logger, tmp_path, monkeypatch):
+    monkeypatch.setenv('MANIFEST_PATH', str(tmp_path / 'manifest.db'))
+    monkeypatch.setenv('BUCKET_NAME', 'missing-bucket')
+    reset_s_three_client()
+
+    with pytest.raises(botocore.exceptions.ClientError):
+        stream_truck_data_files(logger, prefixes=[FOLDER_PATH])
+    reset_s_three_client()
+
+
+def test_stream_objects_requiring_all_raises_on_a_failed_object(s_three, logger):
+    body = b'timestamp,type,total\n2024-10-01 12:00:00,card,5.00\n'
+    for truck in range(1, 3):
+        s_three.put_object(Bucket=BUCKET_NAME,
+                           Key=f'{FOLDER_PATH}/T3_T{truck}.csv', Body=body)
+    contents = list_s_three_objects(s_three, BUCKET_NAME, FOLDER_PATH)
+    s_three.delete_object(Bucket=BUCKET_NAME, Key=f'{FOLDER_PATH}/T3_T2.csv')
+
+    assert len(stream_objects(s_three, BUCKET_NAME, contents, logger, 2)) == 1
+    with pytest.raises(RuntimeError):
+        stream_objects(s_three, BUCKET_NAME, contents, logger, 2, require_all=True)
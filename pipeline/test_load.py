@@ -0,0 +1,199 @@
+# pylint: skip-file
+import logging
+import pandas as pd
+import pytest
+import redshift_connector
+from unittest.mock import Mock
+import load
+from load import (insert_query,
+                  insert_transaction_batches,
+                  get_row_values,
+                  get_load_mode,
+                  load_dimension,
+                  build_fact_transactions,
+                  get_transaction_fingerprints,
+                  merge_fact_transactions,
+                  iter_commit_batches,
+                  load_transactions)
+import global_variables as gv
+
+
+@pytest.fixture
+def fact_transactions():
+    return pd.DataFrame({
+        'at': pd.to_datetime(['2024-10-01 12:00:00', '2024-10-01 12:05:00',
+                              '2024-10-01 12:10:00']),
+        'payment_method_id': [1, 2, 1],
+        'total': [5.5, 3.0, 12.25],
+        'truck_id': [1, 1, 3],
+        'transaction_fingerprint': [11, 12, 13]
+    })
+
+
+def test_insert_query_sends_one_multi_row_statement():
+    mock_cursor = Mock()
+
+    insert_query(mock_cursor, 'fact_transaction', ['a', 'b'], [(1, 2), (3, 4)])
+
+    mock_cursor.execute.assert_called_once_with(
+        "INSERT INTO fact_transaction (a, b) VALUES (%s, %s), (%s, %s)",
+        [1, 2, 3, 4])
+
+
+def test_insert_transaction_batches_splits_by_batch_size(fact_transactions):
+    mock_cursor = Mock()
+
+    insert_transaction_batches(mock_cursor, fact_transactions, 2)
+
+    assert mock_cursor.execute.call_count == 2
+    assert len(mock_cursor.execute.call_args_list[0][0][1]) == 10
+    assert len(mock_cursor.execute.call_args_list[1][0][1]) == 5
+
+
+def test_get_row_values_returns_native_types(fact_transactions):
+    rows = get_row_values(fact_transactions)
+
+    assert rows[0] == (pd.Timestamp('2024-10-01 12:00:00').to_pydatetime(), 1, 5.5, 1, 11)
+    assert type(rows[0][1]) is int
+    assert type(rows[0][2]) is float
+
+
+def test_get_load_mode_defaults_to_merge(monkeypatch):
+    monkeypatch.delenv('LOAD_MODE', raising=False)
+    monkeypatch.setenv('COPY_S3_BUCKET', 'staging-bucket')
+    monkeypatch.setenv('COPY_IAM_ROLE', 'arn:aws:iam::123:role/copy')
+
+    assert get_load_mode() == gv.MERGE_LOAD_MODE
+
+    monkeypatch.setenv('LOAD_MODE', gv.BATCH_LOAD_MODE)
+
+    assert get_load_mode() == gv.BATCH_LOAD_MODE
+
+
+def test_get_load_mode_rejects_unknown_mode(monkeypatch):
+    monkeypatch.setenv('LOAD_MODE', 'upsert')
+
+    with pytest.raises(ValueError):
+        get_load_mode()
+
+
+def test_load_dimension_maps_values_to_keys():
+    mock_cursor = Mock()
+    mock_cursor.fetchall.return_value = [(1, 'card'), (2, 'cash')]
+
+    result = load_dimension(mock_cursor, 'dim_payment_method',
+                            'payment_method_id', 'payment_method_type')
+
+    assert result == {'card': 1, 'cash': 2}
+    mock_cursor.execute.assert_called_once_with(
+        "SELECT payment_method_id, payment_method_type FROM dim_payment_method")
+
+
+def test_build_fact_transactions_rejects_unknown_values():
+    transactions = pd.DataFrame({
+        'timestamp': pd.to_datetime(['2024-10-01 12:00:00'] * 3),
+        'type': ['card', 'crypto', 'cash'],
+        'total': [5.5, 3.0, 12.25],
+        'truck_id': [1, 1, 9]
+    })
+    dimension_maps = {'truck_id': {1: 1, 2: 2},
+                      'payment_method_id': {'card': 1, 'cash': 2}}
+
+    fact_transactions, rejected = build_fact_transactions(
+        transactions, dimension_maps)
+
+    assert fact_transactions.drop(columns='transaction_fingerprint').to_dict('list') == {
+        'at': [pd.Timestamp('2024-10-01 12:00:00')],
+        'payment_method_id': [1],
+        'total': [5.5],
+        'truck_id': [1]
+    }
+    assert rejected['reason'].tolist() == [gv.REJECT_UNKNOWN_PAYMENT_METHOD,
+                                           gv.REJECT_UNKNOWN_TRUCK]
+
+
+def test_transaction_fingerprints_depend_only_on_values():
+    transactions = pd.DataFrame({
+        'timestamp': pd.to_datetime(['2024-10-01 12:00:00', '2024-10-01 12:00:00',
+                                     '2024-10-01 12:00:01', '2024-10-01 12:00:00']),
+        'type': pd.Categorical(['card', 'cash', 'card', 'card']),
+        'total': [5.5, 5.5, 5.5, 5.5],
+        'truck_id': [1, 1, 1, 1]
+    })
+    reloaded = transactions.astype({'type': 'string'}).iloc[[3, 0]]
+
+    fingerprints = get_transaction_fingerprints(transactions)
+
+    assert len(set(fingerprints[:3])) == 3
+    assert fingerprints[0] == fingerprints[3]
+    assert (get_transaction_fingerprints(reloaded) == fingerprints[[3, 0]]).all()
+
+
+def test_merge_fact_transactions_skips_loaded_fingerprints(fact_transactions, monkeypatch):
+    monkeypatch.delenv('COPY_S3_BUCKET', raising=False)
+    mock_cursor = Mock()
+
+    merge_fact_transactions(mock_cursor, fact_transactions)
+
+    statements = [call[0][0].split()[0:2] for call in mock_cursor.execute.call_args_list]
+    assert statements == [['CREATE', 'TEMP'], ['INSERT', 'INTO'], ['DELETE', 'FROM'],
+                          ['INSERT', 'INTO'], ['CREATE', 'TEMP'], ['INSERT', 'INTO'],
+                          ['UPDATE', gv.ROLLUP_TABLE], ['INSERT', 'INTO'],
+                          ['DROP', 'TABLE'], ['DROP', 'TABLE']]
+    assert 'IN (SELECT transaction_fingerprint FROM fact_transaction)' in \
+        mock_cursor.execute.call_args_list[2][0][0]
+    assert mock_cursor.execute.call_args_list[1][0][0].startswith(
+        f'INSERT INTO {gv.MERGE_STAGING_TABLE} ')
+
+
+def test_iter_commit_batches_skips_committed_rows():
+    batches = [pd.DataFrame({'total': range(5)}), pd.DataFrame({'total': range(5, 8)})]
+
+    slices = list(iter_commit_batches(batches, 2, committed_rows=3))
+
+    assert [(offset, chunk['total'].tolist()) for offset, chunk in slices] == [
+        (4, [3]), (5, [4]), (7, [5, 6]), (8, [7])]
+
+
+def make_connection(fail_on_commit=None):
+    conn = Mock()
+    cursor = conn.cursor.return_value
+    cursor.fetchall.side_effect = [[(1, 1)], [(1, 'card')]]
+    commits = []
+
+    def commit():
+        commits.append(len(commits) + 1)
+        if len(commits) == fail_on_commit:
+            raise redshift_connector.InterfaceError('connection reset')
+    conn.commit.side_effect = commit
+    return conn
+
+
+def test_load_transactions_retries_from_uncommitted_slice(tmp_path, monkeypatch):
+    monkeypatch.setenv('MANIFEST_PATH', str(tmp_path / 'manifest.db'))
+    monkeypatch.setenv('LOAD_COMMIT_ROWS', '2')
+    monkeypatch.setenv('REPORT_SNAPSHOT_PATH', str(tmp_path / 'snapshots'))
+    monkeypatch.delenv('REPORT_SNAPSHOT_BUCKET', raising=False)
+    monkeypatch.setenv('LOAD_MODE', gv.BATCH_LOAD_MODE)
+    monkeypatch.setattr(load.time, 'sleep', Mock())
+    connections = [make_connection(fail_on_commit=2), make_connection()]
+    monkeypatch.setattr(load, 'get_connection', Mock(side_effect=connections))
+    transactions = pd.DataFrame({
+        'timestamp': pd.date_range('2024-10-01 12:00:00', periods=5, freq='min'),
+        'type': ['card'] * 5,
+        'total': [1.0, 2.0, 3.0, 4.0, 5.0],
+        'truck_id': [1] * 5
+    })
+
+    loaded = load_transactions([transactions], logging.getLogger('test_load'),
+                               load_key='artifact')
+
+    assert loaded == 5
+    first_inserts = connections[0].cursor.return_value.execute.call_args_list[1:]
+    retried_inserts = connections[1].cursor.return_value.execute.call_args_list[1:]
+    assert [len(call[0][1]) // 5 for call in first_inserts
+            if call[0][0].startswith('INSERT INTO fact_transaction')] == [2, 2]
+    assert [len(call[0][1]) // 5 for call in retried_inserts
+            if call[0][0].startswith('INSERT INTO fact_transaction')] == [2, 1]
+    assert all(conn.close.called for conn in connections)
+    load.time.sleep.assert_called_once_with(gv.LOAD_RETRY_BASE_SECONDS)
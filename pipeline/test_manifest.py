@@ -0,0 +1,135 @@
+# pylint: skip-file
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import boto3
+import pytest
+from moto import mock_aws
+from extract import reset_s_three_client
+from manifest import (get_manifest_connection,
+                      restore_manifest,
+                      save_manifest,
+                      filter_unloaded_objects,
+                      mark_objects_fetched,
+                      mark_fetched_objects_loaded,
+                      get_load_checkpoint,
+                      save_load_checkpoint,
+                      clear_load_checkpoint)
+
+
+@pytest.fixture
+def manifest_conn(tmp_path):
+    conn = get_manifest_connection(str(tmp_path / 'manifest.db'))
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def contents():
+    return [
+        {'Key': 'trucks/2024-10/1/12/T3_T1.csv', 'ETag': '"aaa"', 'Size': 10},
+        {'Key': 'trucks/2024-10/1/12/T3_T2.csv', 'ETag': '"bbb"', 'Size': 20}
+    ]
+
+
+def test_fetched_objects_are_refetched_until_loaded(manifest_conn, contents):
+    mark_objects_fetched(manifest_conn, contents)
+
+    assert filter_unloaded_objects(manifest_conn, contents) == contents
+
+
+def test_loaded_objects_are_skipped(manifest_conn, contents):
+    mark_objects_fetched(manifest_conn, contents)
+
+    assert mark_fetched_objects_loaded(manifest_conn) == 2
+    assert filter_unloaded_objects(manifest_conn, contents) == []
+
+
+def test_changed_etag_is_fetched_again(manifest_conn, contents):
+    mark_objects_fetched(manifest_conn, contents)
+    mark_fetched_objects_loaded(manifest_conn)
+    changed = dict(contents[0], ETag='"ccc"')
+
+    assert filter_unloaded_objects(manifest_conn, [changed, contents[1]]) == [changed]
+
+
+def test_refetching_a_loaded_object_keeps_it_loaded(manifest_conn, contents):
+    mark_objects_fetched(manifest_conn, contents)
+    mark_fetched_objects_loaded(manifest_conn)
+    mark_objects_fetched(manifest_conn, contents)
+
+    assert mark_fetched_objects_loaded(manifest_conn) == 0
+
+
+def test_mark_fetched_objects_loaded_limits_to_prefixes(manifest_conn, contents):
+    other = {'Key': 'trucks/2024-10/1/15/T3_T1.csv', 'ETag': '"ccc"', 'Size': 30}
+    mark_objects_fetched(manifest_conn, contents + [other])
+
+    assert mark_fetched_objects_loaded(manifest_conn, ['trucks/2024-10/1/12']) == 2
+    assert filter_unloaded_objects(manifest_conn, contents + [other]) == [other]
+
+
+def test_load_checkpoint_round_trips_and_clears(manifest_conn):
+    assert get_load_checkpoint(manifest_conn, 'artifact') == 0
+
+    save_load_checkpoint(manifest_conn, 'artifact', 100)
+    save_load_checkpoint(manifest_conn, 'artifact', 150)
+
+    assert get_load_checkpoint(manifest_conn, 'artifact') == 150
+    clear_load_checkpoint(manifest_conn, 'artifact')
+    assert get_load_checkpoint(manifest_conn, 'artifact') == 0
+
+
+def save_checkpoints(path, worker):
+    conn = get_manifest_connection(path)
+    for rows in range(1, 51):
+        save_load_checkpoint(conn, f'worker {worker}', rows)
+    conn.close()
+
+
+def test_concurrent_workers_share_the_manifest(tmp_path):
+    path = str(tmp_path / 'manifest.db')
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(save_checkpoints, [path] * 4, range(4)))
+
+    conn = get_manifest_connection(path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert [get_load_checkpoint(conn, f'worker {worker}') for worker in range(4)] == [50] * 4
+    conn.close()
+
+
+def test_restore_manifest_warns_without_durable_location(monkeypatch, caplog):
+    monkeypatch.delenv('MANIFEST_S3_BUCKET', raising=False)
+    monkeypatch.delenv('MANIFEST_PATH', raising=False)
+
+    restore_manifest(logging.getLogger('test_manifest'))
+
+    assert 'The manifest is not persisted' in caplog.text
+
+
+def test_manifest_survives_a_new_task_through_s_three(tmp_path, monkeypatch, contents):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'eu-west-2')
+    monkeypatch.setenv('MANIFEST_S3_BUCKET', 'test-manifest-bucket')
+    logger = logging.getLogger('test_manifest')
+    reset_s_three_client()
+    with mock_aws():
+        boto3.client('s3', region_name='eu-west-2').create_bucket(
+            Bucket='test-manifest-bucket',
+            CreateBucketConfiguration={'LocationConstraint': 'eu-west-2'})
+
+        monkeypatch.setenv('MANIFEST_PATH', str(tmp_path / 'first_task.db'))
+        restore_manifest(logger)
+        conn = get_manifest_connection()
+        mark_objects_fetched(conn, contents)
+        mark_fetched_objects_loaded(conn)
+        conn.close()
+        save_manifest(logger)
+
+        monkeypatch.setenv('MANIFEST_PATH', str(tmp_path / 'second_task.db'))
+        restore_manifest(logger)
+        conn = get_manifest_connection()
+
+        assert filter_unloaded_objects(conn, contents) == []
+        conn.close()
+    reset_s_three_client()
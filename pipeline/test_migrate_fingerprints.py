@@ -0,0 +1,87 @@
+# pylint: skip-file
+import logging
+import pandas as pd
+import pytest
+import global_variables as gv
+from load import get_transaction_fingerprints, load_transactions
+from migrate_fingerprints import migrate
+
+LEGACY_FACT_TRANSACTION = """
+    CREATE TABLE fact_transaction (
+        transaction_id INTEGER PRIMARY KEY,
+        at TIMESTAMP NOT NULL,
+        payment_method_id SMALLINT,
+        total DECIMAL(10, 2) NOT NULL,
+        truck_id BIGINT
+    )"""
+
+
+@pytest.fixture
+def legacy_warehouse(local_warehouse):
+    warehouse, conn = local_warehouse
+    conn.execute("DROP TABLE fact_transaction")
+    conn.execute(LEGACY_FACT_TRANSACTION)
+    conn.commit()
+    return warehouse, conn
+
+
+@pytest.fixture
+def transactions():
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(['2024-10-01 12:00:00', '2024-10-01 12:30:00',
+                                     '2024-10-01 13:00:00']),
+        'type': ['card', 'cash', 'card'],
+        'total': [5.5, 3.0, 2.0],
+        'truck_id': [1, 1, 2]
+    })
+
+
+def insert_legacy_rows(conn, transactions):
+    rows = [(row.timestamp.to_pydatetime(), 1 if row.type == 'card' else 2,
+             row.total, row.truck_id) for row in transactions.itertuples()]
+    conn.executemany("INSERT INTO fact_transaction (at, payment_method_id, total, truck_id) "
+                     "VALUES (?, ?, ?, ?)", rows)
+    conn.execute(f"""
+        INSERT INTO {gv.ROLLUP_TABLE}
+        SELECT strftime('%Y-%m-%d %H:00:00', at), truck_id, payment_method_id,
+               COUNT(*), SUM(total), SUM(total * total)
+        FROM fact_transaction
+        GROUP BY 1, 2, 3""")
+    conn.commit()
+
+
+def test_migrate_fingerprints_rows_and_deletes_duplicates(legacy_warehouse, transactions):
+    warehouse, conn = legacy_warehouse
+    insert_legacy_rows(conn, pd.concat([transactions, transactions.iloc[[0]]]))
+
+    result = migrate(conn, logging.getLogger('test_migrate_fingerprints'))
+
+    _, rows = warehouse.query(conn.cursor(), """
+        SELECT transaction_id, transaction_fingerprint FROM fact_transaction
+        ORDER BY transaction_id""")
+    assert result == {'column_added': True, 'fingerprinted': 4, 'duplicates_deleted': 1}
+    assert rows == list(zip([1, 2, 3], get_transaction_fingerprints(transactions).tolist()))
+    _, rollup = warehouse.query(conn.cursor(), f"""
+        SELECT SUM(transaction_count), SUM(total_sum) FROM {gv.ROLLUP_TABLE}""")
+    assert rollup == [(3, 10.5)]
+
+
+def test_migrate_twice_changes_nothing(legacy_warehouse, transactions):
+    _, conn = legacy_warehouse
+    insert_legacy_rows(conn, transactions)
+    migrate(conn, logging.getLogger('test_migrate_fingerprints'))
+
+    result = migrate(conn, logging.getLogger('test_migrate_fingerprints'))
+
+    assert result == {'column_added': False, 'fingerprinted': 0, 'duplicates_deleted': 0}
+
+
+def test_merge_load_after_migration_skips_loaded_rows(legacy_warehouse, transactions):
+    warehouse, conn = legacy_warehouse
+    insert_legacy_rows(conn, transactions)
+    migrate(conn, logging.getLogger('test_migrate_fingerprints'))
+
+    load_transactions([transactions], logging.getLogger('test_migrate_fingerprints'))
+
+    _, rows = warehouse.query(conn.cursor(), "SELECT COUNT(*) FROM fact_transaction")
+    assert rows == [(3,)]
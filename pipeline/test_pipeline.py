@@ -0,0 +1,64 @@
+# pylint: skip-file
+import logging
+import pytest
+import pipeline
+from pipeline import PipelineRunner
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    def stage(name, output):
+        def run(runner, inputs):
+            calls.append((name, inputs))
+            return output, 3, 30
+        return run
+
+    def cached(name, output):
+        def read(runner):
+            calls.append((f'cached {name}', None))
+            return output
+        return read
+
+    monkeypatch.setattr(pipeline, 'STAGES', {
+        'load': {'depends_on': ['transform'], 'run': stage('load', 3),
+                 'cached': None},
+        'extract': {'depends_on': [], 'run': stage('extract', {}),
+                    'cached': cached('extract', {})},
+        'transform': {'depends_on': ['extract'], 'run': stage('transform', ['batch']),
+                      'cached': cached('transform', ['cached batch'])}
+    })
+    return calls
+
+
+def test_run_passes_outputs_in_dependency_order(calls):
+    metrics = PipelineRunner(logging.getLogger('test')).run()
+
+    assert calls == [('extract', {}),
+                     ('transform', {'extract': {}}),
+                     ('load', {'transform': ['batch']})]
+    assert set(metrics) == {'extract', 'transform', 'load'}
+    assert metrics['load']['rows'] == 3
+    assert metrics['load']['bytes'] == 30
+
+
+def test_run_single_stage_resumes_from_cached_artifact(calls):
+    metrics = PipelineRunner(logging.getLogger('test')).run('load')
+
+    assert calls == [('cached transform', None),
+                     ('load', {'transform': ['cached batch']})]
+    assert list(metrics) == ['load']
+
+
+def test_batch_meter_counts_batches_as_they_stream():
+    import pandas as pd
+    meter = pipeline.BatchMeter()
+    batches = meter.meter(iter([pd.DataFrame({'a': [1, 2]}), pd.DataFrame({'a': [3]})]))
+
+    assert meter.rows == 0
+    assert len(next(batches)) == 2
+    assert meter.rows == 2
+    list(batches)
+    assert meter.rows == 3
+    assert meter.bytes > 0
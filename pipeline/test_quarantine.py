@@ -0,0 +1,48 @@
+# pylint: skip-file
+import logging
+import pandas as pd
+import pytest
+from quarantine import QuarantineSink, read_quarantine
+
+
+@pytest.fixture
+def logger():
+    return logging.getLogger('test_quarantine')
+
+
+def test_sink_partitions_rows_by_date_and_truck(logger, tmp_path):
+    rejected = pd.DataFrame({
+        'timestamp': ['2024-10-01 12:00:00', '2024-10-02 09:00:00', 'garbage'],
+        'type': ['card', 'cash', 'card'],
+        'total': ['VOID', '0.00', '5.00'],
+        'truck_id': [1, 2, 1],
+        'reason': ['total_invalid', 'total_not_positive', 'timestamp_invalid']})
+
+    with QuarantineSink(logger, str(tmp_path)) as quarantine:
+        quarantine.add(rejected)
+
+    assert sorted(str(p.relative_to(tmp_path)) for p in tmp_path.glob('*/*')) == [
+        'date=2024-10-01/truck_id=1', 'date=2024-10-02/truck_id=2',
+        'date=unknown/truck_id=1']
+    rows = read_quarantine(str(tmp_path)).sort_values('total')
+    assert rows['total'].tolist() == ['0.00', '5.00', 'VOID']
+    assert rows['reason'].tolist() == ['total_not_positive', 'timestamp_invalid',
+                                       'total_invalid']
+
+
+def test_sink_counts_reasons_and_flushes_in_bulk(logger, tmp_path):
+    typed = pd.DataFrame({
+        'timestamp': pd.to_datetime(['2024-10-01 12:00:00'] * 3),
+        'type': ['card', 'cash', 'card'],
+        'total': [5.0, 2.5, 5.0],
+        'truck_id': [1, 1, 3]})
+    quarantine = QuarantineSink(logger, str(tmp_path), flush_rows=4)
+
+    quarantine.add(typed, 'duplicate')
+    assert not list(tmp_path.iterdir())
+    quarantine.add(typed.iloc[:1], 'unknown_truck')
+    quarantine.close()
+
+    assert quarantine.counts == {'duplicate': 3, 'unknown_truck': 1}
+    assert quarantine.flushes == 1
+    assert len(read_quarantine(str(tmp_path))) == 4
@@ -0,0 +1,73 @@
+# pylint: skip-file
+import logging
+import pandas as pd
+import pytest
+import global_variables as gv
+from load import load_transactions
+from rollup import build_rollup_delta, rebuild_rollup
+
+
+@pytest.fixture
+def transactions():
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(['2024-10-01 12:00:00', '2024-10-01 12:59:59',
+                                     '2024-10-01 13:00:00']),
+        'type': ['card', 'card', 'cash'],
+        'total': [5.5, 3.0, 2.0],
+        'truck_id': [1, 1, 1]
+    })
+
+
+def test_build_rollup_delta_buckets_by_hour():
+    fact = pd.DataFrame({
+        'at': pd.to_datetime(['2024-10-01 12:00:00', '2024-10-01 12:30:00',
+                              '2024-10-01 13:00:00']),
+        'payment_method_id': [1, 1, 1],
+        'total': [1.5, 2.5, 4.0],
+        'truck_id': [2, 2, 2]
+    })
+
+    delta = build_rollup_delta(fact)
+
+    assert delta['hour_start'].astype(str).tolist() == ['2024-10-01 12:00:00',
+                                                         '2024-10-01 13:00:00']
+    assert delta['transaction_count'].tolist() == [2, 1]
+    assert delta['total_sum'].tolist() == [4.0, 4.0]
+    assert delta['total_sum_of_squares'].tolist() == [8.5, 16.0]
+
+
+def test_second_load_increments_rollup_buckets(local_warehouse, transactions,
+                                               monkeypatch):
+    warehouse, conn = local_warehouse
+    monkeypatch.setenv('LOAD_MODE', gv.BATCH_LOAD_MODE)
+    later = transactions.assign(timestamp=transactions['timestamp'].dt.floor('h')
+                                + pd.Timedelta('10min'))
+
+    load_transactions([transactions], logging.getLogger('test_rollup'))
+    load_transactions([later], logging.getLogger('test_rollup'))
+
+    _, rows = warehouse.query(conn.cursor(), f"""
+        SELECT hour_start, payment_method_id, transaction_count, total_sum
+        FROM {gv.ROLLUP_TABLE} ORDER BY hour_start, payment_method_id""")
+    assert rows == [('2024-10-01 12:00:00', 1, 4, 17.0),
+                    ('2024-10-01 13:00:00', 2, 2, 4.0)]
+
+
+def test_rebuild_rollup_aggregates_transaction_history(local_warehouse, transactions,
+                                                      monkeypatch):
+    warehouse, conn = local_warehouse
+    monkeypatch.setenv('LOAD_MODE', gv.BATCH_LOAD_MODE)
+    load_transactions([transactions], logging.getLogger('test_rollup'))
+    query = f"""
+        SELECT hour_start, truck_id, payment_method_id, transaction_count,
+               total_sum, total_sum_of_squares
+        FROM {gv.ROLLUP_TABLE} ORDER BY hour_start, payment_method_id"""
+    _, maintained = warehouse.query(conn.cursor(), query)
+    conn.execute(f"DELETE FROM {gv.ROLLUP_TABLE}")
+    conn.execute(f"INSERT INTO {gv.ROLLUP_TABLE} VALUES ('2024-09-30 08:00:00', 1, 1, 9, 9, 9)")
+
+    buckets = rebuild_rollup(conn.cursor())
+
+    _, rebuilt = warehouse.query(conn.cursor(), query)
+    assert buckets == 2
+    assert rebuilt == maintained
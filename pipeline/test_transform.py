@@ -0,0 +1,110 @@
+# pylint: skip-file
+import io
+import logging
+import numpy as np
+import pandas as pd
+import pytest
+from quarantine import QuarantineSink, read_quarantine
+from transform import (FingerprintSet,
+                       get_truck_id,
+                       read_truck_frames,
+                       combine_transaction_data_buffers,
+                       clean_data,
+                       clean_data_in_chunks,
+                       write_processed_data,
+                       read_processed_data)
+
+
+@pytest.fixture
+def logger():
+    return logging.getLogger('test_transform')
+
+
+def test_get_truck_id():
+    assert get_truck_id('/app/T3_T12.csv') == 12
+    assert get_truck_id('trucks_2024-10_1_12_T3_T12.csv') == 12
+
+
+def test_read_truck_frames_keeps_file_order(logger, tmp_path):
+    sources = []
+    for truck in range(1, 6):
+        path = tmp_path / f'T3_T{truck}.csv'
+        path.write_text(f'timestamp,type,total,extra\n2024-10-01 12:00:00,card,{truck}.00,x\n')
+        sources.append((str(path), None))
+
+    combined = read_truck_frames(sources, logger)
+
+    assert combined.columns.tolist() == ['timestamp', 'type', 'total', 'truck_id']
+    assert combined['truck_id'].tolist() == [1, 2, 3, 4, 5]
+    assert combined['total'].tolist() == ['1.00', '2.00', '3.00', '4.00', '5.00']
+
+
+def test_combine_transaction_data_buffers_closes_buffers(logger):
+    buffer = io.BytesIO(b'timestamp,type,total\n2024-10-01 12:00:00,cash,VOID\n')
+
+    combined = combine_transaction_data_buffers({'T3_T2.csv': buffer}, logger)
+
+    assert combined['total'].tolist() == ['VOID']
+    assert buffer.closed
+
+
+def test_clean_data_in_chunks_matches_clean_data(logger):
+    rows = ['2024-10-01 12:00:00,card,5.00',
+            '2024-10-01 12:01:00,cash,VOID',
+            '2024-10-01 12:02:00,card,3.50',
+            '2024-10-01 12:00:00,card,5.00',
+            '2024-10-01 12:03:00,cash,0.00',
+            '2024-10-01 12:02:00,card,3.50',
+            '2024-10-01 12:04:00,cash,60.00']
+    body = ('timestamp,type,total\n' + '\n'.join(rows) + '\n').encode()
+
+    expected = clean_data(logger, {'T3_T1.csv': io.BytesIO(body),
+                                   'T3_T2.csv': io.BytesIO(body)})
+    batches = list(clean_data_in_chunks(
+        logger, {'T3_T1.csv': io.BytesIO(body), 'T3_T2.csv': io.BytesIO(body)}, 2))
+
+    assert len(batches) > 1
+    chunked = pd.concat(batches)
+    assert chunked.to_dict('list') == expected.to_dict('list')
+
+
+def test_processed_data_round_trips_with_dtypes(logger, tmp_path):
+    body = b'timestamp,type,total\n2024-10-01 12:00:00,card,5.00\n2024-10-01 12:01:00,cash,2.50\n'
+    path = str(tmp_path / 'processed.parquet')
+
+    rows = write_processed_data(
+        clean_data_in_chunks(logger, {'T3_T4.csv': io.BytesIO(body)}), path, logger)
+    batches = list(read_processed_data(path, 1))
+
+    assert rows == 2
+    assert len(batches) == 2
+    processed = pd.concat(batches, ignore_index=True)
+    assert processed['timestamp'].dtype.kind == 'M'
+    assert processed['total'].tolist() == [5.0, 2.5]
+    assert processed['truck_id'].tolist() == [4, 4]
+    assert processed['type'].tolist() == ['card', 'cash']
+
+
+def test_clean_data_in_chunks_quarantines_rejected_rows(logger, tmp_path):
+    body = (b'timestamp,type,total\n2024-10-01 12:00:00,card,5.00\n'
+            b'2024-10-01 12:01:00,cash,VOID\n2024-10-01 12:00:00,card,5.00\n')
+
+    with QuarantineSink(logger, str(tmp_path)) as quarantine:
+        batches = list(clean_data_in_chunks(
+            logger, {'T3_T1.csv': io.BytesIO(body)}, quarantine=quarantine))
+
+    assert sum(len(batch) for batch in batches) == 1
+    assert quarantine.counts == {'total_invalid': 1, 'duplicate': 1}
+    assert len(read_quarantine(str(tmp_path))) == 2
+
+
+def test_fingerprint_set_merges_runs_and_finds_members():
+    seen = FingerprintSet()
+    for start in range(0, 1000, 10):
+        seen.add(np.arange(start, start + 10, dtype=np.uint64) * 7)
+
+    assert len(seen) == 1000
+    assert len(seen.runs) <= 7
+    assert all((run[:-1] < run[1:]).all() for run in seen.runs)
+    assert seen.contains(np.array([0, 7, 6993, 6994, 7000], dtype=np.uint64)).tolist() == [
+        True, True, True, False, False]
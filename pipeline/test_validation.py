@@ -0,0 +1,54 @@
+# pylint: skip-file
+import pandas as pd
+import pytest
+from validation import validate_transactions
+
+
+@pytest.fixture
+def transactions():
+    return pd.DataFrame({
+        'timestamp': ['2024-10-01 12:00:00', '2024-10-01 12:01:00', 'not a time',
+                      '2024-10-01 12:03:00', '2024-10-01 12:04:00', '2024-10-01 12:05:00',
+                      '2024-10-01 12:06:00'],
+        'type': ['card', 'cash', 'card', 'crypto', 'card', 'cash', 'card'],
+        'total': ['5.00', 'VOID', '3.00', '2.00', '0.00', '60.00', 'blank'],
+        'truck_id': [1, 1, 1, 1, 1, 1, 1]
+    })
+
+
+def test_validate_transactions_keeps_valid_rows_typed(transactions):
+    valid, _, _ = validate_transactions(transactions)
+
+    assert valid['total'].tolist() == [5.0]
+    assert valid['timestamp'].dtype.kind == 'M'
+    assert isinstance(valid['type'].dtype, pd.CategoricalDtype)
+    assert valid['type'].cat.categories.tolist() == ['card', 'cash']
+
+
+def test_validate_transactions_tags_rejected_rows(transactions):
+    _, rejected, _ = validate_transactions(transactions)
+
+    assert rejected['reason'].tolist() == ['total_invalid', 'timestamp_invalid',
+                                           'type_not_allowed', 'total_not_positive',
+                                           'total_above_maximum', 'total_invalid']
+    assert rejected['total'].tolist() == ['VOID', '3.00', '2.00', '0.00', '60.00', 'blank']
+
+
+def test_validate_transactions_counts_each_rule(transactions):
+    _, _, counts = validate_transactions(transactions)
+
+    assert counts.to_dict() == {'timestamp_invalid': 1,
+                                'type_not_allowed': 1,
+                                'total_invalid': 2,
+                                'total_not_positive': 1,
+                                'total_above_maximum': 1}
+
+
+def test_validate_transactions_checks_a_given_schema_by_its_own_rules(transactions):
+    schema = {'total': {'dtype': 'float64',
+                        'at_most': {'bound': 2.0, 'rule': 'total_above_two'}}}
+
+    valid, _, counts = validate_transactions(transactions, schema=schema)
+
+    assert valid['total'].tolist() == [2.0, 0.0]
+    assert counts.to_dict() == {'total_invalid': 2, 'total_above_two': 3}
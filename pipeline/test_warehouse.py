@@ -0,0 +1,88 @@
+# pylint: skip-file
+import logging
+import pandas as pd
+import pytest
+from load import load_transactions
+from snapshot_store import get_snapshot_store
+from warehouse import get_warehouse, Warehouse, SQLiteWarehouse, RedshiftWarehouse
+
+
+def test_get_warehouse_defaults_to_redshift(monkeypatch):
+    monkeypatch.delenv('WAREHOUSE_BACKEND', raising=False)
+
+    assert isinstance(get_warehouse(), RedshiftWarehouse)
+    assert isinstance(get_warehouse('sqlite'), SQLiteWarehouse)
+    with pytest.raises(ValueError):
+        get_warehouse('oracle')
+
+
+def test_warehouse_backends_must_implement_connect():
+    with pytest.raises(TypeError):
+        Warehouse()
+
+
+def test_apply_schema_seeds_dimensions(local_warehouse):
+    warehouse, conn = local_warehouse
+
+    columns, rows = warehouse.query(
+        conn.cursor(), "SELECT truck_id, truck_name FROM dim_truck WHERE truck_id = ?", [6])
+
+    assert columns == ['truck_id', 'truck_name']
+    assert rows == [(6, 'SuperSmoothie')]
+
+
+def test_load_transactions_runs_against_local_warehouse(local_warehouse):
+    warehouse, conn = local_warehouse
+    transactions = pd.DataFrame({
+        'timestamp': pd.to_datetime(['2024-10-01 12:00:00', '2024-10-01 12:05:00']),
+        'type': ['card', 'cash'],
+        'total': [5.5, 3.0],
+        'truck_id': [1, 6]
+    })
+
+    loaded = load_transactions([transactions], logging.getLogger('test_warehouse'))
+
+    _, rows = warehouse.query(conn.cursor(), """
+        SELECT ft.transaction_id, ft.at, dpm.payment_method_type, ft.total, ft.truck_id
+        FROM fact_transaction AS ft
+        JOIN dim_payment_method AS dpm ON ft.payment_method_id = dpm.payment_method_id
+        ORDER BY ft.transaction_id""")
+    assert loaded == 2
+    assert rows == [(1, '2024-10-01 12:00:00', 'card', 5.5, 1),
+                    (2, '2024-10-01 12:05:00', 'cash', 3.0, 6)]
+
+
+def test_reloading_transactions_does_not_double_count(local_warehouse):
+    warehouse, conn = local_warehouse
+    transactions = pd.DataFrame({
+        'timestamp': pd.to_datetime(['2024-10-01 12:00:00', '2024-10-01 12:05:00']),
+        'type': ['card', 'cash'],
+        'total': [5.5, 3.0],
+        'truck_id': [1, 6]
+    })
+
+    load_transactions([transactions], logging.getLogger('test_warehouse'))
+    load_transactions([transactions], logging.getLogger('test_warehouse'))
+
+    _, facts = warehouse.query(conn.cursor(), "SELECT COUNT(*) FROM fact_transaction")
+    _, rollup = warehouse.query(
+        conn.cursor(), "SELECT SUM(transaction_count) FROM rollup_transaction_hourly")
+    assert facts == [(2,)]
+    assert rollup == [(2,)]
+
+
+def test_loading_a_day_deletes_its_report_snapshot(local_warehouse):
+    store = get_snapshot_store()
+    store.write('2024-09-30', {'date': '2024-09-30'})
+    store.write('2024-10-01', {'date': '2024-10-01'})
+    late_file = pd.DataFrame({
+        'timestamp': pd.to_datetime(['2024-10-01 21:40:00']),
+        'type': ['card'],
+        'total': [5.5],
+        'truck_id': [1]
+    })
+
+    load_transactions([late_file], logging.getLogger('test_warehouse'))
+
+    assert store.read('2024-09-30') == {'date': '2024-09-30'}
+    assert store.read('2024-10-01') is None
@@ -1,10 +1,16 @@
 """Takes downloaded data from a S3 bucket and transforms it, making it ready for deployment."""
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
-from extract import configure_logger
+from extract import configure_logger, is_matching_file
 import global_variables as gv
+from validation import validate_transactions
+from quarantine import QuarantineSink
 
 
 def get_current_directory() -> str:
@@ -18,19 +24,35 @@ def delete_csv_files(db_logger: logging.Logger) -> None:
     db_logger.info('Deleting files!')
 
     for file in os.listdir(current_directory):
-        if file.startswith(gv.PREFIX) and file.endswith(gv.SUFFIX):
+        if is_matching_file(file):
             file_path = os.path.join(current_directory, file)
             os.remove(file_path)
     db_logger.info('Files deleted!')
 
 
-def process_transaction_data_file(file: str, db_logger: logging.Logger) -> pd.DataFrame:
-    """Reads a CSV file and appends its contents to the combined DataFrame."""
+def get_object_name(file: str) -> str:
+    """Returns the object's own file name, such as T3_T1.csv, from its key, a path,
+    or a local name that carries the object's folders in front of it."""
+    name = os.path.basename(file)
+    return name[name.rindex(gv.PREFIX):]
+
+
+def get_truck_id(file: str) -> int:
+    """Extracts the truck id from a file name such as T3_T1.csv."""
+    truck_part = get_object_name(file).split('_')[1]
+    return int(truck_part.split('.')[gv.TRUCK_ID_EXTENSION_POSITION][1:])
+
+
+def process_transaction_data_file(file: str, db_logger: logging.Logger,
+                                  buffer=None) -> pd.DataFrame:
+    """Reads a CSV file, or its in-memory buffer, into a DataFrame tagged with the truck id."""
     db_logger.info(f"Retrieving data from {file}!")
 
-    truck_id = int(file.split('_')[1][1:])
+    truck_id = get_truck_id(file)
 
-    truck = pd.read_csv(file)
+    truck = pd.read_csv(file if buffer is None else buffer,
+                        usecols=gv.TRANSACTION_COLUMNS,
+                        dtype=gv.TRANSACTION_DTYPES)
     truck['truck_id'] = truck_id
     db_logger.info(f'File data from {file} copied!')
     return truck
@@ -38,22 +60,42 @@ def process_transaction_data_file(file: str, db_logger: logging.Logger) -> pd.Da
 
 def get_csv_files(current_directory: str) -> list:
     """Returns a list of CSV files in the specified directory that match the criteria."""
-    return [f for f in os.listdir(current_directory)
-            if f.startswith(gv.PREFIX) and f.endswith(gv.SUFFIX)]
+    return [f for f in os.listdir(current_directory) if is_matching_file(f)]
 
 
-def process_and_combine_files(csv_files: list, db_logger: logging.Logger) -> pd.DataFrame:
-    """Processes each CSV file and adds their data to a single DataFrame."""
-    combined_trucks = pd.DataFrame()
+def get_transform_workers() -> int:
+    """Returns the number of CSV files parsed concurrently."""
+    return int(os.getenv("TRANSFORM_WORKERS", str(gv.DEFAULT_TRANSFORM_WORKERS)))
 
-    for file in csv_files:
-        file_path = os.path.join(get_current_directory(), file)
-        processed_data = process_transaction_data_file(file_path, db_logger)
 
-        combined_trucks = pd.concat(
-            [combined_trucks, processed_data], ignore_index=True)
+def read_truck_frames(sources: list, db_logger: logging.Logger) -> pd.DataFrame:
+    """Parses each (file, buffer) source on a thread pool and concatenates the frames once."""
+    if not sources:
+        return pd.DataFrame()
+
+    with ThreadPoolExecutor(max_workers=get_transform_workers()) as executor:
+        trucks = executor.map(
+            lambda source: process_transaction_data_file(
+                source[0], db_logger, source[1]),
+            sources)
+        return pd.concat(trucks, ignore_index=True)
 
-    return combined_trucks
+
+def get_sources(buffers: dict = None) -> list:
+    """Returns (file, buffer) pairs for the streamed buffers, or for the downloaded files."""
+    if buffers is not None:
+        return list(buffers.items())
+    current_directory = get_current_directory()
+    return [(os.path.join(current_directory, file), None)
+            for file in get_csv_files(current_directory)]
+
+
+def process_and_combine_files(csv_files: list, db_logger: logging.Logger) -> pd.DataFrame:
+    """Processes each CSV file and adds their data to a single DataFrame."""
+    current_directory = get_current_directory()
+    return read_truck_frames(
+        [(os.path.join(current_directory, file), None) for file in csv_files],
+        db_logger)
 
 
 def combine_transaction_data_files(db_logger: logging.Logger) -> pd.DataFrame:
@@ -67,22 +109,13 @@ def combine_transaction_data_files(db_logger: logging.Logger) -> pd.DataFrame:
     return combined_trucks
 
 
-def filter_valid_totals(transactions: pd.DataFrame) -> pd.DataFrame:
-    """Filters out invalid total values from the DataFrame."""
-    invalid_values = [
-        gv.TOTAL_INVALID_BLANK,
-        gv.TOTAL_INVALID_ERR,
-        gv.TOTAL_INVALID_VOID,
-        gv.TOTAL_INVALID_ZERO
-    ]
-
-    valid_totals = (
-        transactions['total'].notna() &
-        ~transactions['total'].isin(invalid_values) &
-        (transactions['total'] > 0) &
-        (transactions['total'] <= 50)
-    )
-    return transactions[valid_totals]
+def combine_transaction_data_buffers(buffers: dict, db_logger: logging.Logger) -> pd.DataFrame:
+    """Combines streamed CSV buffers, keyed by file name, into a single DataFrame."""
+    try:
+        return read_truck_frames(list(buffers.items()), db_logger)
+    finally:
+        for buffer in buffers.values():
+            buffer.close()
 
 
 def clean_duplicates(transactions: pd.DataFrame) -> pd.DataFrame:
@@ -90,30 +123,172 @@ def clean_duplicates(transactions: pd.DataFrame) -> pd.DataFrame:
     return transactions.drop_duplicates()
 
 
-def convert_columns(transactions: pd.DataFrame) -> pd.DataFrame:
-    """Converts data types of specified columns."""
-    transactions['type'] = transactions['type'].astype(str)
-    transactions['timestamp'] = pd.to_datetime(transactions['timestamp'])
-    return transactions
-
-
-def convert_total_to_numeric(transactions: pd.DataFrame) -> pd.DataFrame:
-    """Converts the 'total' column to numeric, coercing errors."""
-    print(transactions.columns.tolist())
-    transactions['total'] = pd.to_numeric(
-        transactions['total'], errors='coerce')
-    return transactions
-
-
-def clean_data(db_logger: logging.Logger) -> pd.DataFrame:
-    """Cleans the data from the Pandas DataFrame."""
-    transactions = combine_transaction_data_files(db_logger)
-    transactions = convert_total_to_numeric(transactions)
-    transactions = filter_valid_totals(transactions)
-    transactions = clean_duplicates(transactions)
-    transactions = convert_columns(transactions)
-
-    return transactions
+def log_rejection_counts(db_logger: logging.Logger, rejection_counts: pd.Series) -> None:
+    """Logs how many rows each validation rule rejected."""
+    table = rejection_counts[rejection_counts > 0]
+    if table.empty:
+        db_logger.info("No rows rejected.")
+        return
+    db_logger.info("Rejected rows per rule:\n" + table.to_string())
+
+
+def quarantine_rejects(quarantine: QuarantineSink, rejected: pd.DataFrame,
+                       transactions: pd.DataFrame, cleaned: pd.DataFrame) -> None:
+    """Sends the rows failing validation, and the duplicates dropped from
+    transactions, to the quarantine sink if there is one."""
+    if quarantine is None:
+        return
+    quarantine.add(rejected)
+    quarantine.add(transactions.drop(cleaned.index), gv.REJECT_DUPLICATE)
+
+
+def clean_data(db_logger: logging.Logger, buffers: dict = None,
+               quarantine: QuarantineSink = None) -> pd.DataFrame:
+    """Cleans the data from the Pandas DataFrame.
+    Reads from streamed buffers when given, otherwise from downloaded files.
+    Rejected rows go to the quarantine sink when one is given."""
+    if buffers is None:
+        transactions = combine_transaction_data_files(db_logger)
+    else:
+        transactions = combine_transaction_data_buffers(buffers, db_logger)
+    if transactions.empty:
+        return transactions
+
+    transactions, rejected, rejection_counts = validate_transactions(transactions)
+    cleaned = clean_duplicates(transactions)
+    rejection_counts[gv.REJECT_DUPLICATE] = len(transactions) - len(cleaned)
+    quarantine_rejects(quarantine, rejected, transactions, cleaned)
+    log_rejection_counts(db_logger, rejection_counts)
+
+    return cleaned
+
+
+def get_chunk_rows() -> int:
+    """Returns the number of rows read from a file per chunk."""
+    return int(os.getenv("TRANSFORM_CHUNK_ROWS", str(gv.DEFAULT_TRANSFORM_CHUNK_ROWS)))
+
+
+def iter_truck_chunks(sources: list, db_logger: logging.Logger,
+                      chunk_rows: int):
+    """Yields each source's transactions in chunks of at most chunk_rows rows."""
+    for file, buffer in sources:
+        db_logger.info(f"Streaming data from {file}!")
+        truck_id = get_truck_id(file)
+        try:
+            with pd.read_csv(file if buffer is None else buffer,
+                             usecols=gv.TRANSACTION_COLUMNS,
+                             dtype=gv.TRANSACTION_DTYPES,
+                             chunksize=chunk_rows) as reader:
+                for chunk in reader:
+                    chunk['truck_id'] = truck_id
+                    yield chunk
+        finally:
+            if buffer is not None:
+                buffer.close()
+
+
+class FingerprintSet:
+    """Remembers 64-bit row fingerprints in sorted runs, merged like a binary
+    counter: a new run absorbs the newest run while that run is no larger.
+    Each fingerprint is copied O(log n) times over the whole input, so a chunk
+    costs time proportional to its own size, and memory stays at eight bytes
+    per fingerprint."""
+
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self.runs)
+
+    def contains(self, fingerprints: np.ndarray) -> np.ndarray:
+        """Returns a mask of the fingerprints already in the set. The fingerprints
+        are searched in sorted order, which keeps the lookups cache friendly."""
+        order = np.argsort(fingerprints)
+        needles = fingerprints[order]
+        found = np.zeros(len(fingerprints), dtype=bool)
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, needles), len(run) - 1)
+            found[order] |= run[positions] == needles
+        return found
+
+    def add(self, fingerprints: np.ndarray) -> None:
+        """Adds fingerprints that are unique and not yet in the set."""
+        run = np.sort(fingerprints)
+        while self.runs and len(self.runs[-1]) <= len(run):
+            run = np.sort(np.concatenate([self.runs.pop(), run]), kind='stable')
+        if len(run):
+            self.runs.append(run)
+
+
+def drop_seen_rows(transactions: pd.DataFrame, seen: FingerprintSet) -> tuple:
+    """Removes rows duplicated within the chunk or already seen in an earlier chunk.
+    Returns the kept rows and the fingerprints with the kept rows added."""
+    fingerprints = pd.util.hash_pandas_object(transactions, index=False).to_numpy()
+
+    keep = np.zeros(len(fingerprints), dtype=bool)
+    keep[np.unique(fingerprints, return_index=True)[1]] = True
+    keep &= ~seen.contains(fingerprints)
+
+    seen.add(fingerprints[keep])
+    return transactions[keep], seen
+
+
+def clean_chunk(transactions: pd.DataFrame, seen: FingerprintSet,
+                quarantine: QuarantineSink = None) -> tuple:
+    """Applies the cleaning steps of clean_data to a single chunk.
+    Returns the cleaned chunk, the updated fingerprints and the rejections per rule."""
+    transactions, rejected, rejection_counts = validate_transactions(transactions)
+    cleaned, seen = drop_seen_rows(transactions, seen)
+    rejection_counts[gv.REJECT_DUPLICATE] = len(transactions) - len(cleaned)
+    quarantine_rejects(quarantine, rejected, transactions, cleaned)
+
+    return cleaned, seen, rejection_counts
+
+
+def clean_data_in_chunks(db_logger: logging.Logger, buffers: dict = None,
+                         chunk_rows: int = None, quarantine: QuarantineSink = None):
+    """Cleans the data chunk by chunk, yielding cleaned batches so memory stays
+    bounded by the chunk size rather than the total input.
+    Rejected rows go to the quarantine sink when one is given."""
+    seen = FingerprintSet()
+    rejection_counts = pd.Series(dtype='int64')
+    for chunk in iter_truck_chunks(get_sources(buffers), db_logger,
+                                   chunk_rows or get_chunk_rows()):
+        transactions, seen, chunk_counts = clean_chunk(chunk, seen, quarantine)
+        rejection_counts = rejection_counts.add(chunk_counts, fill_value=0)
+        if not transactions.empty:
+            yield transactions
+    log_rejection_counts(db_logger, rejection_counts.astype('int64'))
+
+
+def get_processed_schema() -> pa.Schema:
+    """Returns the typed schema of the processed transaction artifact."""
+    return pa.schema([
+        ('timestamp', pa.timestamp('us')),
+        ('type', pa.dictionary(pa.int8(), pa.string())),
+        ('total', pa.float64()),
+        ('truck_id', pa.int64())
+    ])
+
+
+def write_processed_data(batches, path: str, db_logger: logging.Logger) -> int:
+    """Writes cleaned batches to a compressed Parquet file. Returns the rows written."""
+    schema = get_processed_schema()
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression=gv.PARQUET_COMPRESSION) as writer:
+        for transactions in batches:
+            writer.write_table(pa.Table.from_pandas(
+                transactions, schema=schema, preserve_index=False))
+            rows += len(transactions)
+    db_logger.info(f"Wrote {rows} processed transactions to {path}.")
+    return rows
+
+
+def read_processed_data(path: str, batch_rows: int = None):
+    """Yields the processed transactions in batches, with the dtypes they were written with."""
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=batch_rows or get_chunk_rows()):
+        yield batch.to_pandas()
 
 
 def main() -> None:
@@ -121,9 +296,9 @@ def main() -> None:
     load_dotenv()
 
     logger = configure_logger()
-    combine_transaction_data_files(logger)
-    transactions = clean_data(logger)
-    transactions.to_csv(gv.CSV_NAME, index=False)
+    with QuarantineSink(logger) as quarantine:
+        write_processed_data(clean_data_in_chunks(logger, quarantine=quarantine),
+                             gv.PROCESSED_DATA_NAME, logger)
 
 
 if __name__ == "__main__":
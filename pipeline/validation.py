@@ -0,0 +1,67 @@
+"""Validates transactions against the declarative schema in global_variables
+    in a single vectorised pass, counting rejections per rule."""
+import numpy as np
+import pandas as pd
+import global_variables as gv
+
+
+def convert_column(values: pd.Series, spec: dict) -> pd.Series:
+    """Converts a raw column to the dtype in its spec. Unparseable values become missing.
+    Numeric and categorical columns have few distinct values, so only those are parsed."""
+    if spec['dtype'] == 'datetime':
+        return pd.to_datetime(values, format=spec['format'], errors='coerce')
+
+    codes, uniques = pd.factorize(values)
+    if spec['dtype'] == 'category':
+        dtype = pd.CategoricalDtype(spec['categories'])
+        category_codes = np.append(dtype.categories.get_indexer(uniques), -1)
+        return pd.Series(pd.Categorical.from_codes(category_codes[codes], dtype=dtype),
+                         index=values.index)
+
+    numbers = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce')
+    numbers = np.append(numbers.to_numpy(dtype=spec['dtype'], na_value=np.nan), np.nan)
+    return pd.Series(numbers[codes], index=values.index)
+
+
+def compile_schema(schema: dict) -> list:
+    """Compiles the schema into (rule, column, check) triples,
+    where check returns a mask of the values that pass the rule.
+    Bounds carry their own rule name, which becomes the quarantine reason code."""
+    rules = []
+    for column, spec in schema.items():
+        missing_rule = 'not_allowed' if 'categories' in spec else 'invalid'
+        rules.append((f"{column}_{missing_rule}", column, pd.Series.notna))
+        if 'greater_than' in spec:
+            rules.append((spec['greater_than']['rule'], column,
+                          lambda values, bound=spec['greater_than']['bound']:
+                          values.isna() | (values > bound)))
+        if 'at_most' in spec:
+            rules.append((spec['at_most']['rule'], column,
+                          lambda values, bound=spec['at_most']['bound']:
+                          values.isna() | (values <= bound)))
+    return rules
+
+
+TRANSACTION_RULES = compile_schema(gv.TRANSACTION_SCHEMA)
+
+
+def validate_transactions(transactions: pd.DataFrame,
+                          schema: dict = None, rules: list = None) -> tuple:
+    """Converts every schema column and applies every rule in one pass.
+    Returns the valid converted rows, the rejected raw rows tagged with the first
+    rule they failed, and the number of rows failing each rule.
+    Without rules, a given schema is checked by its own compiled rules."""
+    rules = rules or (compile_schema(schema) if schema else TRANSACTION_RULES)
+    schema = schema or gv.TRANSACTION_SCHEMA
+
+    converted = transactions.assign(**{
+        column: convert_column(transactions[column], spec)
+        for column, spec in schema.items()})
+    failures = pd.DataFrame({rule: ~check(converted[column]).to_numpy()
+                             for rule, column, check in rules},
+                            index=transactions.index)
+    invalid = failures.any(axis=1)
+
+    rejected = transactions[invalid].assign(
+        reason=failures[invalid].idxmax(axis=1))
+    return converted[~invalid], rejected, failures.sum()
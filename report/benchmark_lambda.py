@@ -0,0 +1,116 @@
+"""Benchmarks the report handler's cold and warm latency against a local SQLite
+    warehouse. Each cold start runs in a fresh Python process, timing the import of
+    lambda_function and its first invocation. Warm invocations are then timed
+    serving the stored snapshot, answering a conditional request with 304, and
+    recomputing the report with and without the container's cached connection
+    and template."""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import shutil
+import statistics
+import subprocess
+from datetime import date, datetime, timedelta
+import shared_path  # pylint: disable=unused-import
+from warehouse import SQLiteWarehouse
+
+REPORT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_PATH = os.path.join(REPORT_DIRECTORY, '..', 'schema.sql')
+
+
+def create_warehouse(path: str) -> None:
+    """Builds a local warehouse with one day of hourly rollup buckets for yesterday."""
+    os.environ['WAREHOUSE_PATH'] = path
+    warehouse = SQLiteWarehouse()
+    conn = warehouse.connect()
+    warehouse.apply_schema(conn, SCHEMA_PATH)
+    yesterday = datetime.combine(date.today() - timedelta(days=1), datetime.min.time())
+    rows = [(yesterday + timedelta(hours=hour), truck_id, payment_method_id,
+             10 + truck_id, 100.0 + hour, 1000.0 + hour)
+            for hour in range(24) for truck_id in range(1, 7) for payment_method_id in (1, 2)]
+    warehouse.bulk_load(conn.cursor(), 'rollup_transaction_hourly',
+                        ['hour_start', 'truck_id', 'payment_method_id', 'transaction_count',
+                         'total_sum', 'total_sum_of_squares'], rows)
+    conn.commit()
+    conn.close()
+
+
+def run_container(invocations: int) -> dict:
+    """Times one simulated container: the import, the first invocation, then warm
+    invocations served from the snapshot and recomputed from the warehouse."""
+    start = time.perf_counter()
+    import lambda_function  # pylint: disable=import-outside-toplevel
+    imported = time.perf_counter()
+    etag = lambda_function.lambda_handler({}, None)['headers']['ETag']
+    first = time.perf_counter()
+
+    def time_calls(event: dict, before=None) -> float:
+        """Returns the median latency of the handler for an event."""
+        latencies = []
+        for _ in range(invocations):
+            if before:
+                before()
+            call_start = time.perf_counter()
+            lambda_function.lambda_handler(event, None)
+            latencies.append(time.perf_counter() - call_start)
+        return statistics.median(latencies)
+
+    def drop_snapshots() -> None:
+        """Removes stored snapshots, so the next call recomputes the report."""
+        shutil.rmtree(os.environ['REPORT_SNAPSHOT_PATH'], ignore_errors=True)
+
+    def drop_container_state() -> None:
+        """Forgets the connection and template, as every invocation used to."""
+        drop_snapshots()
+        lambda_function.SHARED_CONNECTION.conn = None
+        lambda_function.get_template.cache_clear()
+
+    snapshot = time_calls({})
+    not_modified = time_calls({'headers': {'If-None-Match': etag}})
+    warm = time_calls({}, drop_snapshots)
+    rebuilt = time_calls({}, drop_container_state)
+
+    return {"import": imported - start, "first": first - imported,
+            "snapshot": snapshot, "not_modified": not_modified,
+            "warm": warm, "rebuilt": rebuilt,
+            "modules": sorted(name for name in ('jinja2', 'redshift_connector', 'dotenv')
+                              if name in sys.modules)}
+
+
+def main() -> None:
+    """Prints cold start and warm invocation latency over several fresh processes."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--containers", type=int, default=5)
+    parser.add_argument("--invocations", type=int, default=50)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_container(args.invocations)))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        create_warehouse(os.path.join(directory, 'report.db'))
+        results = [json.loads(subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child",
+             "--invocations", str(args.invocations)],
+            cwd=REPORT_DIRECTORY, capture_output=True, text=True, check=True,
+            env=dict(os.environ, WAREHOUSE_BACKEND='sqlite',
+                     REPORT_SNAPSHOT_PATH=os.path.join(directory, f"snapshots_{container}"))
+        ).stdout) for container in range(args.containers)]
+
+    print(f"{'phase':>34} {'median ms':>10}")
+    for phase, label in [("import", "cold import"), ("first", "cold first invocation"),
+                         ("snapshot", "warm snapshot hit"),
+                         ("not_modified", "warm If-None-Match (304)"),
+                         ("warm", "warm recompute (reused)"),
+                         ("rebuilt", "warm recompute (rebuilt)")]:
+        print(f"{label:>34} {statistics.median(r[phase] for r in results) * 1000:>10.2f}")
+    print(f"\nModules loaded in the container: {', '.join(results[0]['modules'])}")
+
+
+if __name__ == "__main__":
+    main()
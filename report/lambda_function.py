@@ -1,200 +1,500 @@
-"""Script containing SQL queries to place in daily report."""
+"""Script containing SQL queries to place in daily report.
+The metrics are read from the hourly rollup the pipeline maintains."""
 
+from __future__ import annotations
 import os
 import json
-from datetime import datetime
-from jinja2 import Environment, FileSystemLoader
+import hashlib
+from functools import lru_cache
+from typing import TYPE_CHECKING
+from decimal import Decimal
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from jinja2 import Environment, FileSystemLoader, Template
 from dotenv import load_dotenv
-import redshift_connector
-from redshift_connector import Connection, Cursor
+import shared_path  # pylint: disable=unused-import
+from warehouse import get_warehouse
+from snapshot_store import get_snapshot_store, get_metrics_key
 
-JSON_FILE_NAME = f'report_data_{datetime.today().date()}.json'
-HTML_FILE_NAME = f'report_data_{datetime.today().date()}.html'
+if TYPE_CHECKING:
+    from redshift_connector import Connection, Cursor
+
+LOAD_SLOT_HOURS = (12, 15, 18, 21)
+LATE_FILE_LOOKBACK_SLOTS = 1
+LOAD_RUN_ALLOWANCE = timedelta(hours=1)
+FINAL_CACHE_CONTROL = 'public, max-age=3600'
+CONTENT_TYPES = {'html': 'text/html', 'json': 'application/json'}
+GRANULARITIES = ('day', 'week', 'month')
+MAX_RANGE_DAYS = 366
 
 
 def get_connection() -> Connection:
-    """Establish a connection to a redshift database."""
-    return redshift_connector.connect(
-        host=os.getenv('DB_HOST'),
-        database=os.getenv('DB_NAME'),
-        user=os.getenv('DB_USERNAME'),
-        password=os.getenv('DB_PASSWORD'),
-        port=os.getenv('DB_PORT')
-    )
+    """Establish a connection to the configured warehouse."""
+    load_dotenv()
+    return get_warehouse().connect()
 
 
 def get_cursor(conn: Connection) -> Cursor:
-    """Creates a redshift cursor."""
+    """Creates a warehouse cursor."""
     return conn.cursor()
 
 
-def get_db_cursor():
-    """Helper function for AWS Lambda."""
-    load_dotenv()
-    connection = get_connection()
-    return get_cursor(connection)
+class LazyConnection:
+    """Holds one connection for the life of the Lambda container.
+    It is opened on first use, and warm invocations reuse it after a liveness check,
+    reconnecting if the warehouse closed it between invocations."""
 
+    def __init__(self, connect):
+        self.connect = connect
+        self.conn = None
 
-def set_schema(db_cursor) -> None:
-    """Set search path for Redshift database."""
-    db_cursor.execute(f"""SET search_path to {os.getenv("DB_SCHEMA")}""")
+    def is_alive(self) -> bool:
+        """Ends the previous invocation's read transaction, so this one sees
+        fresh data, and checks the connection still answers a trivial query."""
+        try:
+            self.conn.rollback()
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            return True
+        except Exception:  # pylint: disable=broad-except
+            return False
 
+    def get(self) -> Connection:
+        """Returns the open connection, opening a new one if there is none or it died."""
+        if self.conn is not None and not self.is_alive():
+            try:
+                self.conn.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+            self.conn = None
+        if self.conn is None:
+            self.conn = self.connect()
+        return self.conn
 
-def total_transaction_value(db_cursor: Cursor) -> float:
-    """Gets the total transaction value from all trucks."""
-    set_schema(db_cursor)
-
-    db_cursor.execute("""
-                SELECT SUM(ft.total) FROM fact_transaction AS ft
-                WHERE DATE(ft.at) = CURRENT_DATE - INTERVAL '1 day';
-                    """)
 
-    result = db_cursor.fetchone()[0]
+SHARED_CONNECTION = LazyConnection(get_connection)
 
-    return float(result)
 
+def get_db_cursor() -> Cursor:
+    """Helper function for AWS Lambda. Reuses the container's connection."""
+    return get_cursor(SHARED_CONNECTION.get())
 
-def total_transaction_value_per_truck(db_cursor):
-    """Gets the total transaction value per truck name."""
-    set_schema(db_cursor)
 
-    db_cursor.execute("""
-        SELECT dt.truck_name, SUM(ft.total) 
-        FROM fact_transaction AS ft
-        JOIN dim_truck AS dt ON ft.truck_id = dt.truck_id
-        WHERE DATE(ft.at) = CURRENT_DATE - INTERVAL '1 day'
-        GROUP BY dt.truck_name
-        ORDER BY dt.truck_name;
-    """)
+@lru_cache(maxsize=None)
+def get_template() -> Template:
+    """Loads and compiles template.html once per container."""
+    env = Environment(loader=FileSystemLoader('.'))
+    return env.get_template('template.html')
 
-    result = db_cursor.fetchall()
-    return result
 
+def set_schema(db_cursor) -> None:
+    """Set search path for the warehouse schema."""
+    get_warehouse().set_schema(db_cursor, os.getenv("DB_SCHEMA"))
 
-def number_of_transactions(db_cursor: Cursor):
-    """Gets the number of transactions per truck."""
-    set_schema(db_cursor)
 
-    db_cursor.execute("""
-                SELECT COUNT(ft.transaction_id) FROM fact_transaction AS ft
-                WHERE DATE(ft.at) = CURRENT_DATE - INTERVAL '1 day';
-                   """)
+def get_day_window(report_date: date) -> tuple:
+    """Returns the start of the report date and the start of the day after it."""
+    start = datetime.combine(report_date, time.min)
+    return start, start + timedelta(days=1)
 
-    result = db_cursor.fetchone()[0]
-    return result
 
+def get_report_window(today: date = None) -> tuple:
+    """Returns the start and end of yesterday, the day the report covers."""
+    return get_day_window((today or date.today()) - timedelta(days=1))
 
-def number_of_transactions_per_truck(db_cursor):
-    """Gets the number of transactions per truck name."""
-    set_schema(db_cursor)
 
-    db_cursor.execute("""
-        SELECT dt.truck_name, COUNT(ft.transaction_id)
-        FROM fact_transaction AS ft
-        JOIN dim_truck AS dt ON ft.truck_id = dt.truck_id
-        WHERE DATE(ft.at) = CURRENT_DATE - INTERVAL '1 day'
+def fetch_truck_metrics(db_cursor: Cursor, start: datetime, end: datetime) -> list:
+    """Gets the total transaction value and number of transactions per truck name
+    between start and end. A plain range on hour_start lets the scan skip blocks
+    outside the window, which wrapping the column in DATE() would not."""
+    placeholder = get_warehouse().placeholder
+    db_cursor.execute(f"""
+        SELECT dt.truck_name, SUM(rt.total_sum), SUM(rt.transaction_count)
+        FROM rollup_transaction_hourly AS rt
+        JOIN dim_truck AS dt ON rt.truck_id = dt.truck_id
+        WHERE rt.hour_start >= {placeholder} AND rt.hour_start < {placeholder}
         GROUP BY dt.truck_name
         ORDER BY dt.truck_name;
-    """)
+    """, (start, end))
+
+    return db_cursor.fetchall()
+
+
+def fetch_daily_truck_metrics(db_cursor: Cursor, windows: list) -> dict:
+    """Gets the per-truck metrics for every day in the (start, end) windows in one
+    scan, with one range predicate on hour_start per window.
+    Returns the rows of each day keyed on its date; days without sales are absent."""
+    placeholder = get_warehouse().placeholder
+    ranges = ' OR '.join(f"(rt.hour_start >= {placeholder} AND rt.hour_start < {placeholder})"
+                         for _ in windows)
+    db_cursor.execute(f"""
+        SELECT DATE(rt.hour_start), dt.truck_name,
+               SUM(rt.total_sum), SUM(rt.transaction_count)
+        FROM rollup_transaction_hourly AS rt
+        JOIN dim_truck AS dt ON rt.truck_id = dt.truck_id
+        WHERE {ranges}
+        GROUP BY DATE(rt.hour_start), dt.truck_name
+        ORDER BY DATE(rt.hour_start), dt.truck_name;
+    """, [bound for window in windows for bound in window])
+
+    daily_metrics = defaultdict(list)
+    for day, truck_name, total, transactions in db_cursor.fetchall():
+        daily_metrics[date.fromisoformat(str(day))].append((truck_name, total, transactions))
+    return dict(daily_metrics)
+
+
+def total_transaction_value(truck_metrics: list) -> float:
+    """Gets the total transaction value from all trucks."""
+    return float(sum(truck[1] for truck in truck_metrics))
 
-    result = db_cursor.fetchall()
-    return result
 
+def total_transaction_value_per_truck(truck_metrics: list) -> list:
+    """Gets the total transaction value per truck name."""
+    return [(truck[0], truck[1]) for truck in truck_metrics]
 
-def total_average_revenue(db_cursor: Cursor) -> float:
-    """The average revenue from all trucks."""
-    set_schema(db_cursor)
 
-    db_cursor.execute("""
-                SELECT AVG(ft.total) FROM fact_transaction AS ft
-                WHERE DATE(ft.at) = CURRENT_DATE - INTERVAL '1 day';
-                   """)
-    result = db_cursor.fetchone()[0]
-    return float(result)
+def number_of_transactions(truck_metrics: list) -> int:
+    """Gets the number of transactions from all trucks."""
+    return sum(truck[2] for truck in truck_metrics)
 
 
-def average_revenue_per_truck(db_cursor: Cursor):
-    """Gets the average revenue per truck name."""
-    set_schema(db_cursor)
+def number_of_transactions_per_truck(truck_metrics: list) -> list:
+    """Gets the number of transactions per truck name."""
+    return [(truck[0], truck[2]) for truck in truck_metrics]
 
-    db_cursor.execute("""
-        SELECT dt.truck_name, AVG(ft.total)
-        FROM fact_transaction AS ft
-        JOIN dim_truck AS dt ON ft.truck_id = dt.truck_id
-        WHERE DATE(ft.at) = CURRENT_DATE - INTERVAL '1 day'
-        GROUP BY dt.truck_name
-        ORDER BY dt.truck_name;
-    """)
 
-    result = db_cursor.fetchall()
-    return result
+def total_average_revenue(truck_metrics: list) -> float:
+    """The average revenue per transaction from all trucks."""
+    transactions = number_of_transactions(truck_metrics)
+    if not transactions:
+        return 0.0
+    return round(total_transaction_value(truck_metrics) / transactions, 2)
 
 
-def write_data_as_json(db_cursor: Cursor) -> dict:
-    """Prepares the above functions into a readable JSON format."""
+def average_revenue_per_truck(truck_metrics: list) -> list:
+    """Gets the average revenue per transaction per truck name."""
+    return [(truck[0], round(truck[1] / truck[2], 2)) for truck in truck_metrics]
+
+
+def write_data_as_json(db_cursor: Cursor, report_date: date = None) -> dict:
+    """Prepares the metrics for the report date, yesterday by default, in a readable
+    JSON format. Every metric is derived from a single per-truck query."""
+    set_schema(db_cursor)
+    window = get_report_window() if report_date is None else get_day_window(report_date)
+    return format_report_data(fetch_truck_metrics(db_cursor, *window))
+
+
+def format_report_data(truck_metrics: list) -> dict:
+    """Derives every report metric from per-truck totals and transaction counts."""
     return {
-        "total_transaction_value": str(total_transaction_value(db_cursor)),
+        "total_transaction_value": str(total_transaction_value(truck_metrics)),
         "total_transaction_value_per_truck": [
             {"truck_name": truck[0],
              "total_value": str(truck[1])}
-            for truck in total_transaction_value_per_truck(db_cursor)
+            for truck in total_transaction_value_per_truck(truck_metrics)
         ],
-        "number_of_transactions": number_of_transactions(db_cursor),
+        "number_of_transactions": number_of_transactions(truck_metrics),
         "number_of_transactions_per_truck": [
             {"truck_name": truck[0],
              "transactions": truck[1]}
-            for truck in number_of_transactions_per_truck(db_cursor)
+            for truck in number_of_transactions_per_truck(truck_metrics)
         ],
-        "total_average_revenue": str(total_average_revenue(db_cursor)),
+        "total_average_revenue": str(total_average_revenue(truck_metrics)),
         "average_revenue_per_truck": [
             {"truck_name": truck[0],
              "average_revenue": str(truck[1])}
-            for truck in average_revenue_per_truck(db_cursor)
+            for truck in average_revenue_per_truck(truck_metrics)
         ]
     }
 
 
-def create_json_file(db_cursor: Cursor) -> None:
+def get_report_file_name(extension: str, report_date: date = None) -> str:
+    """Returns the name of a report file, dated today unless a report date is given."""
+    return f'report_data_{report_date or date.today()}.{extension}'
+
+
+def create_json_file(db_cursor: Cursor, data: dict = None, report_date: date = None) -> None:
     """Creates a JSON file displaying key metrics."""
-    with open(JSON_FILE_NAME, mode='w', encoding='utf-8') as f:
-        json.dump(write_data_as_json(db_cursor), f, indent=4)
+    with open(get_report_file_name('json', report_date), mode='w', encoding='utf-8') as f:
+        json.dump(data or write_data_as_json(db_cursor, report_date), f, indent=4)
 
 
-def create_html_file(db_cursor: Cursor) -> None:
+def create_html_file(db_cursor: Cursor, data: dict = None, report_date: date = None) -> None:
     """Creates a HTML file displaying the key metrics."""
-    data = write_data_as_json(db_cursor)
-
-    env = Environment(loader=FileSystemLoader('.'))
-    template = env.get_template('template.html')
+    data = data or write_data_as_json(db_cursor, report_date)
 
-    rendered_html = template.render(data=data)
+    rendered_html = get_template().render(data=data)
 
-    with open(HTML_FILE_NAME, mode='w', encoding='utf-8') as f:
+    with open(get_report_file_name('html', report_date), mode='w', encoding='utf-8') as f:
         f.write(rendered_html)
 
 
-def lambda_handler(event, context):
+def create_report_files(db_cursor: Cursor, report_date: date = None) -> None:
+    """Creates the JSON and HTML files from a single computation of the metrics."""
+    data = write_data_as_json(db_cursor, report_date)
+    create_json_file(db_cursor, data, report_date)
+    create_html_file(db_cursor, data, report_date)
+
+
+def get_etag(body: str) -> str:
+    """Returns a strong ETag for an artifact body."""
+    return f'"{hashlib.sha256(body.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def build_artifacts(data: dict) -> dict:
+    """Renders the HTML and JSON artifacts for report data, each with its ETag."""
+    html_body = get_template().render(data=data)
+    json_body = json.dumps(data, indent=4)
+    return {
+        "html": {"body": html_body, "etag": get_etag(html_body)},
+        "json": {"body": json_body, "etag": get_etag(json_body)}
+    }
+
+
+def build_snapshot(report_date: date, truck_metrics: list) -> dict:
+    """Builds a day's snapshot: its rendered artifacts."""
+    return {"date": report_date.isoformat(),
+            **build_artifacts(format_report_data(truck_metrics))}
+
+
+def build_metrics_snapshot(report_date: date, truck_metrics: list) -> dict:
+    """Builds the small object holding a day's per-truck totals and counts, which
+    multi-day reports add up without reading the day's artifacts."""
+    return {
+        "date": report_date.isoformat(),
+        "metrics": [[truck[0], str(truck[1]), int(truck[2])] for truck in truck_metrics]
+    }
+
+
+def get_snapshot_metrics(snapshot: dict) -> list:
+    """Returns the per-truck totals and counts stored in a metrics snapshot."""
+    return [(truck[0], Decimal(truck[1]), truck[2]) for truck in snapshot["metrics"]]
+
+
+def get_next_slot(slot_time: datetime) -> datetime:
+    """Returns the time of the pipeline run after the given one."""
+    following = slot_time + timedelta(hours=1)
+    while following.hour not in LOAD_SLOT_HOURS:
+        following += timedelta(hours=1)
+    return following
+
+
+def get_last_load_time(report_date: date) -> datetime:
+    """Returns when the last pipeline run that can add transactions to a day starts.
+    Each run also checks the folders of the LATE_FILE_LOOKBACK_SLOTS runs before it,
+    so the day's last folder is read again by that many later runs."""
+    slot_time = datetime.combine(report_date, time(max(LOAD_SLOT_HOURS)))
+    for _ in range(LATE_FILE_LOOKBACK_SLOTS):
+        slot_time = get_next_slot(slot_time)
+    return slot_time
+
+
+def is_final(report_date: date, now: datetime = None) -> bool:
+    """Checks the last pipeline run that can load the day's files has finished,
+    after which only a backfill changes its report, and that deletes the snapshot."""
+    return (now or datetime.now()) >= get_last_load_time(report_date) + LOAD_RUN_ALLOWANCE
+
+
+def get_day_runs(days: list) -> list:
+    """Groups days into runs of consecutive days. Returns the (start, end) window
+    covering each run."""
+    runs = []
+    for day in sorted(days):
+        if runs and day == runs[-1][1]:
+            runs[-1][1] = day + timedelta(days=1)
+        else:
+            runs.append([day, day + timedelta(days=1)])
+    return [(get_day_window(first)[0], get_day_window(after)[0]) for first, after in runs]
+
+
+def get_daily_metrics(days: list) -> dict:
+    """Returns the per-truck metrics of each day, keyed on its date. Stored days are
+    read concurrently. The rest are computed in one grouped query over only the
+    runs of missing days, and the final ones are stored for later requests."""
+    store = get_snapshot_store()
+    stored = store.read_many([get_metrics_key(day.isoformat()) for day in days])
+    daily_metrics = {day: get_snapshot_metrics(snapshot)
+                     for day, snapshot in zip(days, stored) if snapshot is not None}
+    missing = [day for day in days if day not in daily_metrics]
+    if not missing:
+        return daily_metrics
+
     db_cursor = get_db_cursor()
-    load_dotenv()
-    data = write_data_as_json(db_cursor)
+    set_schema(db_cursor)
+    fetched = fetch_daily_truck_metrics(db_cursor, get_day_runs(missing))
+    for day in missing:
+        daily_metrics[day] = fetched.get(day, [])
+        if is_final(day):
+            store.write(get_metrics_key(day.isoformat()),
+                        build_metrics_snapshot(day, daily_metrics[day]))
+    return daily_metrics
+
+
+def get_report_snapshot(report_date: date) -> dict:
+    """Returns the day's snapshot, computing it on a miss. Only final days are
+    stored, so a day still being loaded is recomputed on every request."""
+    store = get_snapshot_store()
+    snapshot = store.read(report_date.isoformat())
+    if snapshot is None:
+        snapshot = build_snapshot(report_date, get_daily_metrics([report_date])[report_date])
+        if is_final(report_date):
+            store.write(report_date.isoformat(), snapshot)
+    return snapshot
+
+
+def get_period_start(day: date, granularity: str) -> date:
+    """Returns the first day of the week, starting Monday, or month containing a day."""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def add_truck_metrics(truck_metrics: list) -> list:
+    """Adds up per-truck totals and counts from several days."""
+    totals = defaultdict(lambda: [0, 0])
+    for truck_name, total, transactions in truck_metrics:
+        totals[truck_name][0] += total
+        totals[truck_name][1] += transactions
+    return [(truck_name, total, transactions)
+            for truck_name, (total, transactions) in sorted(totals.items())]
+
+
+def build_range_data(start: date, end: date, granularity: str, daily_metrics: dict) -> dict:
+    """Prepares the metrics for a date range: totals over the whole range, and
+    the same metrics for each day, week or month within it."""
+    periods = defaultdict(list)
+    for day in sorted(daily_metrics):
+        periods[get_period_start(day, granularity)].append(day)
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "granularity": granularity,
+        **format_report_data(add_truck_metrics(
+            [truck for truck_metrics in daily_metrics.values()
+             for truck in truck_metrics])),
+        "periods": [
+            {"period_start": days[0].isoformat(),
+             "period_end": days[-1].isoformat(),
+             **format_report_data(add_truck_metrics(
+                 [truck for day in days for truck in daily_metrics[day]]))}
+            for days in periods.values()
+        ]
+    }
 
-    env = Environment(loader=FileSystemLoader('.'))
 
-    template = env.get_template('template.html')
+def get_header(event: dict, name: str) -> str:
+    """Returns a request header regardless of the case the caller sent it in."""
+    headers = event.get('headers') or {}
+    return next((value for key, value in headers.items()
+                 if key.lower() == name.lower()), None)
+
+
+def parse_report_date(value: str, today: date) -> date:
+    """Parses a requested date. Raises ValueError for a malformed date or a day
+    that is not over yet."""
+    try:
+        report_date = date.fromisoformat(value)
+    except ValueError as err:
+        raise ValueError(f"Invalid date {value}. Use YYYY-MM-DD.") from err
+    if report_date >= today:
+        raise ValueError(f"There is no report for {value} until the day is over.")
+    return report_date
+
+
+def get_requested_date(event: dict, today: date = None) -> date:
+    """Returns the date query parameter, yesterday by default."""
+    today = today or date.today()
+    value = (event.get('queryStringParameters') or {}).get('date')
+    if value is None:
+        return today - timedelta(days=1)
+    return parse_report_date(value, today)
+
+
+def get_requested_range(event: dict, today: date = None) -> tuple:
+    """Returns the inclusive start and end dates and the granularity of a range
+    request, or None when no start or end is given. The end defaults to yesterday
+    and the start to the end. Raises ValueError for a reversed range or one
+    longer than MAX_RANGE_DAYS."""
+    params = event.get('queryStringParameters') or {}
+    if 'start' not in params and 'end' not in params:
+        return None
+    today = today or date.today()
+    end = (parse_report_date(params['end'], today) if params.get('end')
+           else today - timedelta(days=1))
+    start = parse_report_date(params['start'], today) if params.get('start') else end
+    granularity = params.get('granularity', 'day')
+    if end < start:
+        raise ValueError(f"The range ends on {end} before it starts on {start}.")
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError(f"A range covers at most {MAX_RANGE_DAYS} days.")
+    if granularity not in GRANULARITIES:
+        raise ValueError(
+            f"Unknown granularity {granularity}. It must be one of {list(GRANULARITIES)}.")
+    return start, end, granularity
+
+
+def get_requested_format(event: dict) -> str:
+    """Returns the format query parameter, html by default."""
+    report_format = (event.get('queryStringParameters') or {}).get('format', 'html')
+    if report_format not in CONTENT_TYPES:
+        raise ValueError(
+            f"Unknown format {report_format}. It must be one of {list(CONTENT_TYPES)}.")
+    return report_format
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Checks an If-None-Match header against an ETag, comparing weakly."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip().removeprefix('W/')
+                  for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
 
-    rendered_html = template.render(data=data)
+
+def lambda_handler(event, context):
+    """Serves a day's report, or a date range's, as HTML or JSON. A day is served
+    from its snapshot, and a range is added up from the stored metrics of its days.
+    Answers 304 when the caller already holds the current version."""
+    try:
+        report_range = get_requested_range(event)
+        report_date = get_requested_date(event) if report_range is None else None
+        report_format = get_requested_format(event)
+    except ValueError as err:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'text/plain'},
+            'body': str(err)
+        }
+
+    if report_range is None:
+        last_day = report_date
+        artifact = get_report_snapshot(report_date)[report_format]
+    else:
+        start, last_day, granularity = report_range
+        days = [start + timedelta(days=offset)
+                for offset in range((last_day - start).days + 1)]
+        artifact = build_artifacts(build_range_data(
+            start, last_day, granularity, get_daily_metrics(days)))[report_format]
+    headers = {
+        'ETag': artifact['etag'],
+        'Cache-Control': (FINAL_CACHE_CONTROL
+                          if is_final(last_day) and get_snapshot_store().persistent
+                          else 'no-cache')
+    }
+    if etag_matches(get_header(event, 'If-None-Match'), artifact['etag']):
+        return {'statusCode': 304, 'headers': headers, 'body': ''}
 
     return {
         'statusCode': 200,
-        'headers': {
-            'Content-Type': 'text/html'
-        },
-        'body': rendered_html
+        'headers': {'Content-Type': CONTENT_TYPES[report_format], **headers},
+        'body': artifact['body']
     }
 
 
 if __name__ == "__main__":
-    load_dotenv()
-    cursor = get_db_cursor()
     response = lambda_handler({}, None)
     print(response['body'])
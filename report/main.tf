@@ -26,6 +26,7 @@ resource "aws_lambda_function" "c14-fahad-lambda-report" {
       DB_PASSWORD = var.DB_PASSWORD
       DB_PORT     = var.DB_PORT
       DB_SCHEMA   = var.DB_SCHEMA
+      REPORT_SNAPSHOT_BUCKET = var.REPORT_SNAPSHOT_BUCKET
     }
   }
 }
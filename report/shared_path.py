@@ -0,0 +1,10 @@
+"""Puts the modules shared between images on the import path. The images copy
+them beside the app; in a checkout they live in ../shared instead."""
+import os
+import sys
+
+SHARED_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'shared')
+
+if os.path.isdir(SHARED_DIR) and SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
@@ -2,8 +2,11 @@
 import pytest
 from unittest.mock import Mock, patch, mock_open
 import json
-from datetime import datetime
-from lambda_function import (total_transaction_value,
+from datetime import date, datetime
+from decimal import Decimal
+from lambda_function import (get_report_window,
+                             fetch_truck_metrics,
+                             total_transaction_value,
                              number_of_transactions,
                              total_average_revenue,
                              total_transaction_value_per_truck,
@@ -12,12 +15,34 @@ from lambda_function import (total_transaction_value,
                              write_data_as_json,
                              create_json_file,
                              create_html_file,
-                             lambda_handler)
+                             lambda_handler,
+                             get_template,
+                             LazyConnection,
+                             SHARED_CONNECTION,
+                             get_requested_date,
+                             etag_matches,
+                             is_final,
+                             format_report_data,
+                             get_requested_range,
+                             get_period_start,
+                             fetch_daily_truck_metrics,
+                             get_day_runs)
 
 JSON_FILE_NAME = f'report_data_{datetime.today().date()}.json'
 HTML_FILE_NAME = f'report_data_{datetime.today().date()}.html'
 
 
+@pytest.fixture(autouse=True)
+def fresh_container(tmp_path, monkeypatch):
+    monkeypatch.setenv('REPORT_SNAPSHOT_PATH', str(tmp_path / 'snapshots'))
+    monkeypatch.delenv('REPORT_SNAPSHOT_BUCKET', raising=False)
+    get_template.cache_clear()
+    SHARED_CONNECTION.conn = None
+    yield
+    get_template.cache_clear()
+    SHARED_CONNECTION.conn = None
+
+
 @pytest.fixture
 def sample_data():
     return {
@@ -39,145 +64,109 @@ def sample_data():
     }
 
 
-def test_total_transaction_value():
-    mock_cursor = Mock()
-    mock_cursor.fetchone.return_value = [2740.12]
+@pytest.fixture
+def truck_metrics():
+    return [
+        ("Burrito Madness", Decimal("718.60"), 92),
+        ("Cupcakes by Michelle", Decimal("587.01"), 99),
+        ("Hartmann's Jellied Eels", Decimal("124.63"), 37),
+        ("Kings of Kebabs", Decimal("782.40"), 96),
+        ("SuperSmoothie", Decimal("125.78"), 22),
+        ("Yoghurt Heaven", Decimal("401.70"), 73)
+    ]
+
 
-    result = total_transaction_value(mock_cursor)
+def test_get_report_window_covers_yesterday():
+    start, end = get_report_window(date(2024, 10, 2))
 
-    assert result == mock_cursor.fetchone.return_value[0]
+    assert start == datetime(2024, 10, 1)
+    assert end == datetime(2024, 10, 2)
 
 
-def test_number_of_transactions():
+def test_fetch_truck_metrics_uses_range_on_hour_start(truck_metrics):
     mock_cursor = Mock()
-    mock_cursor.fetchone.return_value = [99]
+    mock_cursor.fetchall.return_value = truck_metrics
 
-    result = number_of_transactions(mock_cursor)
+    result = fetch_truck_metrics(mock_cursor, datetime(2024, 10, 1), datetime(2024, 10, 2))
 
-    assert result == mock_cursor.fetchone.return_value[0]
+    query, params = mock_cursor.execute.call_args[0]
+    assert 'rt.hour_start >= %s AND rt.hour_start < %s' in query
+    assert 'DATE(' not in query
+    assert params == (datetime(2024, 10, 1), datetime(2024, 10, 2))
+    assert result == truck_metrics
 
 
-def test_total_average_revenue():
-    mock_cursor = Mock()
-    mock_cursor.fetchone.return_value = [6.50]
+def test_total_transaction_value(truck_metrics):
+    assert total_transaction_value(truck_metrics) == 2740.12
 
-    result = total_average_revenue(mock_cursor)
 
-    assert result == mock_cursor.fetchone.return_value[0]
+def test_number_of_transactions(truck_metrics):
+    assert number_of_transactions(truck_metrics) == 419
 
 
-def test_total_transaction_value_per_truck():
-    mock_cursor = Mock()
-    mock_cursor.fetchall.return_value = [
-        ("Burrito Madness", 718.60),
-        ("Cupcakes by Michelle", 587.01),
-        ("Hartmann's Jellied Eels", 124.63),
-        ("Kings of Kebabs", 782.40),
-        ("SuperSmoothie", 125.78),
-        ("Yoghurt Heaven", 401.70)
-    ]
+def test_total_average_revenue(truck_metrics):
+    assert total_average_revenue(truck_metrics) == 6.54
+    assert total_average_revenue([]) == 0.0
 
-    result = total_transaction_value_per_truck(mock_cursor)
 
-    assert result == mock_cursor.fetchall.return_value
+def test_total_transaction_value_per_truck(truck_metrics):
+    result = total_transaction_value_per_truck(truck_metrics)
 
+    assert result == [(truck[0], truck[1]) for truck in truck_metrics]
 
-def test_number_of_transactions_per_truck():
-    mock_cursor = Mock()
-    mock_cursor.fetchall.return_value = [
-        ("Burrito Madness", 3),
-        ("Cupcakes by Michelle", 4),
-        ("Hartmann's Jellied Eels", 15),
-        ("Kings of Kebabs", 2),
-        ("SuperSmoothie", 1),
-        ("Yoghurt Heaven", 22)
-    ]
-
-    result = number_of_transactions_per_truck(mock_cursor)
 
-    assert result == mock_cursor.fetchall.return_value
+def test_number_of_transactions_per_truck(truck_metrics):
+    result = number_of_transactions_per_truck(truck_metrics)
 
+    assert result == [(truck[0], truck[2]) for truck in truck_metrics]
 
-def test_average_revenue_per_truck():
-    mock_cursor = Mock()
-    mock_cursor.fetchall.return_value = [
-        ("Burrito Madness", 1.60),
-        ("Cupcakes by Michelle", 5.01),
-        ("Hartmann's Jellied Eels", 4.63),
-        ("Kings of Kebabs", 2.40),
-        ("SuperSmoothie", 1.78),
-        ("Yoghurt Heaven", 8.70)
-    ]
 
-    result = average_revenue_per_truck(mock_cursor)
+def test_average_revenue_per_truck(truck_metrics):
+    result = average_revenue_per_truck(truck_metrics)
 
-    assert result == mock_cursor.fetchall.return_value
+    assert [str(truck[1]) for truck in result] == [
+        "7.81", "5.93", "3.37", "8.15", "5.72", "5.50"]
 
 
-def test_write_data_as_json():
+def test_write_data_as_json(truck_metrics):
     mock_cursor = Mock()
+    mock_cursor.fetchall.return_value = truck_metrics
 
-    with patch('lambda_function.total_transaction_value', return_value=2740.12), \
-            patch('lambda_function.total_transaction_value_per_truck', return_value=[
-                ("Burrito Madness", 718.60),
-                ("Cupcakes by Michelle", 587.01),
-                ("Hartmann's Jellied Eels", 124.63),
-                ("Kings of Kebabs", 782.40),
-                ("SuperSmoothie", 125.78),
-                ("Yoghurt Heaven", 401.70)
-            ]), \
-            patch('lambda_function.number_of_transactions', return_value=419), \
-            patch('lambda_function.number_of_transactions_per_truck', return_value=[
-                ("Burrito Madness", 92),
-                ("Cupcakes by Michelle", 99),
-                ("Hartmann's Jellied Eels", 37),
-                ("Kings of Kebabs", 96),
-                ("SuperSmoothie", 22),
-                ("Yoghurt Heaven", 73)
-            ]), \
-            patch('lambda_function.total_average_revenue', return_value=6.53), \
-            patch('lambda_function.average_revenue_per_truck', return_value=[
-                ("Burrito Madness", 7.81),
-                ("Cupcakes by Michelle", 5.92),
-                ("Hartmann's Jellied Eels", 3.36),
-                ("Kings of Kebabs", 8.15),
-                ("SuperSmoothie", 5.71),
-                ("Yoghurt Heaven", 5.50)
-            ]):
-
-        result = write_data_as_json(mock_cursor)
-
-        expected_result = {
-            "total_transaction_value": "2740.12",
-            "total_transaction_value_per_truck": [
-                {"truck_name": "Burrito Madness", "total_value": "718.6"},
-                {"truck_name": "Cupcakes by Michelle", "total_value": "587.01"},
-                {"truck_name": "Hartmann's Jellied Eels", "total_value": "124.63"},
-                {"truck_name": "Kings of Kebabs", "total_value": "782.4"},
-                {"truck_name": "SuperSmoothie", "total_value": "125.78"},
-                {"truck_name": "Yoghurt Heaven", "total_value": "401.7"}
-            ],
-            "number_of_transactions": 419,
-            "number_of_transactions_per_truck": [
-                {"truck_name": "Burrito Madness", "transactions": 92},
-                {"truck_name": "Cupcakes by Michelle", "transactions": 99},
-                {"truck_name": "Hartmann's Jellied Eels", "transactions": 37},
-                {"truck_name": "Kings of Kebabs", "transactions": 96},
-                {"truck_name": "SuperSmoothie", "transactions": 22},
-                {"truck_name": "Yoghurt Heaven", "transactions": 73}
-            ],
-            "total_average_revenue": "6.53",
-            "average_revenue_per_truck": [
-                {"truck_name": "Burrito Madness", "average_revenue": "7.81"},
-                {"truck_name": "Cupcakes by Michelle", "average_revenue": "5.92"},
-                {"truck_name": "Hartmann's Jellied Eels", "average_revenue": "3.36"},
-                {"truck_name": "Kings of Kebabs", "average_revenue": "8.15"},
-                {"truck_name": "SuperSmoothie", "average_revenue": "5.71"},
-                {"truck_name": "Yoghurt Heaven", "average_revenue": "5.5"}
-            ]
-        }
-
-        assert result == expected_result
+    result = write_data_as_json(mock_cursor)
+
+    expected_result = {
+        "total_transaction_value": "2740.12",
+        "total_transaction_value_per_truck": [
+            {"truck_name": "Burrito Madness", "total_value": "718.60"},
+            {"truck_name": "Cupcakes by Michelle", "total_value": "587.01"},
+            {"truck_name": "Hartmann's Jellied Eels", "total_value": "124.63"},
+            {"truck_name": "Kings of Kebabs", "total_value": "782.40"},
+            {"truck_name": "SuperSmoothie", "total_value": "125.78"},
+            {"truck_name": "Yoghurt Heaven", "total_value": "401.70"}
+        ],
+        "number_of_transactions": 419,
+        "number_of_transactions_per_truck": [
+            {"truck_name": "Burrito Madness", "transactions": 92},
+            {"truck_name": "Cupcakes by Michelle", "transactions": 99},
+            {"truck_name": "Hartmann's Jellied Eels", "transactions": 37},
+            {"truck_name": "Kings of Kebabs", "transactions": 96},
+            {"truck_name": "SuperSmoothie", "transactions": 22},
+            {"truck_name": "Yoghurt Heaven", "transactions": 73}
+        ],
+        "total_average_revenue": "6.54",
+        "average_revenue_per_truck": [
+            {"truck_name": "Burrito Madness", "average_revenue": "7.81"},
+            {"truck_name": "Cupcakes by Michelle", "average_revenue": "5.93"},
+            {"truck_name": "Hartmann's Jellied Eels", "average_revenue": "3.37"},
+            {"truck_name": "Kings of Kebabs", "average_revenue": "8.15"},
+            {"truck_name": "SuperSmoothie", "average_revenue": "5.72"},
+            {"truck_name": "Yoghurt Heaven", "average_revenue": "5.50"}
+        ]
+    }
+
+    assert result == expected_result
+    assert mock_cursor.execute.call_count == 2
+    assert mock_cursor.fetchall.call_count == 1
 
 
 def test_create_json_file(sample_data):
@@ -230,7 +219,8 @@ def test_lambda_handler(sample_data):
     rendered_html = "<html><body>Sample Rendered HTML</body></html>"
 
     with patch('lambda_function.get_db_cursor') as mock_get_db_cursor, \
-            patch('lambda_function.write_data_as_json', return_value=sample_data), \
+            patch('lambda_function.fetch_daily_truck_metrics', return_value={}), \
+            patch('lambda_function.format_report_data', return_value=sample_data), \
             patch('lambda_function.Environment') as mock_environment, \
             patch('lambda_function.load_dotenv'):
 
@@ -249,3 +239,216 @@ def test_lambda_handler(sample_data):
         mock_get_db_cursor.assert_called_once()
         mock_env_instance.get_template.assert_called_once_with('template.html')
         mock_template.render.assert_called_once_with(data=sample_data)
+
+
+def test_lazy_connection_reuses_live_connection():
+    connect = Mock()
+    lazy = LazyConnection(connect)
+
+    first = lazy.get()
+    second = lazy.get()
+
+    assert first is second
+    connect.assert_called_once()
+    first.rollback.assert_called_once()
+
+
+def test_lazy_connection_reconnects_when_dead():
+    dead, fresh = Mock(), Mock()
+    dead.cursor.return_value.execute.side_effect = Exception('connection closed')
+    lazy = LazyConnection(Mock(side_effect=[dead, fresh]))
+
+    lazy.get()
+
+    assert lazy.get() is fresh
+    dead.close.assert_called_once()
+
+
+def test_lambda_handler_compiles_template_once(sample_data):
+    with patch('lambda_function.get_db_cursor'), \
+            patch('lambda_function.fetch_daily_truck_metrics', return_value={}), \
+            patch('lambda_function.format_report_data', return_value=sample_data), \
+            patch('lambda_function.Environment') as mock_environment:
+        mock_template = mock_environment.return_value.get_template.return_value
+        mock_template.render.return_value = "<html/>"
+
+        lambda_handler({'queryStringParameters': {'date': '2024-09-30'}}, None)
+        lambda_handler({'queryStringParameters': {'date': '2024-10-01'}}, None)
+
+        assert mock_template.render.call_count == 2
+        mock_environment.return_value.get_template.assert_called_once_with('template.html')
+
+
+def test_get_requested_date_defaults_to_yesterday():
+    today = date(2024, 10, 2)
+
+    assert get_requested_date({}, today) == date(2024, 10, 1)
+    assert get_requested_date(
+        {'queryStringParameters': {'date': '2024-09-30'}}, today) == date(2024, 9, 30)
+    for value in ['2024-10-02', '30/09/2024']:
+        with pytest.raises(ValueError):
+            get_requested_date({'queryStringParameters': {'date': value}}, today)
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"xyz", W/"abc"', '"abc"')
+    assert etag_matches('*', '"abc"')
+    assert not etag_matches('"xyz"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_is_final_waits_for_the_run_looking_back_on_the_last_slot():
+    assert not is_final(date(2024, 10, 1), datetime(2024, 10, 2, 3))
+    assert not is_final(date(2024, 10, 1), datetime(2024, 10, 2, 12, 30))
+    assert is_final(date(2024, 10, 1), datetime(2024, 10, 2, 13))
+
+
+def test_lambda_handler_serves_snapshot_with_etag(truck_metrics):
+    event = {'queryStringParameters': {'date': '2024-10-01', 'format': 'json'}}
+
+    with patch('lambda_function.get_db_cursor') as mock_get_db_cursor, \
+            patch('lambda_function.fetch_daily_truck_metrics',
+                  return_value={date(2024, 10, 1): truck_metrics}) as mock_fetch, \
+            patch('lambda_function.get_template') as mock_get_template:
+        mock_get_template.return_value.render.return_value = "<html/>"
+
+        first = lambda_handler(event, None)
+        second = lambda_handler(event, None)
+        revalidated = lambda_handler(
+            dict(event, headers={'if-none-match': first['headers']['ETag']}), None)
+
+    assert first['statusCode'] == 200
+    assert first['headers']['Content-Type'] == 'application/json'
+    assert first['headers']['Cache-Control'] == 'public, max-age=3600'
+    assert json.loads(first['body']) == format_report_data(truck_metrics)
+    assert second == first
+    assert revalidated['statusCode'] == 304
+    assert revalidated['body'] == ''
+    mock_get_db_cursor.assert_called_once()
+    mock_fetch.assert_called_once_with(mock_get_db_cursor.return_value,
+                                       [(datetime(2024, 10, 1), datetime(2024, 10, 2))])
+
+
+def test_lambda_handler_rejects_unfinished_day():
+    event = {'queryStringParameters': {'date': date.today().isoformat()}}
+
+    with patch('lambda_function.get_db_cursor') as mock_get_db_cursor:
+        response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 400
+    mock_get_db_cursor.assert_not_called()
+
+
+def test_fetch_daily_truck_metrics_groups_rows_by_day():
+    mock_cursor = Mock()
+    mock_cursor.fetchall.return_value = [
+        ("2024-10-01", "Burrito Madness", Decimal("10.00"), 2),
+        ("2024-10-01", "SuperSmoothie", Decimal("4.50"), 1),
+        ("2024-10-03", "Burrito Madness", Decimal("3.00"), 1)
+    ]
+
+    result = fetch_daily_truck_metrics(mock_cursor, [
+        (datetime(2024, 10, 1), datetime(2024, 10, 2)),
+        (datetime(2024, 10, 3), datetime(2024, 10, 4))])
+
+    query, params = mock_cursor.execute.call_args[0]
+    assert ('(rt.hour_start >= %s AND rt.hour_start < %s) OR '
+            '(rt.hour_start >= %s AND rt.hour_start < %s)') in query
+    assert params == [datetime(2024, 10, 1), datetime(2024, 10, 2),
+                      datetime(2024, 10, 3), datetime(2024, 10, 4)]
+    assert result == {
+        date(2024, 10, 1): [("Burrito Madness", Decimal("10.00"), 2),
+                            ("SuperSmoothie", Decimal("4.50"), 1)],
+        date(2024, 10, 3): [("Burrito Madness", Decimal("3.00"), 1)]
+    }
+
+
+def test_get_requested_range():
+    today = date(2024, 10, 10)
+
+    assert get_requested_range({}, today) is None
+    assert get_requested_range({'queryStringParameters': {
+        'start': '2024-09-01', 'granularity': 'week'}}, today) == (
+        date(2024, 9, 1), date(2024, 10, 9), 'week')
+    for params in [{'start': '2024-10-05', 'end': '2024-10-01'},
+                   {'start': '2022-01-01'},
+                   {'start': '2024-10-01', 'granularity': 'year'}]:
+        with pytest.raises(ValueError):
+            get_requested_range({'queryStringParameters': params}, today)
+
+
+def test_get_period_start():
+    assert get_period_start(date(2024, 10, 3), 'day') == date(2024, 10, 3)
+    assert get_period_start(date(2024, 10, 3), 'week') == date(2024, 9, 30)
+    assert get_period_start(date(2024, 10, 3), 'month') == date(2024, 10, 1)
+
+
+def test_lambda_handler_range_reuses_stored_days(truck_metrics):
+    first_week = {'queryStringParameters': {
+        'start': '2024-09-30', 'end': '2024-10-06', 'format': 'json'}}
+    fortnight = {'queryStringParameters': {
+        'start': '2024-09-30', 'end': '2024-10-13', 'granularity': 'week', 'format': 'json'}}
+    daily_metrics = {date(2024, 10, 1): truck_metrics[:2], date(2024, 10, 8): truck_metrics[:1]}
+
+    with patch('lambda_function.get_db_cursor') as mock_get_db_cursor, \
+            patch('lambda_function.fetch_daily_truck_metrics',
+                  return_value=daily_metrics) as mock_fetch, \
+            patch('lambda_function.get_template') as mock_get_template:
+        mock_get_template.return_value.render.return_value = "<html/>"
+
+        lambda_handler(first_week, None)
+        response = lambda_handler(fortnight, None)
+
+    data = json.loads(response['body'])
+    assert mock_fetch.call_args_list[1][0][1] == [(datetime(2024, 10, 7), datetime(2024, 10, 14))]
+    assert data['number_of_transactions'] == 92 * 2 + 99
+    assert data['total_transaction_value'] == "2024.21"
+    assert [(period['period_start'], period['period_end'], period['number_of_transactions'])
+            for period in data['periods']] == [('2024-09-30', '2024-10-06', 191),
+                                               ('2024-10-07', '2024-10-13', 92)]
+
+
+def test_get_day_runs_covers_only_consecutive_days():
+    days = [date(2024, 10, 31), date(2024, 10, 1), date(2024, 10, 2), date(2024, 10, 5)]
+
+    assert get_day_runs(days) == [(datetime(2024, 10, 1), datetime(2024, 10, 3)),
+                                  (datetime(2024, 10, 5), datetime(2024, 10, 6)),
+                                  (datetime(2024, 10, 31), datetime(2024, 11, 1))]
+
+
+def test_lambda_handler_range_fetches_only_missing_runs(truck_metrics):
+    middle = {'queryStringParameters': {'start': '2024-10-02', 'end': '2024-10-30'}}
+    month = {'queryStringParameters': {'start': '2024-10-01', 'end': '2024-10-31',
+                                       'format': 'json'}}
+
+    with patch('lambda_function.get_db_cursor'), \
+            patch('lambda_function.fetch_daily_truck_metrics',
+                  return_value={date(2024, 10, 1): truck_metrics[:1]}) as mock_fetch, \
+            patch('lambda_function.get_template') as mock_get_template:
+        mock_get_template.return_value.render.return_value = "<html/>"
+
+        lambda_handler(middle, None)
+        response = lambda_handler(month, None)
+
+    assert mock_fetch.call_args_list[1][0][1] == [
+        (datetime(2024, 10, 1), datetime(2024, 10, 2)),
+        (datetime(2024, 10, 31), datetime(2024, 11, 1))]
+    assert json.loads(response['body'])['number_of_transactions'] == 92
+
+
+def test_lambda_handler_without_shared_store_keeps_nothing(truck_metrics, monkeypatch):
+    monkeypatch.delenv('REPORT_SNAPSHOT_PATH')
+    event = {'queryStringParameters': {'date': '2024-10-01'}}
+
+    with patch('lambda_function.get_db_cursor'), \
+            patch('lambda_function.fetch_daily_truck_metrics',
+                  return_value={date(2024, 10, 1): truck_metrics}) as mock_fetch, \
+            patch('lambda_function.get_template') as mock_get_template:
+        mock_get_template.return_value.render.return_value = "<html/>"
+
+        first = lambda_handler(event, None)
+        lambda_handler(event, None)
+
+    assert first['headers']['Cache-Control'] == 'no-cache'
+    assert mock_fetch.call_count == 2
@@ -21,3 +21,7 @@ variable "DB_PASSWORD" {
 variable "DB_SCHEMA" {
     type = string
 }
+
+variable "REPORT_SNAPSHOT_BUCKET" {
+    type = string
+}
@@ -2,6 +2,7 @@
 
 SET search_path TO fahad_rahman_schema;
 
+DROP TABLE IF EXISTS rollup_transaction_hourly;
 DROP TABLE IF EXISTS fact_transaction;
 DROP TABLE IF EXISTS dim_payment_method;
 DROP TABLE IF EXISTS dim_truck;
@@ -27,6 +28,20 @@ CREATE TABLE fact_transaction (
     payment_method_id SMALLINT,
     total DECIMAL(10, 2) NOT NULL,
     truck_id BIGINT,
+    transaction_fingerprint BIGINT NOT NULL,
+    UNIQUE (transaction_fingerprint),
+    FOREIGN KEY (payment_method_id) REFERENCES dim_payment_method(payment_method_id),
+    FOREIGN KEY (truck_id) REFERENCES dim_truck(truck_id)
+);
+
+CREATE TABLE rollup_transaction_hourly (
+    hour_start TIMESTAMP NOT NULL,
+    truck_id BIGINT NOT NULL,
+    payment_method_id SMALLINT NOT NULL,
+    transaction_count BIGINT NOT NULL,
+    total_sum DECIMAL(18, 2) NOT NULL,
+    total_sum_of_squares DECIMAL(24, 4) NOT NULL,
+    PRIMARY KEY (hour_start, truck_id, payment_method_id),
     FOREIGN KEY (payment_method_id) REFERENCES dim_payment_method(payment_method_id),
     FOREIGN KEY (truck_id) REFERENCES dim_truck(truck_id)
 );
@@ -0,0 +1,156 @@
+"""Stores materialised daily report snapshots, keyed on the report date, in a local
+    directory or an S3 bucket, so a finished day is only computed once. The report
+    reads and writes them; the pipeline deletes those of the days it loads."""
+import os
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_SNAPSHOT_PREFIX = 'report_snapshots'
+S3_DELETE_BATCH_KEYS = 1000
+S3_READ_WORKERS = 16
+METRICS_KEY_SUFFIX = '.metrics'
+
+
+def get_metrics_key(key: str) -> str:
+    """Returns the key of the small object holding a day's per-truck metrics,
+    stored beside its full snapshot so ranges never read the rendered reports."""
+    return f"{key}{METRICS_KEY_SUFFIX}"
+
+
+class NullSnapshotStore:
+    """Stores nothing. Used when no store both the report and the pipeline can
+    reach is configured, as a snapshot the pipeline cannot invalidate would hide
+    a backfilled day for good."""
+    persistent = False
+
+    def read(self, _key: str) -> dict:
+        """Returns None, as nothing is stored."""
+        return None
+
+    def read_many(self, keys: list) -> list:
+        """Returns None for every key."""
+        return [None] * len(keys)
+
+    def write(self, key: str, snapshot: dict) -> None:
+        """Discards the snapshot."""
+
+    def delete(self, keys: list) -> None:
+        """Has nothing to delete."""
+
+
+class LocalSnapshotStore:
+    """Keeps each snapshot as a JSON file in a directory, such as a mounted file
+    system shared with the pipeline, or a test's temporary directory."""
+    persistent = True
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def get_path(self, key: str) -> str:
+        """Returns the file a snapshot is kept in."""
+        return os.path.join(self.directory, f"{key}.json")
+
+    def read(self, key: str) -> dict:
+        """Returns the snapshot stored under the key, or None."""
+        try:
+            with open(self.get_path(key), encoding='utf-8') as snapshot_file:
+                return json.load(snapshot_file)
+        except FileNotFoundError:
+            return None
+
+    def read_many(self, keys: list) -> list:
+        """Returns the snapshot stored under each key, or None, in the keys' order."""
+        return [self.read(key) for key in keys]
+
+    def write(self, key: str, snapshot: dict) -> None:
+        """Stores a snapshot. It is written to a temporary file and renamed into
+        place, so a concurrent reader never sees half of it."""
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.directory,
+                                         suffix='.tmp', delete=False) as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(snapshot_file.name, self.get_path(key))
+
+    def delete(self, keys: list) -> None:
+        """Removes the snapshots stored under the keys, skipping any not stored."""
+        for key in keys:
+            try:
+                os.remove(self.get_path(key))
+            except FileNotFoundError:
+                pass
+
+
+class S3SnapshotStore:
+    """Keeps each snapshot as a JSON object in a bucket, shared by every container.
+    boto3 is imported on first use, so the local store never loads it."""
+    persistent = True
+
+    def __init__(self, bucket: str, prefix: str = DEFAULT_SNAPSHOT_PREFIX):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.s_three_client = None
+
+    def get_client(self):
+        """Returns the store's S3 client, creating it on first use."""
+        if self.s_three_client is None:
+            import boto3  # pylint: disable=import-outside-toplevel
+            self.s_three_client = boto3.client('s3')
+        return self.s_three_client
+
+    def get_key(self, key: str) -> str:
+        """Returns the object key a snapshot is kept under."""
+        return f"{self.prefix}/{key}.json"
+
+    def read(self, key: str) -> dict:
+        """Returns the snapshot stored under the key, or None."""
+        s_three_client = self.get_client()
+        try:
+            response = s_three_client.get_object(Bucket=self.bucket, Key=self.get_key(key))
+        except s_three_client.exceptions.NoSuchKey:
+            return None
+        return json.loads(response['Body'].read())
+
+    def read_many(self, keys: list) -> list:
+        """Returns the snapshot stored under each key, or None, in the keys' order.
+        The objects are fetched concurrently, so a year of days is not 366 round trips
+        one after another."""
+        self.get_client()
+        with ThreadPoolExecutor(max_workers=S3_READ_WORKERS) as executor:
+            return list(executor.map(self.read, keys))
+
+    def write(self, key: str, snapshot: dict) -> None:
+        """Stores a snapshot."""
+        self.get_client().put_object(
+            Bucket=self.bucket, Key=self.get_key(key),
+            Body=json.dumps(snapshot).encode('utf-8'), ContentType='application/json')
+
+    def delete(self, keys: list) -> None:
+        """Removes the snapshots stored under the keys, in as few requests as S3
+        allows. Keys that are not stored are ignored."""
+        keys = list(keys)
+        for start in range(0, len(keys), S3_DELETE_BATCH_KEYS):
+            self.get_client().delete_objects(Bucket=self.bucket, Delete={
+                'Objects': [{'Key': self.get_key(key)}
+                            for key in keys[start:start + S3_DELETE_BATCH_KEYS]],
+                'Quiet': True})
+
+
+def get_snapshot_store():
+    """Returns the S3 store when REPORT_SNAPSHOT_BUCKET is set, the local store at
+    REPORT_SNAPSHOT_PATH when that is set, and otherwise a store keeping nothing."""
+    bucket = os.getenv('REPORT_SNAPSHOT_BUCKET')
+    if bucket:
+        return S3SnapshotStore(bucket, os.getenv('REPORT_SNAPSHOT_PREFIX',
+                                                 DEFAULT_SNAPSHOT_PREFIX))
+    if os.getenv('REPORT_SNAPSHOT_PATH'):
+        return LocalSnapshotStore(os.getenv('REPORT_SNAPSHOT_PATH'))
+    return NullSnapshotStore()
+
+
+def invalidate_snapshots(days, store=None) -> None:
+    """Deletes the snapshots and metrics of the given days, so the report recomputes
+    them from the warehouse on the next request."""
+    (store or get_snapshot_store()).delete(
+        [key for day in sorted(days)
+         for key in (day.isoformat(), get_metrics_key(day.isoformat()))])
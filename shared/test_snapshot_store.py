@@ -0,0 +1,74 @@
+# pylint: skip-file
+import boto3
+import pytest
+from moto import mock_aws
+from datetime import date
+from snapshot_store import (LocalSnapshotStore, S3SnapshotStore, NullSnapshotStore,
+                            get_snapshot_store,
+                            get_metrics_key, invalidate_snapshots)
+
+BUCKET_NAME = 'test-report-bucket'
+SNAPSHOT = {"date": "2024-10-01", "html": {"body": "<html/>", "etag": '"abc"'}}
+
+
+@pytest.fixture
+def s_three(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'eu-west-2')
+    with mock_aws():
+        boto3.client('s3', region_name='eu-west-2').create_bucket(
+            Bucket=BUCKET_NAME,
+            CreateBucketConfiguration={'LocationConstraint': 'eu-west-2'})
+        yield
+
+
+def test_local_snapshot_store_round_trip(tmp_path):
+    store = LocalSnapshotStore(str(tmp_path / 'snapshots'))
+
+    assert store.read('2024-10-01') is None
+    store.write('2024-10-01', SNAPSHOT)
+
+    assert store.read('2024-10-01') == SNAPSHOT
+    assert [path.name for path in (tmp_path / 'snapshots').iterdir()] == ['2024-10-01.json']
+
+
+def test_s_three_snapshot_store_round_trip(s_three):
+    store = S3SnapshotStore(BUCKET_NAME)
+
+    assert store.read('2024-10-01') is None
+    store.write('2024-10-01', SNAPSHOT)
+
+    assert store.read('2024-10-01') == SNAPSHOT
+    store.write('2024-10-03', SNAPSHOT)
+    assert store.read_many(['2024-10-03', '2024-10-02', '2024-10-01']) == [
+        SNAPSHOT, None, SNAPSHOT]
+    invalidate_snapshots([date(2024, 10, 1), date(2024, 10, 2)], store)
+    assert store.read('2024-10-01') is None
+
+
+def test_invalidate_snapshots_deletes_only_the_given_days(tmp_path):
+    store = LocalSnapshotStore(str(tmp_path))
+    store.write('2024-10-01', SNAPSHOT)
+    store.write('2024-10-02', SNAPSHOT)
+    store.write(get_metrics_key('2024-10-02'), SNAPSHOT)
+
+    invalidate_snapshots({date(2024, 10, 2), date(2024, 10, 3)}, store)
+
+    assert store.read('2024-10-01') == SNAPSHOT
+    assert store.read_many(['2024-10-02', get_metrics_key('2024-10-02')]) == [None, None]
+
+
+def test_get_snapshot_store_prefers_bucket(tmp_path, monkeypatch):
+    monkeypatch.delenv('REPORT_SNAPSHOT_PATH', raising=False)
+    monkeypatch.delenv('REPORT_SNAPSHOT_BUCKET', raising=False)
+    store = get_snapshot_store()
+    assert isinstance(store, NullSnapshotStore)
+    store.write('2024-10-01', SNAPSHOT)
+    assert store.read_many(['2024-10-01']) == [None]
+
+    monkeypatch.setenv('REPORT_SNAPSHOT_PATH', str(tmp_path))
+    assert isinstance(get_snapshot_store(), LocalSnapshotStore)
+
+    monkeypatch.setenv('REPORT_SNAPSHOT_BUCKET', BUCKET_NAME)
+    assert isinstance(get_snapshot_store(), S3SnapshotStore)
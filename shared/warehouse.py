@@ -0,0 +1,142 @@
+"""Connects to the data warehouse through a small backend interface, so the
+    load and query paths can run against Redshift or a local SQLite stand-in.
+    The pipeline, dashboard and report images all copy this one module in at
+    build time."""
+import os
+import re
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+LOCAL_WAREHOUSE_PATH = 'local_warehouse.db'
+DEFAULT_WAREHOUSE_BACKEND = 'redshift'
+DEFAULT_FETCH_BATCH_ROWS = 10000
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+
+
+class Warehouse(ABC):
+    """A DB-API warehouse that takes %s parameters, loads rows with multi-row
+    INSERTs and scopes queries to a schema with search_path."""
+    placeholder = '%s'
+
+    @abstractmethod
+    def connect(self):
+        """Opens a new connection."""
+
+    def set_schema(self, db_cursor, db_schema: str) -> None:
+        """Sets the schema later statements on the cursor run against."""
+        db_cursor.execute(f"SET search_path TO {db_schema}")
+
+    def bulk_load(self, db_cursor, table: str, columns: list, rows: list) -> None:
+        """Inserts many rows into a table with a single multi-row INSERT statement."""
+        placeholders = f"({', '.join([self.placeholder] * len(columns))})"
+        query = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+                 + ', '.join([placeholders] * len(rows)))
+        db_cursor.execute(query, [value for row in rows for value in row])
+
+    def hour_of(self, column: str) -> str:
+        """Returns the SQL expression for the hour of day of a timestamp column."""
+        return f"EXTRACT(HOUR FROM {column})"
+
+    def hour_start_of(self, column: str) -> str:
+        """Returns the SQL expression truncating a timestamp column to its hour."""
+        return f"DATE_TRUNC('hour', {column})"
+
+    def query(self, db_cursor, query: str, params: list = None) -> tuple:
+        """Runs a query. Returns the column names and every row."""
+        if params is None:
+            db_cursor.execute(query)
+        else:
+            db_cursor.execute(query, params)
+        return [desc[0] for desc in db_cursor.description], db_cursor.fetchall()
+
+    def query_batches(self, db_cursor, query: str, params: list = None,
+                      batch_rows: int = DEFAULT_FETCH_BATCH_ROWS) -> tuple:
+        """Runs a query. Returns the column names and a generator of row batches,
+        fetched with fetchmany so at most one batch of tuples is held at a time."""
+        if params is None:
+            db_cursor.execute(query)
+        else:
+            db_cursor.execute(query, params)
+
+        def batches():
+            while True:
+                rows = db_cursor.fetchmany(batch_rows)
+                if not rows:
+                    return
+                yield rows
+
+        return [desc[0] for desc in db_cursor.description], batches()
+
+
+class RedshiftWarehouse(Warehouse):
+    """The production warehouse, configured from the DB_* variables."""
+
+    def connect(self):
+        """Establish a connection to a redshift database. The connector is imported
+        here, so processes that only use the local backend never load it."""
+        import redshift_connector  # pylint: disable=import-outside-toplevel
+        return redshift_connector.connect(
+            host=os.getenv('DB_HOST'),
+            database=os.getenv('DB_NAME'),
+            user=os.getenv('DB_USERNAME'),
+            password=os.getenv('DB_PASSWORD'),
+            port=os.getenv('DB_PORT')
+        )
+
+
+class SQLiteWarehouse(Warehouse):
+    """A local single-file warehouse for tests and benchmarks. It has no schemas,
+    so every table lives in the one database at WAREHOUSE_PATH."""
+    placeholder = '?'
+
+    def connect(self):
+        """Opens the local database file. The connection may be handed between
+        threads, as a pool does, but must only be used by one at a time.
+        Timestamps are stored as ISO text by the adapter registered on import."""
+        return sqlite3.connect(os.getenv('WAREHOUSE_PATH', LOCAL_WAREHOUSE_PATH),
+                               check_same_thread=False)
+
+    def set_schema(self, db_cursor, db_schema: str) -> None:
+        """SQLite has a single schema, so there is nothing to set."""
+
+    def hour_of(self, column: str) -> str:
+        """Returns the SQL expression for the hour of day of a timestamp column."""
+        return f"CAST(strftime('%H', {column}) AS INTEGER)"
+
+    def hour_start_of(self, column: str) -> str:
+        """Returns the SQL expression truncating a timestamp column to its hour."""
+        return f"strftime('%Y-%m-%d %H:00:00', {column})"
+
+    def bulk_load(self, db_cursor, table: str, columns: list, rows: list) -> None:
+        """Inserts many rows with one prepared statement."""
+        db_cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join([self.placeholder] * len(columns))})", rows)
+
+    def apply_schema(self, conn, schema_path: str) -> None:
+        """Creates the tables in schema.sql, translating its Redshift DDL to SQLite."""
+        with open(schema_path, encoding='utf-8') as schema_file:
+            script = schema_file.read()
+        script = re.sub(r'^SET .*$', '', script, flags=re.MULTILINE)
+        script = re.sub(r',\s*PRIMARY KEY \(\w+\)', '', script)
+        script = re.sub(r'\w+ GENERATED ALWAYS AS IDENTITY',
+                        'INTEGER PRIMARY KEY', script)
+        conn.executescript(script)
+        conn.commit()
+
+
+WAREHOUSES = {
+    'redshift': RedshiftWarehouse,
+    'sqlite': SQLiteWarehouse
+}
+
+
+def get_warehouse(backend: str = None) -> Warehouse:
+    """Returns the warehouse named by WAREHOUSE_BACKEND, Redshift by default."""
+    backend = backend or os.getenv('WAREHOUSE_BACKEND', DEFAULT_WAREHOUSE_BACKEND)
+    if backend not in WAREHOUSES:
+        raise ValueError(
+            f"Unknown warehouse backend {backend}. It must be one of {list(WAREHOUSES)}.")
+    return WAREHOUSES[backend]()
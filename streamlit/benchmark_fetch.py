@@ -0,0 +1,102 @@
+"""Benchmarks fetching a large result set into a DataFrame: fetchall into tuples
+    then pd.DataFrame, against fetching in batches into typed columns. Totals
+    come back as Decimal and timestamps as datetime, as they do from Redshift,
+    and the time to first chart includes aggregating revenue per truck."""
+import os
+import time
+import sqlite3
+import argparse
+import tempfile
+import tracemalloc
+from decimal import Decimal
+from datetime import datetime, timedelta
+import pandas as pd
+from columnar import read_frame
+import shared_path  # pylint: disable=unused-import
+from warehouse import SQLiteWarehouse
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'schema.sql')
+QUERY = "SELECT transaction_id, at, payment_method_id, total, truck_id FROM fact_transaction"
+
+
+def create_warehouse(path: str, rows: int) -> None:
+    """Builds a local warehouse holding the given number of transactions."""
+    os.environ['WAREHOUSE_PATH'] = path
+    warehouse = SQLiteWarehouse()
+    conn = warehouse.connect()
+    warehouse.apply_schema(conn, SCHEMA_PATH)
+    start = datetime(2024, 10, 1)
+    warehouse.bulk_load(
+        conn.cursor(), 'fact_transaction',
+        ['at', 'payment_method_id', 'total', 'truck_id', 'transaction_fingerprint'],
+        ((start + timedelta(seconds=i), i % 2 + 1, (i % 5000) / 100 + 1, i % 6 + 1, i)
+         for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Opens the warehouse returning DECIMAL columns as Decimal and TIMESTAMP
+    columns as datetime."""
+    sqlite3.register_converter('DECIMAL', lambda value: Decimal(value.decode()))
+    sqlite3.register_converter('TIMESTAMP',
+                               lambda value: datetime.fromisoformat(value.decode()))
+    return sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+
+
+def fetch_all(conn: sqlite3.Connection, batch_rows: int) -> pd.DataFrame:
+    """Fetches every row as tuples, then builds the frame from them."""
+    columns, rows = SQLiteWarehouse().query(conn.cursor(), QUERY)
+    return pd.DataFrame(rows, columns=columns)
+
+
+def fetch_batches(conn: sqlite3.Connection, batch_rows: int) -> pd.DataFrame:
+    """Fetches rows in batches straight into typed columns."""
+    columns, batches = SQLiteWarehouse().query_batches(conn.cursor(), QUERY,
+                                                       batch_rows=batch_rows)
+    return read_frame(columns, batches)
+
+
+def time_to_first_chart(path: str, fetch, batch_rows: int) -> tuple:
+    """Returns the seconds until revenue per truck is ready, and the frame's dtypes."""
+    conn = connect(path)
+    start = time.perf_counter()
+    frame = fetch(conn, batch_rows)
+    frame.groupby('truck_id')['total'].sum()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed, dict(frame.dtypes.astype(str))
+
+
+def peak_memory(path: str, fetch, batch_rows: int) -> float:
+    """Returns the peak memory in MiB Python allocates while fetching the frame."""
+    conn = connect(path)
+    tracemalloc.start()
+    frame = fetch(conn, batch_rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del frame
+    conn.close()
+    return peak / 2 ** 20
+
+
+def main() -> None:
+    """Prints time to first chart and peak memory for each fetch strategy."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--batch-rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'fetch.db')
+        create_warehouse(path, args.rows)
+        print(f"{'fetch':>10} {'rows':>8} {'first chart s':>14} {'peak MiB':>9}  dtypes")
+        for name, fetch in [("fetchall", fetch_all), ("batches", fetch_batches)]:
+            elapsed, dtypes = time_to_first_chart(path, fetch, args.batch_rows)
+            peak = peak_memory(path, fetch, args.batch_rows)
+            print(f"{name:>10} {args.rows:>8} {elapsed:>14.3f} {peak:>9.1f}  "
+                  f"at={dtypes['at']} total={dtypes['total']}")
+
+
+if __name__ == "__main__":
+    main()
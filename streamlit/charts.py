@@ -40,17 +40,14 @@ def create_bar_chart_total_transactions(truck_data: pd.DataFrame) -> None:
     st.altair_chart(bar_chart, use_container_width=True)
 
 
-def bar_transactions_per_truck() -> None:
+def bar_transactions_per_truck(truck_summary: pd.DataFrame) -> None:
     """Creates a bar chart showing total transactions per truck with filtering options."""
-    all_data = db.fetch_transaction_data()
-    unique_trucks = dp.get_unique_trucks(all_data)
+    unique_trucks = dp.get_unique_trucks(truck_summary)
 
     selected_trucks = create_multiselect(unique_trucks)
 
     if selected_trucks:
-        transaction_data = db.fetch_transaction_data(
-            selected_trucks)
-        truck_data = dp.prepare_truck_data(transaction_data)
+        truck_data = dp.prepare_truck_data(truck_summary, selected_trucks)
         create_bar_chart_total_transactions(truck_data)
     else:
         st.warning("Please select at least one truck to display.")
@@ -85,15 +82,12 @@ def create_line_chart(transactions_per_time_period: pd.DataFrame, view: str) ->
     return line_chart
 
 
-def line_transactions(transaction_data: pd.DataFrame) -> None:
+def line_transactions() -> None:
     """Creates a line chart showing total transactions based on selected granularity."""
     view = st.selectbox('Select Time Granularity:', ['Hour', 'Day'])
 
-    transaction_data = dp.preprocess_transaction_data_line(
-        transaction_data, view)
-
-    transactions_per_time_period = transaction_data.groupby(
-        'time_period').size().reset_index(name='count')
+    transactions_per_time_period = dp.preprocess_transaction_data_line(
+        db.fetch_transactions_per_period(view), view)
 
     line_chart = create_line_chart(transactions_per_time_period, view)
     st.altair_chart(line_chart, use_container_width=True)
@@ -131,8 +125,8 @@ def create_pie_chart(transaction_counts: pd.DataFrame, color_scale: alt.Scale) -
 
 def pie_transactions_per_payment_method_id() -> None:
     """Creates a pie chart showing total transactions per payment_method_id using Altair."""
-    transaction_data = db.fetch_transaction_data_pie_chart()
-    transaction_counts = dp.calculate_transaction_counts_pie(transaction_data)
+    transaction_counts = dp.calculate_transaction_counts_pie(
+        db.fetch_payment_method_counts())
     color_scale = create_color_scale(transaction_counts)
     pie_chart = create_pie_chart(transaction_counts, color_scale)
     st.altair_chart(pie_chart, use_container_width=True)
@@ -154,12 +148,12 @@ def create_bar_chart_total_or_average(truck_data: pd.DataFrame, view: str) -> al
     return bar_chart
 
 
-def bar_total_or_average_per_truck(transaction_data: pd.DataFrame) -> None:
+def bar_total_or_average_per_truck(truck_summary: pd.DataFrame) -> None:
     """Creates a bar chart showing either total or average earnings per truck."""
     view_option = st.selectbox(
         "Select filter", ("Total Earnings", "Average Earnings"))
 
-    truck_data = dp.calculate_earnings_per_truck(transaction_data, view_option)
+    truck_data = dp.calculate_earnings_per_truck(truck_summary, view_option)
     view = f"{view_option} per Truck"
 
     bar_chart = create_bar_chart_total_or_average(truck_data, view)
@@ -0,0 +1,76 @@
+"""Builds typed DataFrame columns from batches of result rows, so query results are
+    never held as one list of Python tuples alongside a copy in the frame."""
+from decimal import Decimal
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+
+def get_column_kind(values: tuple) -> str:
+    """Returns the kind of a column from its first non-null value, or None when
+    every value is null."""
+    value = next((value for value in values if value is not None), None)
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'object'
+    if isinstance(value, Decimal):
+        return 'decimal'
+    if isinstance(value, datetime):
+        return 'datetime'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    return 'object'
+
+
+def to_array(values: tuple, kind: str) -> np.ndarray:
+    """Converts one batch of a column's values to a typed array. Decimals become
+    float64 and timestamps datetime64[us]. Integers with nulls become float64."""
+    if kind in ('decimal', 'float') or (kind == 'int' and None in values):
+        return np.fromiter((np.nan if value is None else float(value) for value in values),
+                           dtype='float64', count=len(values))
+    if kind == 'int':
+        return np.fromiter(values, dtype='int64', count=len(values))
+    if kind == 'datetime':
+        return pd.DatetimeIndex(values).as_unit('us').to_numpy()
+    return np.array(values, dtype=object)
+
+
+def get_missing(kind: str, rows: int) -> np.ndarray:
+    """Returns a column of nulls of the given kind."""
+    if kind in ('decimal', 'float', 'int'):
+        return np.full(rows, np.nan)
+    if kind == 'datetime':
+        return np.full(rows, np.datetime64('NaT'), dtype='datetime64[us]')
+    return np.full(rows, None, dtype=object)
+
+
+def read_frame(columns: list, batches) -> pd.DataFrame:
+    """Builds a DataFrame from batches of rows, converting each batch to typed
+    arrays as it arrives. A column's kind is fixed by its first non-null value."""
+    chunks = [[] for _ in columns]
+    kinds = [None] * len(columns)
+    leading_nulls = [0] * len(columns)
+
+    for rows in batches:
+        for index, values in enumerate(zip(*rows)):
+            if kinds[index] is None:
+                kinds[index] = get_column_kind(values)
+                if kinds[index] is None:
+                    leading_nulls[index] += len(values)
+                    continue
+                if leading_nulls[index]:
+                    chunks[index].append(get_missing(kinds[index], leading_nulls[index]))
+            chunks[index].append(to_array(values, kinds[index]))
+
+    data = {}
+    for index, column in enumerate(columns):
+        if kinds[index] is None:
+            data[column] = get_missing(None, leading_nulls[index])
+        elif kinds[index] == 'object':
+            data[column] = pd.Series(np.concatenate(chunks[index])).infer_objects()
+        else:
+            data[column] = np.concatenate(chunks[index])
+    return pd.DataFrame(data, columns=columns)
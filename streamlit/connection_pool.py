@@ -0,0 +1,141 @@
+"""A small thread-safe pool of warehouse connections shared by every dashboard session."""
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """Hands out at most max_size connections, reusing idle ones.
+    Connections idle for longer than max_idle_seconds are closed, and a connection
+    idle for longer than health_check_seconds is checked with SELECT 1 before reuse."""
+
+    def __init__(self, connect, max_size: int = 4, max_idle_seconds: float = 300,
+                 health_check_seconds: float = 30, acquire_timeout: float = 30):
+        self.connect = connect
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check_seconds = health_check_seconds
+        self.acquire_timeout = acquire_timeout
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.stats = {"created": 0, "reused": 0, "evicted": 0,
+                      "failed_health_checks": 0, "in_use": 0, "open": 0}
+
+    def close_connection(self, conn, reason: str) -> None:
+        """Closes a connection the pool is discarding."""
+        with self.lock:
+            self.stats[reason] += 1
+            self.stats["open"] -= 1
+        try:
+            conn.close()
+        except Exception:  # pylint: disable=broad-except
+            logger.warning("Failed to close a discarded connection.")
+
+    def evict_idle(self) -> None:
+        """Closes connections that have been idle for longer than max_idle_seconds."""
+        cutoff = time.monotonic() - self.max_idle_seconds
+        with self.lock:
+            expired = [conn for conn, released_at in self.idle if released_at < cutoff]
+            self.idle = deque((conn, released_at) for conn, released_at in self.idle
+                              if released_at >= cutoff)
+        for conn in expired:
+            self.close_connection(conn, "evicted")
+
+    def is_healthy(self, conn) -> bool:
+        """Checks the connection still answers a trivial query."""
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            return True
+        except Exception:  # pylint: disable=broad-except
+            return False
+
+    def take_idle(self):
+        """Returns the most recently used healthy idle connection, or None."""
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                conn, released_at = self.idle.pop()
+            if (time.monotonic() - released_at < self.health_check_seconds
+                    or self.is_healthy(conn)):
+                return conn
+            self.close_connection(conn, "failed_health_checks")
+
+    def acquire(self):
+        """Returns a pooled connection, opening one if none is idle.
+        Blocks while max_size connections are in use."""
+        if not self.slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(
+                f"No connection free after {self.acquire_timeout}s "
+                f"({self.max_size} in use).")
+        try:
+            self.evict_idle()
+            conn = self.take_idle()
+            with self.lock:
+                if conn is None:
+                    self.stats["created"] += 1
+                    self.stats["open"] += 1
+                else:
+                    self.stats["reused"] += 1
+                self.stats["in_use"] += 1
+            return conn if conn is not None else self.open_connection()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def open_connection(self):
+        """Opens a new connection, undoing the bookkeeping if it fails."""
+        try:
+            return self.connect()
+        except Exception:
+            with self.lock:
+                self.stats["created"] -= 1
+                self.stats["open"] -= 1
+                self.stats["in_use"] -= 1
+            raise
+
+    def release(self, conn) -> None:
+        """Returns a connection to the pool, ending its read transaction.
+        A connection that cannot roll back is broken and is closed instead."""
+        broken = False
+        try:
+            try:
+                conn.rollback()
+            except Exception:  # pylint: disable=broad-except
+                broken = True
+            with self.lock:
+                self.stats["in_use"] -= 1
+                if not broken:
+                    self.idle.append((conn, time.monotonic()))
+            if broken:
+                self.close_connection(conn, "failed_health_checks")
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Lends a connection for the duration of the block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def get_stats(self) -> dict:
+        """Returns a copy of the pool counters."""
+        with self.lock:
+            return dict(self.stats, idle=len(self.idle))
+
+    def close_all(self) -> None:
+        """Closes every idle connection."""
+        with self.lock:
+            idle, self.idle = list(self.idle), deque()
+        for conn, _ in idle:
+            self.close_connection(conn, "evicted")
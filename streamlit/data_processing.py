@@ -3,41 +3,40 @@
 import pandas as pd
 
 
-def get_unique_trucks(transaction_data: pd.DataFrame) -> list:
-    """Extract unique truck IDs from the transaction data."""
-    return transaction_data['truck_id'].unique().tolist()
+def get_unique_trucks(truck_summary: pd.DataFrame) -> list:
+    """Extract unique truck IDs from the per-truck summary."""
+    return truck_summary['truck_id'].tolist()
 
 
-def prepare_truck_data(transaction_data: pd.DataFrame) -> pd.DataFrame:
-    """Group the transaction data by truck ID and count transactions."""
-    return transaction_data.groupby('truck_id').size().reset_index(name='count')
+def prepare_truck_data(truck_summary: pd.DataFrame, selected_trucks: list) -> pd.DataFrame:
+    """Select the transaction counts of the chosen trucks."""
+    selected = truck_summary[truck_summary['truck_id'].isin(selected_trucks)]
+    return selected[['truck_id', 'count']].reset_index(drop=True)
 
 
-def preprocess_transaction_data_line(transaction_data: pd.DataFrame, view: str) -> pd.DataFrame:
-    """Preprocess the transaction data to create a time_period column based on the selected view."""
-    transaction_data['at'] = pd.to_datetime(
-        transaction_data['at'])
-
+def preprocess_transaction_data_line(transaction_counts: pd.DataFrame, view: str) -> pd.DataFrame:
+    """Format the time_period of the per-period counts for the selected view."""
+    transaction_counts = transaction_counts.copy()
     if view == 'Hour':
-        transaction_data['time_period'] = transaction_data['at'].dt.strftime(
-            '%H:00')
+        transaction_counts['time_period'] = transaction_counts['time_period'].map(
+            lambda hour: f"{int(hour):02d}:00")
     elif view == 'Day':
-        transaction_data['time_period'] = transaction_data['at'].dt.date
+        transaction_counts['time_period'] = pd.to_datetime(
+            transaction_counts['time_period']).dt.date
 
-    return transaction_data
+    return transaction_counts
 
 
-def calculate_transaction_counts_pie(transaction_data: pd.DataFrame) -> pd.DataFrame:
-    """Calculate the counts and percentages of transactions per payment_method_id."""
-    transaction_counts = transaction_data.groupby(
-        ['payment_method_id', 'payment_method_type']).size().reset_index(name='count')
+def calculate_transaction_counts_pie(transaction_counts: pd.DataFrame) -> pd.DataFrame:
+    """Calculate the percentages of transactions per payment_method_id."""
+    transaction_counts = transaction_counts.copy()
     transaction_counts['percentage'] = (
         transaction_counts['count'] / transaction_counts['count'].sum()) * 100
     return transaction_counts
 
 
-def calculate_earnings_per_truck(transaction_data: pd.DataFrame, aggregation: str) -> pd.DataFrame:
-    """Calculate total or average earnings per truck based on the selected aggregation method."""
-    if aggregation == "Total Earnings":
-        return transaction_data.groupby("truck_id")["total"].sum().reset_index()
-    return transaction_data.groupby("truck_id")["total"].mean().reset_index()
+def calculate_earnings_per_truck(truck_summary: pd.DataFrame, aggregation: str) -> pd.DataFrame:
+    """Select total or average earnings per truck based on the selected aggregation method."""
+    column = 'total' if aggregation == "Total Earnings" else 'average'
+    return pd.DataFrame({'truck_id': truck_summary['truck_id'],
+                         'total': truck_summary[column].astype(float)})
@@ -2,92 +2,135 @@
 """Script containing SQL queries for Streamlit Application"""
 import os
 import pandas as pd
-import redshift_connector
+import streamlit as st
 from redshift_connector import Connection, Cursor
+import shared_path  # pylint: disable=unused-import
+from warehouse import get_warehouse, DEFAULT_FETCH_BATCH_ROWS
+from columnar import read_frame
+from connection_pool import ConnectionPool
+from query_cache import QueryCache
+
+DEFAULT_POOL_MAX_SIZE = 4
+DEFAULT_POOL_MAX_IDLE_SECONDS = 300
+DEFAULT_QUERY_CACHE_TTL_SECONDS = 900
+DEFAULT_QUERY_CACHE_PROBE_SECONDS = 60
 
 
 def get_connection() -> Connection:
-    """Establish a connection to a redshift database."""
-    return redshift_connector.connect(
-        host=os.getenv('DB_HOST'),
-        database=os.getenv('DB_NAME'),
-        user=os.getenv('DB_USERNAME'),
-        password=os.getenv('DB_PASSWORD'),
-        port=os.getenv('DB_PORT')
-    )
+    """Establish a connection to the configured warehouse."""
+    return get_warehouse().connect()
 
 
 def get_cursor(conn: Connection) -> Cursor:
-    """Creates a redshift cursor."""
+    """Creates a warehouse cursor."""
     return conn.cursor()
 
 
 def set_schema(db_cursor) -> None:
-    """Set search path for Redshift database."""
-    db_cursor.execute(f"""SET search_path to {os.getenv("DB_SCHEMA")}""")
-
-
-def fetch_transaction_data(selected_trucks: list = None) -> pd.DataFrame:
-    """Fetch transaction data from the Redshift database.
-    Optionally filtered by selected truck IDs."""
-    conn = get_connection()
-    cursor = get_cursor(conn)
-
-    set_schema(cursor)
-
-    query = "SELECT * FROM fact_transaction"
-    if selected_trucks:
-        truck_ids = ', '.join(f"'{truck}'" for truck in selected_trucks)
-        query += f" WHERE truck_id IN ({truck_ids});"
-    else:
-        query += ";"
+    """Set search path for the warehouse schema."""
+    get_warehouse().set_schema(db_cursor, os.getenv("DB_SCHEMA"))
 
-    cursor.execute(query)
-    columns = [desc[0] for desc in cursor.description]
-    result = cursor.fetchall()
 
-    transaction_data = pd.DataFrame(result, columns=columns)
-
-    return transaction_data
-
-
-def fetch_transaction_data_pie_chart() -> pd.DataFrame:
-    """Fetch transaction data from the Redshift database."""
+def open_schema_connection() -> Connection:
+    """Opens a connection with the search path set for the whole session.
+    The SET is committed so the pool's rollback on release does not undo it."""
     conn = get_connection()
-    cursor = get_cursor(conn)
-    set_schema(cursor)
-    query = """
-        SELECT 
-            ft.transaction_id, 
-            ft.at, 
-            ft.payment_method_id, 
-            ft.total, 
-            ft.truck_id,
-            dpm.payment_method_type
-        FROM 
-            fact_transaction ft
-        LEFT JOIN 
-            dim_payment_method dpm 
-        ON 
-            ft.payment_method_id = dpm.payment_method_id;
-    """
-
-    cursor.execute(query)
-    columns = [desc[0] for desc in cursor.description]
-    result = cursor.fetchall()
-
-    transaction_data = pd.DataFrame(result, columns=columns)
-
-    return transaction_data
+    set_schema(get_cursor(conn))
+    conn.commit()
+    return conn
+
+
+@st.cache_resource
+def get_connection_pool() -> ConnectionPool:
+    """Returns the connection pool shared by every session of the app."""
+    return ConnectionPool(
+        open_schema_connection,
+        max_size=int(os.getenv("DB_POOL_MAX_SIZE", str(DEFAULT_POOL_MAX_SIZE))),
+        max_idle_seconds=float(os.getenv("DB_POOL_MAX_IDLE_SECONDS",
+                                         str(DEFAULT_POOL_MAX_IDLE_SECONDS))))
+
+
+def get_fetch_batch_rows() -> int:
+    """Returns the number of rows fetched per batch."""
+    return int(os.getenv("DB_FETCH_BATCH_ROWS", str(DEFAULT_FETCH_BATCH_ROWS)))
+
+
+def query_frame(db_cursor, query: str, params: list = None) -> pd.DataFrame:
+    """Runs a query and returns its rows as a DataFrame with typed columns,
+    fetching and converting the rows in batches."""
+    columns, batches = get_warehouse().query_batches(
+        db_cursor, query, params, get_fetch_batch_rows())
+    return read_frame(columns, batches)
+
+
+def run_query(query: str, params: list = None) -> pd.DataFrame:
+    """Runs a query on a pooled connection and returns its rows as a DataFrame."""
+    with get_connection_pool().connection() as conn:
+        return query_frame(get_cursor(conn), query, params)
+
+
+def fetch_data_version() -> int:
+    """Returns the highest transaction id, which changes whenever a load lands."""
+    version = run_query(
+        "SELECT MAX(transaction_id) AS version FROM fact_transaction;").iloc[0, 0]
+    return None if pd.isna(version) else int(version)
+
+
+@st.cache_resource
+def get_query_cache() -> QueryCache:
+    """Returns the query result cache shared by every session of the app."""
+    return QueryCache(
+        fetch_data_version,
+        ttl_seconds=float(os.getenv("QUERY_CACHE_TTL_SECONDS",
+                                    str(DEFAULT_QUERY_CACHE_TTL_SECONDS))),
+        probe_seconds=float(os.getenv("QUERY_CACHE_PROBE_SECONDS",
+                                      str(DEFAULT_QUERY_CACHE_PROBE_SECONDS))))
+
+
+def fetch_frame(query: str, params: list = None) -> pd.DataFrame:
+    """Returns the rows of a query as a DataFrame, from the cache when they are current."""
+    return get_query_cache().get(query, params, lambda: run_query(query, params))
+
+
+def fetch_truck_summary() -> pd.DataFrame:
+    """Fetches the number of transactions, total and average earnings per truck."""
+    return fetch_frame("""
+        SELECT truck_id,
+               SUM(transaction_count) AS count,
+               SUM(total_sum) AS total,
+               SUM(total_sum) / SUM(transaction_count) AS average
+        FROM rollup_transaction_hourly
+        GROUP BY truck_id
+        ORDER BY truck_id;
+    """)
+
+
+def fetch_transactions_per_period(view: str) -> pd.DataFrame:
+    """Fetches the number of transactions per hour of day, or per day."""
+    period = (get_warehouse().hour_of('hour_start') if view == 'Hour'
+              else 'DATE(hour_start)')
+    return fetch_frame(f"""
+        SELECT {period} AS time_period, SUM(transaction_count) AS count
+        FROM rollup_transaction_hourly
+        GROUP BY {period}
+        ORDER BY time_period;
+    """)
+
+
+def fetch_payment_method_counts() -> pd.DataFrame:
+    """Fetches the number of transactions per payment method."""
+    return fetch_frame("""
+        SELECT rt.payment_method_id,
+               dpm.payment_method_type,
+               SUM(rt.transaction_count) AS count
+        FROM rollup_transaction_hourly AS rt
+        LEFT JOIN dim_payment_method AS dpm
+            ON rt.payment_method_id = dpm.payment_method_id
+        GROUP BY rt.payment_method_id, dpm.payment_method_type
+        ORDER BY rt.payment_method_id;
+    """)
 
 
 def fetch_truck_card_reader_data() -> pd.DataFrame:
     """Fetches truck names and their card reader status from the database."""
-
-    conn = get_connection()
-    cursor = get_cursor(conn)
-    set_schema(cursor)
-    cursor.execute("SELECT truck_name, has_card_reader FROM dim_truck;")
-
-    rows = cursor.fetchall()
-    return pd.DataFrame(rows, columns=['truck_name', 'has_card_reader'])
+    return fetch_frame("SELECT truck_name, has_card_reader FROM dim_truck;")
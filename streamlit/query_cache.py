@@ -0,0 +1,66 @@
+"""Caches dashboard query results in memory until they expire or new data is loaded."""
+import time
+import threading
+
+
+class QueryCache:
+    """Keeps query results keyed on the query and its parameters.
+    A result is served until it is ttl_seconds old or the probe reports a new data
+    version. The probe, such as the highest transaction id, runs at most once every
+    probe_seconds, so repeated interactions need no queries at all."""
+
+    def __init__(self, probe, ttl_seconds: float = 900, probe_seconds: float = 60,
+                 clock=time.monotonic):
+        self.probe = probe
+        self.ttl_seconds = ttl_seconds
+        self.probe_seconds = probe_seconds
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.version = None
+        self.probed_at = None
+        self.stats = {"hits": 0, "misses": 0, "expired": 0,
+                      "invalidations": 0, "probes": 0}
+
+    def get_version(self):
+        """Returns the data version, probing for a new one when the last probe is stale."""
+        now = self.clock()
+        with self.lock:
+            if self.probed_at is not None and now - self.probed_at < self.probe_seconds:
+                return self.version
+
+        version = self.probe()
+        with self.lock:
+            self.stats["probes"] += 1
+            if self.probed_at is not None and version != self.version:
+                self.stats["invalidations"] += 1
+                self.entries.clear()
+            self.version = version
+            self.probed_at = now
+        return version
+
+    def get(self, query: str, params: list, fetch):
+        """Returns the cached result of the query, running fetch on a miss.
+        Callers get a copy, so changing it does not change the cache."""
+        key = (query, tuple(params or ()))
+        version = self.get_version()
+        now = self.clock()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                if now - entry[1] < self.ttl_seconds:
+                    self.stats["hits"] += 1
+                    return entry[2].copy()
+                self.stats["expired"] += 1
+            self.stats["misses"] += 1
+
+        result = fetch()
+        with self.lock:
+            self.entries[key] = (version, now, result)
+        return result.copy()
+
+    def get_stats(self) -> dict:
+        """Returns a copy of the cache counters."""
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries), version=self.version)
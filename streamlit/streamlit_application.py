@@ -1,15 +1,47 @@
 """Script that will visualise transformed data using Streamlit."""
+import time
+import logging
 import streamlit as st
 from dotenv import load_dotenv
 import database as db
 import charts as ch
 
 
+def configure_logger() -> logging.Logger:
+    """Sets up and returns a logger instance. Streamlit reruns this script on every
+    interaction, so the handler is only added once."""
+    app_logger = logging.getLogger(__name__)
+    app_logger.setLevel(logging.INFO)
+    if app_logger.handlers:
+        return app_logger
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    app_logger.addHandler(handler)
+    return app_logger
+
+
+logger = configure_logger()
+
+
+def log_render(start: float) -> None:
+    """Logs how long the page took to render, the state of the connection pool and
+    the query cache, and shows the cache counters in the sidebar."""
+    cache_stats = db.get_query_cache().get_stats()
+    logger.info(f"Rendered home page in {time.perf_counter() - start:.3f}s; "
+                f"connection pool: {db.get_connection_pool().get_stats()}; "
+                f"query cache: {cache_stats}")
+    st.sidebar.caption(
+        f"Query cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+        f"{cache_stats['invalidations']} invalidations")
+
+
 def home_page() -> None:
     """Home page for the Streamlit application."""
+    start = time.perf_counter()
     load_dotenv()
 
-    data = db.fetch_transaction_data()
+    truck_summary = db.fetch_truck_summary()
 
     st.set_page_config(layout="wide")
 
@@ -20,11 +52,11 @@ def home_page() -> None:
 
     with col_one:
 
-        ch.line_transactions(data)
+        ch.line_transactions()
 
     with col_two:
 
-        ch.bar_transactions_per_truck()
+        ch.bar_transactions_per_truck(truck_summary)
 
     col_three, col_four = st.columns([0.5, 0.5])
 
@@ -35,7 +67,9 @@ def home_page() -> None:
     with col_four:
         ch.display_truck_card_reader_table()
 
-    ch.bar_total_or_average_per_truck(data)
+    ch.bar_total_or_average_per_truck(truck_summary)
+
+    log_render(start)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+# pylint: skip-file
+import sqlite3
+from decimal import Decimal
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from columnar import read_frame
+from warehouse import SQLiteWarehouse
+
+
+def test_read_frame_builds_typed_columns():
+    batches = [
+        [(1, Decimal('5.50'), datetime(2024, 10, 1, 12), 'card', None),
+         (2, Decimal('3.00'), datetime(2024, 10, 1, 13), 'cash', None)],
+        [(None, None, None, None, 7)]
+    ]
+
+    frame = read_frame(['truck_id', 'total', 'at', 'type', 'late'], iter(batches))
+
+    assert frame['truck_id'].dtype == 'float64'
+    assert frame['total'].tolist()[:2] == [5.5, 3.0]
+    assert frame['total'].dtype == 'float64'
+    assert frame['at'].dtype == 'datetime64[us]'
+    assert frame['at'].isna().tolist() == [False, False, True]
+    assert frame['type'].tolist()[:2] == ['card', 'cash']
+    assert frame['late'].tolist()[2] == 7
+    assert np.isnan(frame['late'].tolist()[0])
+
+
+def test_query_batches_streams_rows_in_batches():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE t (id INTEGER, total REAL)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", [(i, i / 2) for i in range(5)])
+
+    columns, batches = SQLiteWarehouse().query_batches(
+        conn.cursor(), "SELECT id, total FROM t ORDER BY id", batch_rows=2)
+    batches = list(batches)
+    frame = read_frame(columns, iter(batches))
+
+    assert [len(rows) for rows in batches] == [2, 2, 1]
+    assert frame['id'].dtype == 'int64'
+    assert frame.equals(pd.DataFrame({'id': range(5), 'total': [i / 2 for i in range(5)]}))
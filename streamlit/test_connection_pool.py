@@ -0,0 +1,50 @@
+# pylint: skip-file
+import pytest
+from unittest.mock import Mock
+from connection_pool import ConnectionPool
+
+
+def test_pool_reuses_released_connections():
+    connect = Mock(side_effect=lambda: Mock())
+    pool = ConnectionPool(connect, max_size=2)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    assert connect.call_count == 1
+    assert pool.get_stats()['reused'] == 1
+    first.rollback.assert_called()
+
+
+def test_pool_blocks_beyond_max_size():
+    pool = ConnectionPool(Mock(side_effect=lambda: Mock()), max_size=1,
+                          acquire_timeout=0.01)
+    pool.acquire()
+
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+
+
+def test_pool_evicts_idle_and_replaces_unhealthy_connections():
+    stale = Mock()
+    stale.cursor.return_value.execute.side_effect = Exception('server closed')
+    fresh = Mock()
+    pool = ConnectionPool(Mock(side_effect=[stale, fresh]), health_check_seconds=0)
+
+    with pool.connection():
+        pass
+    with pool.connection() as conn:
+        assert conn is fresh
+
+    stats = pool.get_stats()
+    assert stats['failed_health_checks'] == 1
+    assert stats['open'] == 1
+    stale.close.assert_called_once()
+
+    pool.max_idle_seconds = 0
+    pool.evict_idle()
+    assert pool.get_stats()['evicted'] == 1
+    fresh.close.assert_called_once()
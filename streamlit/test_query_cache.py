@@ -0,0 +1,59 @@
+# pylint: skip-file
+import pandas as pd
+from unittest.mock import Mock
+from query_cache import QueryCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_serves_hits_until_ttl_expires():
+    clock = Clock()
+    cache = QueryCache(Mock(return_value=10), ttl_seconds=100, probe_seconds=1000,
+                       clock=clock)
+    fetch = Mock(return_value=pd.DataFrame({'count': [1]}))
+
+    first = cache.get('SELECT 1', None, fetch)
+    first['count'] = 99
+    assert cache.get('SELECT 1', None, fetch)['count'].tolist() == [1]
+    clock.now = 150
+    cache.get('SELECT 1', None, fetch)
+
+    assert fetch.call_count == 2
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['expired'] == 1
+
+
+def test_cache_keys_on_parameters():
+    cache = QueryCache(Mock(return_value=10))
+    fetch = Mock(side_effect=lambda: pd.DataFrame({'count': [fetch.call_count]}))
+
+    cache.get('SELECT ?', [1], fetch)
+    cache.get('SELECT ?', [2], fetch)
+    cache.get('SELECT ?', [1], fetch)
+
+    assert fetch.call_count == 2
+
+
+def test_new_data_version_invalidates_entries():
+    clock = Clock()
+    probe = Mock(side_effect=[10, 10, 11])
+    cache = QueryCache(probe, probe_seconds=60, clock=clock)
+    fetch = Mock(return_value=pd.DataFrame({'count': [1]}))
+
+    cache.get('SELECT 1', None, fetch)
+    clock.now = 30
+    cache.get('SELECT 1', None, fetch)
+    clock.now = 70
+    cache.get('SELECT 1', None, fetch)
+    clock.now = 140
+    cache.get('SELECT 1', None, fetch)
+
+    assert probe.call_count == 3
+    assert fetch.call_count == 2
+    assert cache.get_stats()['invalidations'] == 1
@@ -33,4 +33,12 @@ variable "AWS_SECRET_ACCESS_KEY" {
 
 variable "BUCKET_NAME" {
     type = string
+}
+
+variable "MANIFEST_S3_BUCKET" {
+    type = string
+}
+
+variable "REPORT_SNAPSHOT_BUCKET" {
+    type = string
 }
\ No newline at end of file